@@ -1,9 +1,23 @@
 import sys
 import os
+import time
 import argparse
+import asyncio
 
-from src.redis_lib.dumpers import JSONDumper
+from src.redis_lib.changes import ChangeCapture
+from src.redis_lib.checkpoint import DumpCheckpoint, RestoreCheckpoint
+from src.redis_lib.compression import binary_stream, open_writer
+from src.redis_lib.differential import DifferentialDump
+from src.redis_lib.dumpers import BinaryDumper, JSONDumper
+from src.redis_lib.index import DumpIndex
+from src.redis_lib.parallel_restore import ParallelRestore
+from src.redis_lib.shards import MANIFEST, SHARD_BY, ShardedOutput
 from src.redis_lib.io import RedisClusterIO, RedisSingleIO
+from src.redis_lib.utils import RateLimiter
+from src.redis_lib.async_io import AsyncRedisIO
+
+# seconds between INFO samples when only a cap checked against them is given
+DEFAULT_INFO_INTERVAL = 1.0
 
 
 class CLI:
@@ -12,26 +26,240 @@ class CLI:
         self._uri = f"{self._get_redis_uri()}/{self._args.db}"
 
     def _execute_single_redis(self, f, mode, ttl):
-        r = RedisSingleIO(self._uri)
-        backup = JSONDumper(f, ttl)
-        getattr(backup, mode)(r)
+        if getattr(self._args, "use_async", False):
+            return asyncio.run(self._execute_async_single_redis(f, mode, ttl))
+        r = RedisSingleIO(self._uri, **self._io_options(), **self._read_options(), **self._write_options())
+        f = self._shard_output(f, r)
+        self._run_dumper(self._dumper(f, ttl), mode, r)
+
+    async def _execute_async_single_redis(self, f, mode, ttl):
+        if getattr(self._args, "binary", False):
+            raise Exception("--binary is not supported with --async")
+        if self._checkpoint_path() is not None:
+            raise Exception("--checkpoint and --resume are not supported with --async")
+        if getattr(self._args, "slots", None) is not None:
+            raise Exception("--slots is not supported with --async")
+        if self._read_options() or self._write_options():
+            raise Exception("--read-from-replicas and the --scan-* and --restore-* throttles are not supported with --async")
+        r = AsyncRedisIO(self._uri, prefetch=int(getattr(self._args, "prefetch", 2)), **self._io_options())
+        backup = JSONDumper(f, ttl, index=self._index_option(), **self._dumper_options())
+        try:
+            await getattr(backup, f"{mode}_async")(r)
+        finally:
+            await r.close()
     
     def _execute_cluster_redis(self, f, mode, ttl):
-        r = RedisClusterIO(self._uri)
-        backup = JSONDumper(f, ttl)
-        getattr(backup, mode)(r)
+        if getattr(self._args, "use_async", False):
+            raise Exception("--async is only supported for single redis")
+        r = RedisClusterIO(
+            self._uri,
+            workers=int(getattr(self._args, "cluster_workers", 1)),
+            parallel_writes=getattr(self._args, "parallel_writes", False),
+            **self._io_options(),
+            **self._read_options(),
+            **self._write_options()
+        )
+        f = self._shard_output(f, r)
+        self._run_dumper(self._dumper(f, ttl), mode, r)
+
+    def _dumper(self, f, ttl):
+        if getattr(self._args, "binary", False):
+            if self._checkpoint() is not None:
+                raise Exception("--checkpoint and --resume are not supported with --binary")
+            return BinaryDumper(binary_stream(f) or f, ttl)
+        return JSONDumper(
+            f, ttl,
+            workers=int(getattr(self._args, "encoder_workers", 1)),
+            checkpoint=self._checkpoint(),
+            index=self._index_option(),
+            **self._dumper_options()
+        )
+
+    def _index_path(self):
+        return f"{self._args.file}.idx"
+
+    def _index_option(self):
+        if self._args.mode == "dump" and getattr(self._args, "index", False):
+            return self._index_path()
+        return None
+
+    def _run_dumper(self, backup, mode, r):
+        """
+        --slots FIRST-LAST restores only those hash slots, through the index
+        written next to the dump with --index.
+        """
+        slots = getattr(self._args, "slots", None)
+        if mode != "restore" or slots is None:
+            return getattr(backup, mode)(r)
+        if getattr(self._args, "binary", False):
+            raise Exception("--slots is not supported with --binary")
+        first, _, last = slots.partition("-")
+        with DumpIndex(self._index_path()) as index:
+            backup.restore_slots(r, index, int(first), int(last or first))
+
+    def _checkpoint_path(self):
+        args = self._args
+        path = getattr(args, "checkpoint", None)
+        if path is not None:
+            return path
+        if not getattr(args, "resume", False):
+            return None
+        if args.mode == "dump":
+            if getattr(args, "shard_by", None):
+                return os.path.join(getattr(args, "shard_dir", "dump"), "checkpoint.json")
+            return f"{args.file}.checkpoint"
+        if os.path.isdir(args.file):
+            return os.path.join(args.file, ".restore-checkpoint.json")
+        return f"{args.file}.restore-checkpoint"
+
+    def _resuming(self):
+        path = self._checkpoint_path()
+        return getattr(self._args, "resume", False) and path is not None and os.path.exists(path)
+
+    def _checkpoint(self):
+        """
+        --resume continues from the checkpoint if there is one, otherwise
+        the dump or restore starts over and writes it.
+        """
+        path = self._checkpoint_path()
+        if path is None:
+            return None
+        checkpoint_class = DumpCheckpoint if self._args.mode == "dump" else RestoreCheckpoint
+        interval = float(getattr(self._args, "checkpoint_interval", 60))
+        if self._resuming():
+            return checkpoint_class.load(path, interval)
+        return checkpoint_class(path, interval)
+
+    def _shard_output(self, f, r):
+        """
+        With --shard-by, dumps go to shard files in --shard-dir instead of f.
+        """
+        args = self._args
+        shard_by = getattr(args, "shard_by", None)
+        if shard_by is None or args.mode != "dump":
+            return f
+        options = self._dumper_options()
+        return ShardedOutput(
+            getattr(args, "shard_dir", "dump"),
+            shard_by,
+            shards=int(getattr(args, "shards", 16)),
+            max_records=int(getattr(args, "shard_max_records", 1000000)),
+            max_bytes=int(getattr(args, "shard_max_bytes", 1 << 30)),
+            node_of=getattr(r, "node_of", None),
+            **options
+        )
+
+    def _dumper_options(self):
+        args = self._args
+        level = getattr(args, "compression_level", None)
+        return {
+            "compression": getattr(args, "compression", None),
+            "compression_level": int(level) if level is not None else None,
+            "compression_threads": int(getattr(args, "compression_threads", 1)),
+        }
+
+    def _io_options(self):
+        args = self._args
+        return {
+            "use_scripts": getattr(args, "scripts", False),
+            "payloads": getattr(args, "format", "json") == "rdb-payload",
+            "chunk_threshold": int(getattr(args, "chunk_threshold", 0)),
+            "chunk_size": int(getattr(args, "chunk_size", 10000)),
+            "plain_text": getattr(args, "value_encoding", "base64") == "auto",
+            "write_batch_size": int(getattr(args, "restore_batch_size", 1000)),
+            "write_batch_bytes": int(getattr(args, "restore_batch_bytes", 0)),
+            "delete_before_write": not getattr(args, "no_delete", False),
+        }
+
+    def _read_options(self):
+        """
+        Dumps may read from replicas and throttle their scan; restores and
+        captures always use the masters.
+        """
+        args = self._args
+        if args.mode != "dump":
+            return {}
+        options = {}
+        if getattr(args, "read_from_replicas", False):
+            lag = getattr(args, "max_replica_lag", 10)
+            options["read_from_replicas"] = True
+            options["max_replica_lag"] = float(lag) if lag is not None else None
+        throttle = self._throttle_options()
+        if throttle is not None:
+            options["throttle"] = throttle
+        return options
+
+    def _throttle_options(self):
+        args = self._args
+        throttle = {
+            "target_latency": float(getattr(args, "scan_target_latency", 0)) / 1000,
+            "min_batch": int(getattr(args, "scan_min_batch", 100)),
+            "info_interval": float(getattr(args, "scan_info_interval", 0)),
+            "max_server_ops": int(getattr(args, "scan_max_server_ops", 0)),
+            "max_blocked_clients": int(getattr(args, "scan_max_blocked_clients", 0)),
+        }
+        if (throttle["max_server_ops"] or throttle["max_blocked_clients"]) and not throttle["info_interval"]:
+            # the caps are checked against INFO samples
+            throttle["info_interval"] = DEFAULT_INFO_INTERVAL
+        rate = float(getattr(args, "scan_rate_limit", 0))
+        if not (throttle["target_latency"] or throttle["info_interval"] or rate):
+            return None
+        # one limiter for all nodes, so the cap holds for the whole dump
+        throttle["rate_limiter"] = RateLimiter(rate) if rate > 0 else None
+        return throttle
+
+    def _write_options(self):
+        """
+        Restores pace their pipelines once a latency target or INFO sampling is set.
+        """
+        args = self._args
+        throttle = {
+            "target_latency": float(getattr(args, "restore_target_latency", 0)) / 1000,
+            "info_interval": float(getattr(args, "restore_info_interval", 0)),
+            "max_memory_ratio": float(getattr(args, "restore_max_memory_ratio", 0.9)),
+            "max_replica_lag": int(getattr(args, "restore_max_replica_lag", 0)),
+            "max_pause": float(getattr(args, "restore_max_pause", 300)),
+        }
+        if throttle["max_replica_lag"] and not throttle["info_interval"]:
+            throttle["info_interval"] = DEFAULT_INFO_INTERVAL
+        if args.mode != "restore" or not (throttle["target_latency"] or throttle["info_interval"]):
+            return {}
+        return {"write_throttle": throttle}
 
     def execute(self):
         args = self._args
         mode = args.mode
         f = None
+        if mode == 'capture':
+            return self._capture()
         if mode == 'dump':
-            if args.output_stdout:
+            if getattr(args, "shard_by", None):
+                if getattr(args, "use_async", False) or getattr(args, "binary", False):
+                    raise Exception("--shard-by is not supported with --async or --binary")
+                f = None
+            elif getattr(args, "binary", False) and getattr(args, "compression", None) not in (None, "none"):
+                raise Exception("--compression is not supported with --binary")
+            elif args.output_stdout:
+                if self._checkpoint_path() is not None or getattr(args, "index", False):
+                    raise Exception("--checkpoint, --resume and --index need --file")
                 f = sys.stdout
             elif args.file:
-                f = open(args.file, 'w')
+                f = open(args.file, 'r+' if self._resuming() else 'w')
             else:
                 raise Exception("In dump mode either set --output-stdout or give a file with --file")
+            try:
+                if getattr(args, "diff_index", None):
+                    return self._differential_dump(f)
+                return self.run(f)
+            except BaseException:
+                self._discard_partial(f)
+                raise
+
+        deltas = getattr(args, "deltas", None) or []
+        if deltas and self._checkpoint_path() is not None:
+            raise Exception("--checkpoint and --resume are not supported with --deltas")
+        if not args.input_stdin and args.file and (os.path.isdir(args.file) or args.file.endswith(MANIFEST)):
+            self._restore_shards(args.file)
         else:
             if args.input_stdin:
                 f = sys.stdin
@@ -39,7 +267,105 @@ class CLI:
                 f = open(args.file, 'r')
             else:
                 raise Exception("In restore mode either set --input-stdin or give a file with --file")
-        
+            self.run(f)
+        for path in deltas:
+            with open(path, 'r') as delta:
+                self.run(delta)
+
+    def _discard_partial(self, f):
+        """
+        A failed dump to --file without a checkpoint to resume from is moved
+        to <file>.partial, so it is not restored as a complete dump.
+        """
+        if f is None or f is sys.stdout or self._checkpoint_path() is not None:
+            return
+        f.close()
+        os.replace(self._args.file, f"{self._args.file}.partial")
+
+    def _capture(self):
+        """
+        Dumps --file in full, then writes the keys changed since the previous
+        delta to <file>.delta-NNNNNN every --delta-interval seconds until
+        stopped. Deltas of an earlier capture are removed: they build on a
+        snapshot that this one replaces.
+        """
+        args = self._args
+        if args.type == "cluster":
+            r = RedisClusterIO(self._uri, workers=int(getattr(args, "cluster_workers", 1)), **self._io_options())
+        else:
+            r = RedisSingleIO(self._uri, **self._io_options())
+        directory = os.path.dirname(args.file) or "."
+        prefix = os.path.basename(args.file) + ".delta-"
+        for name in os.listdir(directory):
+            if name.startswith(prefix):
+                os.remove(os.path.join(directory, name))
+        capture = ChangeCapture(
+            r, db=int(args.db), configure=getattr(args, "configure_notifications", False)
+        )
+        capture.start()
+        try:
+            with open(args.file, 'w') as f:
+                JSONDumper(
+                    f, args.ttl,
+                    workers=int(getattr(args, "encoder_workers", 1)),
+                    **self._dumper_options()
+                ).dump(r)
+            sequence = 0
+            while True:
+                time.sleep(float(getattr(args, "delta_interval", 3600)))
+                sequence += 1
+                path = f"{args.file}.delta-{sequence:06d}"
+                with open(path + ".tmp", 'w') as f:
+                    count = capture.delta(f, args.ttl)
+                os.replace(path + ".tmp", path)
+                print(f"Number of Changed Keys: {count} in {path}", file=sys.stderr)
+        finally:
+            capture.stop()
+
+    def _differential_dump(self, f):
+        """
+        Writes only the keys changed since the dump that wrote --diff-index,
+        and the deleted keys, to f; the result is restored with --deltas.
+        """
+        args = self._args
+        if self._checkpoint_path() is not None or getattr(args, "index", False) or getattr(args, "shard_by", None):
+            raise Exception("--checkpoint, --resume, --index and --shard-by are not supported with --diff-index")
+        if args.type == "cluster":
+            r = RedisClusterIO(self._uri, **self._io_options(), **self._read_options())
+        else:
+            r = RedisSingleIO(self._uri, **self._io_options(), **self._read_options())
+        options = self._dumper_options()
+        out = open_writer(f, options["compression"], options["compression_level"], options["compression_threads"])
+
+        def commit():
+            if out is not f:
+                out.close()
+            f.flush()
+
+        changed, deleted = DifferentialDump(
+            r, args.diff_index, args.ttl, fingerprint=getattr(args, "fingerprint", "digest")
+        ).dump(out, commit)
+        print(f"Number of Changed Keys: {changed}, Deleted Keys: {deleted}", file=sys.stderr)
+
+    def _restore_shards(self, path):
+        args = self._args
+        if args.type == "cluster":
+            io_factory = lambda: RedisClusterIO(
+                self._uri, parallel_writes=getattr(args, "parallel_writes", False),
+                **self._io_options(), **self._write_options()
+            )
+        else:
+            io_factory = lambda: RedisSingleIO(self._uri, **self._io_options(), **self._write_options())
+        ParallelRestore(
+            path,
+            io_factory,
+            workers=int(getattr(args, "restore_workers", 4)),
+            rate_limit=float(getattr(args, "rate_limit", 0)),
+            checkpoint=self._checkpoint()
+        ).restore()
+
+    def run(self, f):
+        args = self._args
         getattr(self, f"_execute_{args.type}_redis")(f, args.mode, args.ttl)
 
     def _get_redis_uri(self):
@@ -57,10 +383,122 @@ if __name__ == "__main__":
     parser.add_argument('--output-stdout', action='store_true')
     parser.add_argument('--input-stdin', action='store_true')
     parser.add_argument('--file', '-F', nargs='?', default="dump.json")
-    parser.add_argument('--mode', '-M', required=True, choices=['dump', 'restore'])
+    parser.add_argument('--mode', '-M', required=True, choices=['dump', 'restore', 'capture'],
+                        help='capture dumps --file in full and then writes deltas of the changed keys '
+                             'from keyevent notifications')
     parser.add_argument('--type', '-T', required=True, choices=['single', 'cluster'])
     parser.add_argument('--db', '-D', nargs='?', default=0)
     parser.add_argument('--ttl', action='store_true')
+    parser.add_argument('--cluster-workers', type=int, default=1,
+                        help='number of cluster nodes dumped in parallel, each over a single pipeline')
+    parser.add_argument('--format', default='json', choices=['json', 'rdb-payload'],
+                        help='rdb-payload dumps keys with DUMP and restores them with RESTORE REPLACE; '
+                             'payloads only restore on a Redis with a compatible RDB version; '
+                             'their records keep the TTL in milliseconds')
+    parser.add_argument('--chunk-threshold', type=int, default=0,
+                        help='stream lists, sets, hashes and zsets with more elements than this in windows; 0 disables')
+    parser.add_argument('--chunk-size', type=int, default=10000,
+                        help='number of elements per window of a chunked key')
+    parser.add_argument('--encoder-workers', type=int, default=1,
+                        help='number of processes that base64/JSON encode fetched batches')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='use redis.asyncio and overlap fetching with encoding and writing (single redis only)')
+    parser.add_argument('--prefetch', type=int, default=2,
+                        help='number of batches fetched ahead of the writer in --async mode')
+    parser.add_argument('--scripts', action='store_true',
+                        help='fetch every batch in one Lua script call; fewer round trips, but the server is '
+                             'blocked while the script runs over the whole batch')
+    parser.add_argument('--value-encoding', default='base64', choices=['base64', 'auto'],
+                        help='auto writes UTF-8 values as plain JSON strings and base64 only for binary ones; '
+                             'restore reads both')
+    parser.add_argument('--restore-batch-size', type=int, default=1000,
+                        help='number of keys sent per restore pipeline')
+    parser.add_argument('--restore-batch-bytes', type=int, default=0,
+                        help='also send a restore pipeline once its values reach about this many bytes; 0 disables')
+    parser.add_argument('--parallel-writes', action='store_true',
+                        help='restore a cluster through one pipeline worker per master, routing keys by hash slot')
+    parser.add_argument('--binary', action='store_true',
+                        help='use the length-prefixed binary format instead of JSON lines; '
+                             'raw values, no base64, CRC checked blocks')
+    parser.add_argument('--compression', default='none', choices=['none', 'gzip', 'zstd', 'lz4'],
+                        help='compress dumps in-process; restore detects the codec by itself. '
+                             'zstd needs Python 3.14 or the zstandard package, lz4 the lz4 package')
+    parser.add_argument('--compression-level', type=int, default=None)
+    parser.add_argument('--compression-threads', type=int, default=1,
+                        help='number of threads compressing blocks of the dump')
+    parser.add_argument('--shard-by', default=None, choices=SHARD_BY,
+                        help='dump into shard files in --shard-dir, with a manifest.json, instead of one file')
+    parser.add_argument('--shard-dir', default='dump')
+    parser.add_argument('--shards', type=int, default=16,
+                        help='number of slot ranges with --shard-by slot')
+    parser.add_argument('--shard-max-records', type=int, default=1000000)
+    parser.add_argument('--shard-max-bytes', type=int, default=1 << 30)
+    parser.add_argument('--restore-workers', type=int, default=4,
+                        help='number of shards restored at once when --file is a shard directory or manifest')
+    parser.add_argument('--rate-limit', type=float, default=0,
+                        help='maximum restored keys per second over all restore workers; 0 disables')
+    parser.add_argument('--no-delete', action='store_true',
+                        help='do not DEL strings and payloads before restoring them; only safe when the target '
+                             'is empty. Lists, sets, hashes and zsets are still deleted before their first record, '
+                             'as records written twice would append their elements twice')
+    parser.add_argument('--checkpoint', default=None,
+                        help='file the dump or restore progress is saved to; with --resume it defaults to '
+                             '<file>.checkpoint or checkpoint.json in --shard-dir for dumps and to '
+                             '<file>.restore-checkpoint or .restore-checkpoint.json in the shard directory for restores')
+    parser.add_argument('--checkpoint-interval', type=float, default=60,
+                        help='seconds between checkpoints')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue from the checkpoint of a failed run, if there is one')
+    parser.add_argument('--index', action='store_true',
+                        help='also write a key and slot index of the dump to <file>.idx (uncompressed dumps only)')
+    parser.add_argument('--slots', default=None,
+                        help='restore only the hash slots FIRST-LAST, found through <file>.idx')
+    parser.add_argument('--delta-interval', type=float, default=3600,
+                        help='seconds between the deltas written in capture mode')
+    parser.add_argument('--configure-notifications', action='store_true',
+                        help='turn on keyevent notifications with CONFIG SET in capture mode')
+    parser.add_argument('--diff-index', default=None,
+                        help='dump only the keys changed since the dump that wrote this fingerprint index, '
+                             'and update it; restore the output with --deltas')
+    parser.add_argument('--fingerprint', default='digest', choices=['digest', 'size'],
+                        help='digest uses DEBUG DIGEST-VALUE and falls back to size where DEBUG is not allowed; '
+                             'size compares type and length only; keys with a TTL are always dumped')
+    parser.add_argument('--read-from-replicas', action='store_true',
+                        help='dump through the least lagged online replica of every master, '
+                             'falling back to the master where there is none')
+    parser.add_argument('--max-replica-lag', type=float, default=10,
+                        help='seconds since the last replication ack above which a replica is not read from')
+    parser.add_argument('--scan-target-latency', type=float, default=0,
+                        help='milliseconds a dump round trip may take; batches shrink and pause to stay within it, '
+                             '0 scans at full speed')
+    parser.add_argument('--scan-min-batch', type=int, default=100,
+                        help='smallest SCAN COUNT and fetch batch of the throttled dump')
+    parser.add_argument('--scan-info-interval', type=float, default=0,
+                        help='seconds between INFO samples of every scanned node; 0 disables, '
+                             f'unless a --scan-max-* cap is given, which samples every {DEFAULT_INFO_INTERVAL:g}s')
+    parser.add_argument('--scan-max-server-ops', type=int, default=0,
+                        help='back off while a node reports more instantaneous_ops_per_sec than this')
+    parser.add_argument('--scan-max-blocked-clients', type=int, default=0,
+                        help='back off while a node reports more blocked_clients than this')
+    parser.add_argument('--scan-rate-limit', type=float, default=0,
+                        help='maximum keys read per second over all nodes while dumping; 0 disables')
+    parser.add_argument('--restore-target-latency', type=float, default=0,
+                        help='milliseconds a restore pipeline may take; slower pipelines add a pause before '
+                             'the next one, 0 disables')
+    parser.add_argument('--restore-info-interval', type=float, default=0,
+                        help='seconds between INFO memory and replication samples of the target masters '
+                             'while restoring; 0 disables, unless --restore-max-replica-lag is given, '
+                             f'which samples every {DEFAULT_INFO_INTERVAL:g}s')
+    parser.add_argument('--restore-max-memory-ratio', type=float, default=0.9,
+                        help='pause restoring while used_memory is above this share of maxmemory, '
+                             'slow down within 0.1 of it')
+    parser.add_argument('--restore-max-replica-lag', type=int, default=0,
+                        help='pause restoring while a replica is this many bytes behind its master, '
+                             'slow down from half of it; 0 ignores replicas')
+    parser.add_argument('--restore-max-pause', type=float, default=300,
+                        help='seconds a restore waits for memory or replicas to recover before failing')
+    parser.add_argument('--deltas', nargs='*', default=[],
+                        help='deltas restored in the given order after --file')
 
     args = parser.parse_args()
 
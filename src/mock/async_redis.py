@@ -0,0 +1,46 @@
+import redis
+
+from .redis import MockRedis
+
+
+class AsyncMockPipeline:
+    """
+    Commands queue synchronously, as on a redis.asyncio pipeline.
+    """
+    def __init__(self, sync):
+        self.sync = sync
+
+    def __getattr__(self, name):
+        return getattr(self.sync, name)
+
+    async def execute(self):
+        return self.sync.execute()
+
+
+class AsyncMockRedis:
+    def __init__(self, cache=dict(), ttls=dict()):
+        self.sync = MockRedis(cache, ttls)
+
+    def __getattr__(self, name):
+        return getattr(self.sync, name)
+
+    def pipeline(self, transaction=False):
+        return AsyncMockPipeline(self.sync.pipeline(transaction))
+
+    def register_script(self, script):
+        async def run(keys=[], args=[], client=None):
+            raise redis.exceptions.ResponseError("ERR unknown command 'EVALSHA'")
+        return run
+
+    async def delete(self, key):
+        return self.sync.delete(key)
+
+    async def dbsize(self):
+        return self.sync.dbsize()
+
+    async def scan_iter(self, match, count):
+        for key in self.sync.scan_iter(match, count):
+            yield key
+
+    async def close(self):
+        ...
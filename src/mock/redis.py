@@ -1,6 +1,8 @@
 import re
 from datetime import timedelta
 
+import redis
+
 from src.redis_lib.io import is_iterable
 from .args import ArgsMock
 
@@ -17,6 +19,7 @@ class MockRedis:
     def get_nodes(self):
         node = ArgsMock()
         node.add("redis_connection", self)
+        node.add("name", f"mock-{id(self)}")
         return [node]
 
     def delete(self, key):
@@ -192,8 +195,20 @@ class MockRedis:
         self.__return_values.append(val)
         return val
     
-    def scan(self, cursor, match=None):
-        return self._scan(cursor, match, False)
+    def ping(self):
+        return True
+
+    def dbsize(self):
+        return len(self.cache)
+
+    def scan(self, cursor=0, match=None, count=None):
+        """
+        Pages through the keys in insertion order; the cursor is an index.
+        """
+        keys = self._scan(0, match or "*", True)[1]
+        count = count or 10
+        end = cursor + count
+        return [end if end < len(keys) else 0, [self._encode(key) for key in keys[cursor:end]]]
     
     def _scan(self, cursor, match=None, internal=False):
         ret = []
@@ -215,7 +230,7 @@ class MockRedis:
         val = "UnKnOwN"
         if key not in self.cache:
             val = "none"
-        if isinstance(self.cache[key], str):
+        elif isinstance(self.cache[key], str):
             val = "string"
         elif isinstance(self.cache[key], list):
             val = "list"
@@ -241,6 +256,11 @@ class MockRedis:
         self.__non_decoded_queries[len(self.__return_values)-1] = True
         return val
 
+    def register_script(self, script):
+        def run(keys=[], args=[], client=None):
+            raise redis.exceptions.ResponseError("ERR unknown command 'EVALSHA'")
+        return run
+
     def cache_overwrite(self, cache=dict()):
         self.cache = cache
 
@@ -0,0 +1,2 @@
+from .multipart import MultipartUpload
+from .multipart_test import *
@@ -0,0 +1,133 @@
+import io
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+MAX_PARTS = 10000
+
+
+class MultipartUpload(io.BufferedIOBase):
+    """
+    Writable binary stream that uploads to `bucket`/`key` with an S3
+    multipart upload. Parts of `part_size` bytes are uploaded by
+    `concurrency` threads; at most `concurrency` parts are in flight, so
+    memory stays around (concurrency + 1) * part_size. A failed part is
+    retried `max_retries` times before the upload is aborted.
+
+    Use it as a context manager: leaving the block normally completes the
+    upload, leaving it with an exception aborts it.
+    """
+    def __init__(
+        self,
+        client,
+        bucket: str,
+        key: str,
+        part_size: int = 64 * 1024 * 1024,
+        concurrency: int = 4,
+        max_retries: int = 5,
+        retry_backoff: float = 1.0
+    ) -> None:
+        super().__init__()
+        self._client = client
+        self._bucket = bucket
+        self._key = key
+        self._part_size = part_size
+        self._max_retries = max_retries
+        self._retry_backoff = retry_backoff
+        self._buffer = bytearray()
+        self._slots = BoundedSemaphore(max(1, concurrency))
+        self._pool = ThreadPoolExecutor(max_workers=max(1, concurrency))
+        self._futures = []
+        self._upload_id = None
+        self._finished = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        while len(self._buffer) >= self._part_size:
+            part = bytes(self._buffer[:self._part_size])
+            del self._buffer[:self._part_size]
+            self._submit(part)
+        return len(data)
+
+    def _submit(self, part: bytes) -> None:
+        if self._upload_id is None:
+            self._upload_id = self._client.create_multipart_upload(Bucket=self._bucket, Key=self._key)["UploadId"]
+        for future in self._futures:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+        part_number = len(self._futures) + 1
+        if part_number > MAX_PARTS:
+            raise ValueError(f"more than {MAX_PARTS} parts, use a bigger part size")
+        self._slots.acquire()
+        self._futures.append(self._pool.submit(self._upload_part, part_number, part))
+
+    def _upload_part(self, part_number: int, part: bytes) -> dict:
+        try:
+            attempt = 0
+            while True:
+                try:
+                    response = self._client.upload_part(
+                        Bucket=self._bucket,
+                        Key=self._key,
+                        UploadId=self._upload_id,
+                        PartNumber=part_number,
+                        Body=part
+                    )
+                    return {"ETag": response["ETag"], "PartNumber": part_number}
+                except Exception as e:
+                    if attempt >= self._max_retries:
+                        raise
+                    logger.warning(f"Uploading part {part_number} failed ({e}), retrying...")
+                    time.sleep(self._retry_backoff * 2 ** attempt)
+                    attempt += 1
+        finally:
+            self._slots.release()
+
+    def complete(self) -> None:
+        if self._finished:
+            return
+        # the last part may be smaller than part_size, or empty for an empty stream
+        if self._buffer or not self._futures:
+            self._submit(bytes(self._buffer))
+            self._buffer = bytearray()
+        parts: List[dict] = [future.result() for future in self._futures]
+        self._client.complete_multipart_upload(
+            Bucket=self._bucket,
+            Key=self._key,
+            UploadId=self._upload_id,
+            MultipartUpload={"Parts": parts}
+        )
+        self._finished = True
+        self._pool.shutdown()
+
+    def abort(self) -> None:
+        if self._finished:
+            return
+        self._finished = True
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        if self._upload_id is not None:
+            self._client.abort_multipart_upload(Bucket=self._bucket, Key=self._key, UploadId=self._upload_id)
+
+    def close(self) -> None:
+        """
+        Closing without complete() aborts the upload.
+        """
+        if not self.closed:
+            try:
+                self.abort()
+            finally:
+                super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        try:
+            if exc_type is None:
+                self.complete()
+        finally:
+            self.close()
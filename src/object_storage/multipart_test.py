@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import MagicMock
+
+from .multipart import MultipartUpload
+
+
+class MultipartUploadTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.client = MagicMock()
+        self.client.create_multipart_upload.return_value = {"UploadId": "id"}
+        self.client.upload_part.side_effect = lambda **kwargs: {"ETag": f"etag{kwargs['PartNumber']}"}
+
+    def _upload(self, **options) -> MultipartUpload:
+        return MultipartUpload(self.client, "bucket", "key", retry_backoff=0, **options)
+
+    def _bodies(self) -> bytes:
+        calls = sorted(self.client.upload_part.call_args_list, key=lambda c: c.kwargs["PartNumber"])
+        return b"".join(c.kwargs["Body"] for c in calls)
+
+    def test_upload_in_parts(self):
+        with self._upload(part_size=4, concurrency=2) as upload:
+            upload.write(b"0123456")
+            upload.write(b"789")
+        self.assertEqual(self.client.upload_part.call_count, 3)
+        self.assertEqual(self._bodies(), b"0123456789")
+        self.client.complete_multipart_upload.assert_called_once_with(
+            Bucket="bucket",
+            Key="key",
+            UploadId="id",
+            MultipartUpload={"Parts": [
+                {"ETag": "etag1", "PartNumber": 1},
+                {"ETag": "etag2", "PartNumber": 2},
+                {"ETag": "etag3", "PartNumber": 3},
+            ]}
+        )
+
+    def test_empty_stream(self):
+        with self._upload(part_size=4):
+            pass
+        self.assertEqual(self._bodies(), b"")
+        self.client.complete_multipart_upload.assert_called_once()
+
+    def test_failed_part_is_retried(self):
+        failures = [Exception("timeout")]
+
+        def upload_part(**kwargs):
+            if failures:
+                raise failures.pop()
+            return {"ETag": "etag"}
+        self.client.upload_part.side_effect = upload_part
+        with self._upload(part_size=4, concurrency=1) as upload:
+            upload.write(b"0123")
+        self.assertEqual(self.client.upload_part.call_count, 2)
+        self.client.complete_multipart_upload.assert_called_once()
+
+    def test_abort_after_retries(self):
+        self.client.upload_part.side_effect = Exception("down")
+        with self.assertRaises(Exception):
+            with self._upload(part_size=4, max_retries=1) as upload:
+                upload.write(b"0123")
+        self.assertEqual(self.client.upload_part.call_count, 2)
+        self.client.complete_multipart_upload.assert_not_called()
+        self.client.abort_multipart_upload.assert_called_once_with(Bucket="bucket", Key="key", UploadId="id")
+
+    def test_abort_on_exception(self):
+        with self.assertRaises(RuntimeError):
+            with self._upload(part_size=4) as upload:
+                upload.write(b"01234")
+                raise RuntimeError("dump failed")
+        self.client.complete_multipart_upload.assert_not_called()
+        self.client.abort_multipart_upload.assert_called_once()
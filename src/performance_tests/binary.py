@@ -0,0 +1,68 @@
+import sys
+import json
+import time
+import tempfile
+from io import StringIO
+
+from src.redis_lib.binary_format import BlockWriter, iter_blocks, iter_records
+from src.redis_lib.dumpers import encode_json_lines, record_value
+from src.redis_lib.io import TYPE_HANDLERS, base_type, decode_value
+from src.performance_tests.encoders import generate_records
+
+
+def raw_batch(records):
+    types = [t for t, _ in records]
+    keys = [f"key:{i}" for i in range(len(records))]
+    return types, keys, [r for _, r in records], [-1] * len(records)
+
+
+def dump_json(batch):
+    f = StringIO()
+    f.write(encode_json_lines(batch, True)[1])
+    return f.getvalue().encode("utf-8")
+
+
+def dump_binary(batch, f):
+    writer = BlockWriter(f)
+    for record in zip(*batch):
+        writer.write(*record)
+    writer.close()
+
+
+def restore_json(data):
+    for line in data.decode("utf-8").splitlines():
+        j = json.loads(line)
+        decode_value(TYPE_HANDLERS[base_type(j["type"])], record_value(j))
+
+
+def restore_binary(f):
+    for payload in iter_blocks(f):
+        for _ in iter_records(payload):
+            ...
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    ret = func(*args)
+    return ret, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    members = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    batch = raw_batch(generate_records(count, members))
+
+    json_data, json_dump = timed(dump_json, batch)
+    _, json_restore = timed(restore_json, json_data)
+
+    with tempfile.TemporaryFile() as f:
+        _, binary_dump = timed(dump_binary, batch, f)
+        binary_size = f.tell()
+        f.seek(0)
+        _, binary_restore = timed(restore_binary, f)
+
+    print(f"{count} records, {members} members per collection", file=sys.stderr)
+    print(f"json:   {len(json_data):>12,} bytes, dump {count / json_dump:>10,.0f} records/sec, "
+          f"restore {count / json_restore:>10,.0f} records/sec", file=sys.stderr)
+    print(f"binary: {binary_size:>12,} bytes, dump {count / binary_dump:>10,.0f} records/sec, "
+          f"restore {count / binary_restore:>10,.0f} records/sec", file=sys.stderr)
@@ -0,0 +1,48 @@
+import sys
+import time
+import random
+
+from src.redis_lib.io import TYPE_HANDLERS, b64enc, decode
+from src.redis_lib.encoders import ENCODERS
+
+
+def legacy_encode(_type, raw):
+    return TYPE_HANDLERS[_type].process_result(decode(b64enc(decode(raw))))
+
+
+def fast_encode(_type, raw):
+    return ENCODERS[_type](raw)
+
+
+def random_bytes(size=16):
+    return bytes(random.choices(b"abcdefghijklmnopqrstuvwxyz0123456789", k=size))
+
+
+def generate_records(count, members):
+    generators = {
+        "string": lambda: random_bytes(64),
+        "list": lambda: [random_bytes() for _ in range(members)],
+        "set": lambda: {random_bytes() for _ in range(members)},
+        "hash": lambda: {random_bytes(): random_bytes() for _ in range(members)},
+        "zset": lambda: [(random_bytes(), random.random() * 1000) for _ in range(members)],
+    }
+    types = list(generators)
+    return [(t, generators[t]()) for t in (types[i % len(types)] for i in range(count))]
+
+
+def run(encoder, records):
+    start = time.perf_counter()
+    for _type, raw in records:
+        encoder(_type, raw)
+    return len(records) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    members = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    records = generate_records(count, members)
+    legacy = run(legacy_encode, records)
+    fast = run(fast_encode, records)
+    print(f"{count} records, {members} members per collection", file=sys.stderr)
+    print(f"legacy b64applier: {legacy:,.0f} records/sec", file=sys.stderr)
+    print(f"type encoders:     {fast:,.0f} records/sec ({fast / legacy:.1f}x)", file=sys.stderr)
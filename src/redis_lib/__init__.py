@@ -1,8 +1,20 @@
 from .io import RedisPatternIO
-from .dumpers import JSONDumper, CSVDumper
+from .dumpers import BinaryDumper, JSONDumper, CSVDumper
 from .type_handlers_test import *
 from .dumpers_test import *
 from .io_test import *
+from .utils_test import *
+from .async_io_test import *
+from .encoders_test import *
+from .compression_test import *
+from .shards_test import *
+from .binary_format_test import *
+from .mapped_test import *
+from .index_test import *
+from .changes_test import *
+from .differential_test import *
+from .replicas_test import *
+from .throttle_test import *
 from .type_handlers import *
 
-__all__ = ["JSONDumper", "CSVDumper"]
+__all__ = ["JSONDumper", "CSVDumper", "BinaryDumper"]
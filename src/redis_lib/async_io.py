@@ -0,0 +1,101 @@
+import asyncio
+from contextlib import suppress
+from typing import AsyncIterable, List, Tuple
+
+import redis.asyncio
+
+from .io import RedisPatternIO, decode
+from .utils import drive_async
+
+
+_DONE = object()
+
+
+class AsyncRedisIO(RedisPatternIO):
+    """
+    RedisPatternIO over redis.asyncio. SCAN and the fetch pipelines of the
+    next `prefetch` batches run while the current batch is being encoded
+    and written, so use it with `JSONDumper.dump_async`/`restore_async`.
+    """
+    def __init__(
+        self,
+        uri: str = None,
+        pattern: str = None,
+        cli: redis.asyncio.Redis = None,
+        prefetch: int = 2,
+        **options
+    ):
+        if options.get("chunk_threshold"):
+            raise ValueError("AsyncRedisIO does not read collections in chunks")
+        _cli = cli
+        if _cli is None:
+            _cli = redis.asyncio.Redis.from_url(uri, decode_responses=False)
+        super().__init__(_cli, pattern, **options)
+        self.prefetch = prefetch
+
+    async def count_keys(self) -> int:
+        return await self.cli.dbsize()
+
+    async def fetch_raw(self, keys: List[str]) -> Tuple[List[str], List[any], List[int]]:
+        return await drive_async(self._fetch_raw_steps(keys))
+
+    async def _aiter_key_batches(self) -> AsyncIterable[List[str]]:
+        batch = []
+        async for key in self.cli.scan_iter(self.pattern, count=10000):
+            batch.append(key)
+            if len(batch) >= 10000:
+                yield decode(batch)
+                batch = []
+        if len(batch) > 0:
+            yield decode(batch)
+
+    async def aiter_raw_batches(self) -> AsyncIterable[Tuple[List[str], List[str], List[any], List[int]]]:
+        """
+        AsyncIterable[(types, keys, raw values, ttls)], fetched up to
+        `prefetch` batches ahead of the consumer.
+        """
+        queue = asyncio.Queue(maxsize=max(1, self.prefetch))
+
+        async def produce():
+            try:
+                async for keys in self._aiter_key_batches():
+                    types, raw_values, ttls = await self.fetch_raw(keys)
+                    await queue.put((types, keys, raw_values, ttls))
+            except Exception as e:
+                await queue.put(e)
+                return
+            await queue.put(_DONE)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            producer.cancel()
+            with suppress(asyncio.CancelledError):
+                await producer
+
+    async def __aiter__(self) -> AsyncIterable[Tuple[str, str, any, int]]:
+        async for raw_batch in self.aiter_raw_batches():
+            for record in self.encode_batch(raw_batch):
+                yield record
+
+    def __iter__(self):
+        raise TypeError("AsyncRedisIO is iterated with `async for`")
+
+    async def write(self, key: str, _type: str, val: any, ttl: int) -> None:
+        if self._queue_write(key, _type, val, ttl):
+            await self.flush()
+
+    async def flush(self) -> None:
+        self._reset_pending()
+        if len(self.pipe.command_stack) > 0:
+            await self.pipe.execute()
+
+    async def close(self) -> None:
+        await self.cli.close()
@@ -0,0 +1,64 @@
+import asyncio
+import unittest
+
+from .async_io import AsyncRedisIO
+from .dumpers import JSONDumper
+from .io import b64dec, b64enc, decode
+from src.mock.async_redis import AsyncMockRedis
+from src.mock.file import FileMock
+
+
+class AsyncRedisIOTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._redis_data = {
+            "hash": {"__type": "hash", "value": {"foo1": "bar"}},
+            "set": {"__type": "set", "value": ["1", "2", "3"]},
+            "string": "test",
+        }
+        self._redis_ttls = {"hash": 10, "set": -1, "string": 20}
+        self._io = AsyncRedisIO(cli=AsyncMockRedis(self._redis_data, self._redis_ttls), prefetch=1, use_scripts=True)
+
+    def _collect(self):
+        async def collect():
+            return [record async for record in self._io]
+        return asyncio.run(collect())
+
+    def test_iter(self):
+        returned_value = [(t, k, decode(b64dec(v)), ttl) for t, k, v, ttl in self._collect()]
+        expected_value = [
+            ("hash", "hash", {"foo1": "bar"}, 10),
+            ("set", "set", ["1", "2", "3"], -1),
+            ("string", "string", "test", 20),
+        ]
+        self.assertEqual(returned_value, expected_value)
+        self.assertFalse(self._io.use_scripts)
+
+    def test_early_close_awaits_producer(self):
+        async def first_batch():
+            batches = self._io.aiter_raw_batches()
+            await batches.__anext__()
+            await batches.aclose()
+            return asyncio.all_tasks() - {asyncio.current_task()}
+        self.assertEqual(asyncio.run(first_batch()), set())
+
+    def test_sync_iter_is_rejected(self):
+        with self.assertRaises(TypeError):
+            list(self._io)
+
+    def test_chunking_is_rejected(self):
+        with self.assertRaises(ValueError):
+            AsyncRedisIO(cli=AsyncMockRedis({}, {}), chunk_threshold=10)
+
+    def test_dump_async(self):
+        f = FileMock()
+        asyncio.run(JSONDumper(f, True, False, False).dump_async(self._io))
+        lines = f.get_content().strip().split("\n")
+        self.assertEqual(len(lines), 3)
+        self.assertIn('"key": "string", "type": "string"', lines[2])
+
+    def test_write(self):
+        async def write():
+            await self._io.write("new", "string", b64enc("value"), -1)
+            await self._io.flush()
+        asyncio.run(write())
+        self.assertEqual(self._redis_data["new"], "value")
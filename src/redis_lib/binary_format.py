@@ -0,0 +1,248 @@
+"""
+Length-prefixed binary dump format.
+
+    header  MAGIC (4 bytes) | version u16 | flags u16
+    block   payload length u32 | crc32 of payload u32 | record count u32 | payload
+    end     a block header with payload length 0
+
+Every record in a payload is
+
+    type tag u8 | flags u8 | ttl i64 | key (u32 length + bytes) | value
+
+where value is, by type, nothing (none), one length-prefixed blob (string,
+rdb-payload), a u32 count of blobs (list, set), of blob pairs (hash) or of
+blob + f64 score pairs (zset). Integers are little endian.
+"""
+import struct
+import zlib
+from typing import IO, Iterable, Tuple
+
+from .io import CHUNK_SUFFIX, base_type
+from .mapped import map_file
+
+MAGIC = b"RDJB"
+VERSION = 1
+BLOCK_SIZE = 1 << 20
+
+HEADER = struct.Struct("<4sHH")
+BLOCK = struct.Struct("<III")
+RECORD = struct.Struct("<BBqI")
+U32 = struct.Struct("<I")
+F64 = struct.Struct("<d")
+
+TYPE_TAGS = {
+    "none": 0,
+    "string": 1,
+    "list": 2,
+    "set": 3,
+    "hash": 4,
+    "zset": 5,
+    "rdb-payload": 6,
+}
+TAG_TYPES = {tag: _type for _type, tag in TYPE_TAGS.items()}
+CONTINUATION = 1
+
+
+class FormatError(ValueError):
+    ...
+
+
+def to_bytes(x) -> bytes:
+    if isinstance(x, bytes):
+        return x
+    if isinstance(x, str):
+        return x.encode("utf-8")
+    return str(x).encode("utf-8")
+
+
+def _blob(parts: list, x) -> None:
+    x = to_bytes(x)
+    parts.append(U32.pack(len(x)))
+    parts.append(x)
+
+
+def encode_record(parts: list, _type: str, key: str, raw: any, ttl: int) -> None:
+    """
+    Appends the encoded record to `parts`; `raw` is a raw pipeline reply.
+    """
+    t = base_type(_type)
+    flags = CONTINUATION if _type.endswith(CHUNK_SUFFIX) else 0
+    key = to_bytes(key)
+    parts.append(RECORD.pack(TYPE_TAGS[t], flags, ttl, len(key)))
+    parts.append(key)
+    if t == "none":
+        return
+    if t in ("string", "rdb-payload"):
+        _blob(parts, raw if raw is not None else b"")
+    elif t in ("list", "set"):
+        raw = raw or ()
+        parts.append(U32.pack(len(raw)))
+        for member in raw:
+            _blob(parts, member)
+    elif t == "hash":
+        raw = raw or {}
+        parts.append(U32.pack(len(raw)))
+        for field, value in raw.items():
+            _blob(parts, field)
+            _blob(parts, value)
+    elif t == "zset":
+        raw = raw or ()
+        parts.append(U32.pack(len(raw)))
+        for member, score in raw:
+            _blob(parts, member)
+            parts.append(F64.pack(float(score)))
+
+
+class BlockWriter:
+    """
+    Buffers encoded records and writes them to `f` in CRC'd blocks of about
+    `block_size` bytes.
+    """
+    def __init__(self, f: IO[bytes], block_size: int = BLOCK_SIZE) -> None:
+        self._f = f
+        self._block_size = block_size
+        self._parts = []
+        self._size = 0
+        self._records = 0
+        self._f.write(HEADER.pack(MAGIC, VERSION, 0))
+
+    def write(self, _type: str, key: str, raw: any, ttl: int) -> None:
+        start = len(self._parts)
+        encode_record(self._parts, _type, key, raw, ttl)
+        self._size += sum(len(part) for part in self._parts[start:])
+        self._records += 1
+        if self._size >= self._block_size:
+            self._write_block()
+
+    def _write_block(self) -> None:
+        payload = b"".join(self._parts)
+        self._f.write(BLOCK.pack(len(payload), zlib.crc32(payload), self._records))
+        self._f.write(payload)
+        self._parts = []
+        self._size = 0
+        self._records = 0
+
+    def close(self) -> None:
+        if self._records:
+            self._write_block()
+        self._f.write(BLOCK.pack(0, 0, 0))
+        self._f.flush()
+
+
+def _check_header(header) -> None:
+    if len(header) < HEADER.size:
+        raise FormatError("not a binary dump: truncated header")
+    magic, version, _ = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise FormatError("not a binary dump")
+    if version > VERSION:
+        raise FormatError(f"binary dump version {version} is newer than this reader ({VERSION})")
+
+
+def _check_block(payload, crc: int) -> None:
+    if zlib.crc32(payload) != crc:
+        raise FormatError("block checksum mismatch")
+
+
+def iter_blocks(f: IO[bytes]) -> Iterable[memoryview]:
+    """
+    Payloads of the blocks of `f`. Regular files are mapped with mmap and
+    the payloads are views into the mapping, released when the next block
+    is read; other streams are read block by block. The mapping is closed
+    at the end, or once the last view of it is gone if the consumer still
+    holds slices of a payload.
+    """
+    mapping = map_file(f)
+    if mapping is not None:
+        try:
+            yield from _iter_mapped_blocks(mapping)
+        finally:
+            try:
+                mapping.close()
+            except BufferError:
+                pass
+        return
+    _check_header(f.read(HEADER.size))
+    while True:
+        header = f.read(BLOCK.size)
+        if len(header) < BLOCK.size:
+            raise FormatError("truncated dump: missing end block")
+        length, crc, _ = BLOCK.unpack(header)
+        if length == 0:
+            return
+        payload = f.read(length)
+        if len(payload) < length:
+            raise FormatError("truncated block")
+        _check_block(payload, crc)
+        yield memoryview(payload)
+
+
+def _iter_mapped_blocks(buffer) -> Iterable[memoryview]:
+    with memoryview(buffer) as view:
+        _check_header(view[:HEADER.size])
+        offset = HEADER.size
+        while True:
+            if offset + BLOCK.size > len(view):
+                raise FormatError("truncated dump: missing end block")
+            length, crc, _ = BLOCK.unpack_from(view, offset)
+            offset += BLOCK.size
+            if length == 0:
+                return
+            if offset + length > len(view):
+                raise FormatError("truncated block")
+            payload = view[offset:offset + length]
+            _check_block(payload, crc)
+            yield payload
+            payload.release()
+            offset += length
+
+
+def iter_records(payload: memoryview) -> Iterable[Tuple[str, str, any, int]]:
+    """
+    (type, key, value, ttl) of every record of a block. Blobs are
+    memoryview slices of `payload`, not copies.
+    """
+    offset = 0
+    end = len(payload)
+    unpack_record = RECORD.unpack_from
+    unpack_u32 = U32.unpack_from
+    unpack_f64 = F64.unpack_from
+
+    def blob():
+        nonlocal offset
+        (length,) = unpack_u32(payload, offset)
+        offset += 4
+        value = payload[offset:offset + length]
+        offset += length
+        return value
+
+    while offset < end:
+        tag, flags, ttl, key_length = unpack_record(payload, offset)
+        offset += RECORD.size
+        key = str(payload[offset:offset + key_length], "utf-8")
+        offset += key_length
+        _type = TAG_TYPES[tag]
+        if _type == "none":
+            value = None
+        elif _type in ("string", "rdb-payload"):
+            value = blob()
+        else:
+            (count,) = unpack_u32(payload, offset)
+            offset += 4
+            if _type in ("list", "set"):
+                value = [blob() for _ in range(count)]
+            elif _type == "hash":
+                value = {}
+                for _ in range(count):
+                    field = blob()
+                    value[field] = blob()
+            else:
+                value = []
+                for _ in range(count):
+                    member = blob()
+                    (score,) = unpack_f64(payload, offset)
+                    offset += 8
+                    value.append((member, score))
+        if flags & CONTINUATION:
+            _type += CHUNK_SUFFIX
+        yield _type, key, value, ttl
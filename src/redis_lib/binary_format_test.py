@@ -0,0 +1,96 @@
+import tempfile
+import unittest
+from io import BytesIO
+from unittest.mock import patch
+
+from .binary_format import BlockWriter, FormatError, iter_blocks, iter_records
+from .mapped import map_file
+
+
+def materialize(val):
+    if isinstance(val, memoryview):
+        return bytes(val)
+    if isinstance(val, dict):
+        return {bytes(k): bytes(v) for k, v in val.items()}
+    if isinstance(val, list):
+        return [materialize(i) if not isinstance(i, tuple) else (bytes(i[0]), i[1]) for i in val]
+    return val
+
+
+class BinaryFormatTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.records = [
+            ("string", "str", b"\x00\xffvalue", 10),
+            ("list", "list", [b"1", b"2", b""], -1),
+            ("set", "set", [b"a"], -1),
+            ("hash", "hash", {b"f": b"\xff"}, 5),
+            ("zset", "zset", [(b"m", 1.5), (b"n", -2.0)], -1),
+            ("rdb-payload", "payload", b"\x0e\x01", -1),
+            ("none", "gone", None, -2),
+            ("list:chunk", "list", [b"3"], -1),
+        ]
+
+    def _write(self, f, block_size=1 << 20):
+        writer = BlockWriter(f, block_size)
+        for _type, key, raw, ttl in self.records:
+            writer.write(_type, key, raw, ttl)
+        writer.close()
+
+    def _read(self, f):
+        return [
+            (_type, key, materialize(val), ttl)
+            for payload in iter_blocks(f)
+            for _type, key, val, ttl in iter_records(payload)
+        ]
+
+    @staticmethod
+    def _materialize(payload):
+        return [(_type, key, materialize(val), ttl) for _type, key, val, ttl in iter_records(payload)]
+
+    def test_round_trip_stream(self):
+        buffer = BytesIO()
+        self._write(buffer, block_size=16)
+        buffer.seek(0)
+        self.assertEqual(self._read(buffer), self.records)
+
+    def test_round_trip_mmap(self):
+        with tempfile.TemporaryFile() as f:
+            self._write(f)
+            f.seek(0)
+            self.assertEqual(self._read(f), self.records)
+
+    def test_mapping_closed(self):
+        with tempfile.TemporaryFile() as f:
+            self._write(f)
+            f.seek(0)
+            mapping = map_file(f)
+            with patch("src.redis_lib.binary_format.map_file", return_value=mapping):
+                records = []
+                for payload in iter_blocks(f):
+                    records.extend(self._materialize(payload))
+            self.assertEqual(records, self.records)
+            self.assertTrue(mapping.closed)
+            mapping = map_file(f)
+            with patch("src.redis_lib.binary_format.map_file", return_value=mapping):
+                blocks = iter_blocks(f)
+                next(blocks)
+                blocks.close()
+            self.assertTrue(mapping.closed)
+
+    def test_corrupt_block(self):
+        buffer = BytesIO()
+        self._write(buffer)
+        data = bytearray(buffer.getvalue())
+        data[30] ^= 0xff
+        with self.assertRaises(FormatError):
+            self._read(BytesIO(bytes(data)))
+
+    def test_truncated(self):
+        buffer = BytesIO()
+        self._write(buffer)
+        with self.assertRaises(FormatError):
+            self._read(BytesIO(buffer.getvalue()[:-12]))
+
+    def test_not_a_binary_dump(self):
+        with self.assertRaises(FormatError):
+            self._read(BytesIO(b'{"key": "k"}\n'))
@@ -0,0 +1,120 @@
+from fnmatch import fnmatchcase
+from threading import Event, Lock, Thread
+from typing import IO, List, Set
+
+import redis
+
+from .dumpers import encode_json_lines
+from .io import SCAN_COUNT, RedisPatternIO, decode
+from .utils import to_batch
+
+
+# keyevent notifications of every class, expired and evicted included
+NOTIFY_FLAGS = "EA"
+
+
+def enable_notifications(cli: redis.Redis) -> None:
+    """
+    Adds NOTIFY_FLAGS to notify-keyspace-events, keeping what is set.
+    """
+    reply = cli.config_get("notify-keyspace-events")
+    current = decode(next(iter(reply.values()), b""))
+    cli.config_set("notify-keyspace-events", "".join(sorted(set(current) | set(NOTIFY_FLAGS))))
+
+
+class ChangeCaptureError(Exception):
+    ...
+
+
+class ChangeCapture:
+    """
+    Collects the keys changed on every master of `io` from keyevent
+    notifications (__keyevent@<db>__:*), one deduplicated set per node.
+    delta() writes the current record of every collected key as JSON lines;
+    keys that are gone are written as "none" records, which restore
+    deletes. Start it before the full dump the deltas are replayed on.
+
+    Redis does not buffer notifications: once a subscription fails changes
+    may have been missed, delta() raises ChangeCaptureError and a new full
+    dump is needed. `configure` turns the notifications on with CONFIG SET.
+    """
+    def __init__(self, io: RedisPatternIO, db: int = 0, configure: bool = False, poll_timeout: float = 1.0):
+        self._ios = io.primary_ios()
+        self._channel = f"__keyevent@{db}__:*"
+        self._configure = configure
+        self._poll_timeout = poll_timeout
+        self._dirty: List[Set[str]] = [set() for _ in self._ios]
+        self._lock = Lock()
+        self._stop = Event()
+        self._error = None
+        self._pubsubs = []
+        self._threads = []
+
+    def start(self) -> None:
+        for i, io in enumerate(self._ios):
+            if self._configure:
+                enable_notifications(io.cli)
+            pubsub = io.cli.pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(self._channel)
+            self._pubsubs.append(pubsub)
+            thread = Thread(target=self._listen, args=(i, pubsub), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _listen(self, i: int, pubsub) -> None:
+        try:
+            while not self._stop.is_set():
+                message = pubsub.get_message(timeout=self._poll_timeout)
+                if message is not None and message["type"] == "pmessage":
+                    self.add(i, decode(message["data"]))
+        except Exception as e:
+            if not self._stop.is_set():
+                self._error = e
+
+    def add(self, i: int, key: str) -> None:
+        if fnmatchcase(key, self._ios[i].pattern):
+            with self._lock:
+                self._dirty[i].add(key)
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(keys) for keys in self._dirty)
+
+    def _take(self) -> List[Set[str]]:
+        with self._lock:
+            dirty = self._dirty
+            self._dirty = [set() for _ in self._ios]
+        return dirty
+
+    def _put_back(self, dirty: List[Set[str]]) -> None:
+        with self._lock:
+            for keys, taken in zip(self._dirty, dirty):
+                keys.update(taken)
+
+    def delta(self, f: IO, preserve_ttls: bool = True) -> int:
+        """
+        Writes the keys changed since the last delta to `f` and returns
+        their number. Keys changing meanwhile go to the next delta.
+        """
+        if self._error is not None:
+            raise ChangeCaptureError("a keyevent subscription failed, changes may be missing") from self._error
+        dirty = self._take()
+        count = 0
+        try:
+            for io, keys in zip(self._ios, dirty):
+                for batch in to_batch(sorted(keys), SCAN_COUNT):
+                    for raw_batch in io.iter_raw_batches_of(batch):
+                        n, text = encode_json_lines(raw_batch, preserve_ttls, io.plain_text)
+                        f.write(text)
+                        count += n
+        except Exception:
+            self._put_back(dirty)
+            raise
+        return count
+
+    def stop(self) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        for pubsub in self._pubsubs:
+            pubsub.close()
@@ -0,0 +1,101 @@
+import time
+import unittest
+from io import StringIO
+from queue import Empty, Queue
+from unittest.mock import MagicMock
+
+from .changes import ChangeCapture, ChangeCaptureError, enable_notifications
+from .dumpers import JSONDumper
+from .io import RedisPatternIO
+from src.mock.redis import MockRedis
+from src.mock.redis_io import RedisIOMock
+
+
+class PubSubMock:
+    def __init__(self):
+        self.messages = Queue()
+        self.patterns = []
+        self.closed = False
+
+    def psubscribe(self, pattern):
+        self.patterns.append(pattern)
+
+    def publish(self, key):
+        self.messages.put({"type": "pmessage", "data": key.encode("utf-8")})
+
+    def get_message(self, timeout=0):
+        try:
+            message = self.messages.get(timeout=timeout)
+        except Empty:
+            return None
+        if isinstance(message, Exception):
+            raise message
+        return message
+
+    def close(self):
+        self.closed = True
+
+
+class ChangeCaptureTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cli = MockRedis({"a": "1", "b": "2", "other": "3"}, {})
+        self.pubsub = PubSubMock()
+        self.cli.pubsub = lambda **kwargs: self.pubsub
+
+    def _capture(self, pattern=None) -> ChangeCapture:
+        capture = ChangeCapture(RedisPatternIO(self.cli, pattern), poll_timeout=0.01)
+        capture.start()
+        self.addCleanup(capture.stop)
+        return capture
+
+    def _wait_for(self, capture, pending):
+        deadline = time.monotonic() + 5
+        while capture.pending() != pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(capture.pending(), pending)
+
+    def test_delta(self):
+        capture = self._capture()
+        self.assertEqual(self.pubsub.patterns, ["__keyevent@0__:*"])
+        for key in ("a", "gone", "a"):
+            self.pubsub.publish(key)
+        self._wait_for(capture, 2)
+        out = StringIO()
+        self.assertEqual(capture.delta(out), 2)
+        restored = RedisIOMock(list())
+        JSONDumper(StringIO(out.getvalue()), True, False, False).restore(restored)
+        self.assertEqual(restored.get_data(), [("string", "a", "MQ==", -1), ("none", "gone", "", -2)])
+        self.assertEqual(capture.pending(), 0)
+
+    def test_pattern(self):
+        capture = self._capture("a*")
+        self.pubsub.publish("other")
+        self.pubsub.publish("a")
+        self._wait_for(capture, 1)
+
+    def test_failed_subscription(self):
+        capture = self._capture()
+        self.pubsub.messages.put(ConnectionError("connection lost"))
+        deadline = time.monotonic() + 5
+        while capture._threads[0].is_alive() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with self.assertRaises(ChangeCaptureError):
+            capture.delta(StringIO())
+
+    def test_stop_closes_subscriptions(self):
+        capture = self._capture()
+        capture.stop()
+        self.assertTrue(self.pubsub.closed)
+
+    def test_enable_notifications_keeps_flags(self):
+        cli = MagicMock()
+        cli.config_get.return_value = {b"notify-keyspace-events": b"Kx"}
+        enable_notifications(cli)
+        cli.config_set.assert_called_once_with("notify-keyspace-events", "AEKx")
+
+    def test_none_record_deletes(self):
+        cli = MockRedis({"existing": "x", "gone": "1"}, {})
+        io = RedisPatternIO(cli, delete_before_write=False)
+        io.write("gone", "none", "", -2)
+        io.flush()
+        self.assertFalse("gone" in cli.cache)
@@ -0,0 +1,123 @@
+import os
+import json
+import time
+import threading
+from typing import Optional, Tuple
+
+
+def write_atomically(path: str, obj: dict) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class DumpCheckpoint:
+    """
+    Progress of a dump, saved to `path` at most every `interval` seconds:
+    the SCAN cursor of every node, the number of records written and the
+    state of the output at that point. A dump given a loaded checkpoint
+    cuts its output back to that state and continues scanning from there.
+    """
+    def __init__(self, path: str, interval: float = 60) -> None:
+        self.path = path
+        self.interval = interval
+        self.cursors = {}
+        self.records = 0
+        self.output = None
+        self._saved_at = time.monotonic()
+
+    @classmethod
+    def load(cls, path: str, interval: float = 60) -> "DumpCheckpoint":
+        checkpoint = cls(path, interval)
+        with open(path) as f:
+            state = json.load(f)
+        checkpoint.cursors = state["cursors"]
+        checkpoint.records = state["records"]
+        checkpoint.output = state["output"]
+        return checkpoint
+
+    @property
+    def resuming(self) -> bool:
+        return self.output is not None
+
+    def advance(self, position: Optional[tuple], records: int) -> None:
+        """
+        Records that everything up to `position`, (node, cursor), and
+        `records` records in total are written.
+        """
+        self.records = records
+        if position is not None:
+            name, cursor = position
+            self.cursors[name] = cursor
+
+    def due(self) -> bool:
+        return time.monotonic() - self._saved_at >= self.interval
+
+    def save(self, output: dict) -> None:
+        """
+        `output` must describe the output as flushed to disk.
+        """
+        self.output = output
+        write_atomically(self.path, {
+            "version": 1,
+            "cursors": self.cursors,
+            "records": self.records,
+            "output": output,
+        })
+        self._saved_at = time.monotonic()
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class RestoreCheckpoint:
+    """
+    Committed progress of a restore per source, the dump file or each shard
+    file: the offset after and the number of the last record whose pipeline
+    was executed, saved to `path` at most every `interval` seconds per
+    source. Offsets are None where the source cannot be seeked, as with
+    compressed dumps; those are skipped record by record.
+    """
+    def __init__(self, path: str, interval: float = 60) -> None:
+        self.path = path
+        self.interval = interval
+        self.sources = {}
+        self._saved_at = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str, interval: float = 60) -> "RestoreCheckpoint":
+        checkpoint = cls(path, interval)
+        with open(path) as f:
+            checkpoint.sources = json.load(f)["sources"]
+        return checkpoint
+
+    def position(self, source: str) -> Tuple[Optional[int], int, bool]:
+        """
+        (offset, records, done) of `source`.
+        """
+        state = self.sources.get(source)
+        if state is None:
+            return None, 0, False
+        return state["offset"], state["records"], state["done"]
+
+    def due(self, source: str) -> bool:
+        saved_at = self._saved_at.setdefault(source, time.monotonic())
+        return time.monotonic() - saved_at >= self.interval
+
+    def commit(self, source: str, offset: Optional[int], records: int, done: bool = False) -> None:
+        """
+        Call after the io was flushed, so everything up to `offset` is in Redis.
+        """
+        with self._lock:
+            self.sources[source] = {"offset": offset, "records": records, "done": done}
+            write_atomically(self.path, {"version": 1, "sources": self.sources})
+            self._saved_at[source] = time.monotonic()
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,203 @@
+import gzip
+import io
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Callable, Optional
+
+try:
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+class Codec:
+    def __init__(
+        self,
+        name: str,
+        magic: bytes,
+        compress: Callable[[bytes, int], bytes],
+        reader: Callable[[IO[bytes]], IO[bytes]],
+        level: int,
+        extension: str
+    ) -> None:
+        self.name = name
+        self.magic = magic
+        self.compress = compress
+        self.reader = reader
+        self.level = level
+        self.extension = extension
+
+
+def _zstd_codec() -> Optional[Codec]:
+    magic = b"\x28\xb5\x2f\xfd"
+    if zstd is not None:
+        return Codec(
+            "zstd", magic,
+            lambda data, level: zstd.compress(data, level=level),
+            lambda f: zstd.ZstdFile(f, "rb"),
+            3, ".zst"
+        )
+    if zstandard is not None:
+        return Codec(
+            "zstd", magic,
+            lambda data, level: zstandard.ZstdCompressor(level=level).compress(data),
+            lambda f: io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True)),
+            3, ".zst"
+        )
+    return None
+
+
+def _lz4_codec() -> Optional[Codec]:
+    if lz4_frame is None:
+        return None
+    return Codec(
+        "lz4", b"\x04\x22\x4d\x18",
+        lambda data, level: lz4_frame.compress(data, compression_level=level),
+        lambda f: lz4_frame.LZ4FrameFile(f, "rb"),
+        0, ".lz4"
+    )
+
+
+# Every block is compressed into its own gzip member / zstd or lz4 frame;
+# the readers of all three formats read concatenated members as one stream.
+CODECS = {
+    codec.name: codec
+    for codec in (
+        Codec(
+            "gzip", b"\x1f\x8b",
+            lambda data, level: gzip.compress(data, compresslevel=level, mtime=0),
+            lambda f: gzip.GzipFile(fileobj=f, mode="rb"),
+            6, ".gz"
+        ),
+        _zstd_codec(),
+        _lz4_codec(),
+    )
+    if codec is not None
+}
+
+
+def get_codec(name: str) -> Codec:
+    if name not in CODECS:
+        raise ValueError(f"compression {name} is not available, choose one of {sorted(CODECS)}")
+    return CODECS[name]
+
+
+def binary_stream(f: IO) -> Optional[IO[bytes]]:
+    if isinstance(f, (io.BufferedIOBase, io.RawIOBase)):
+        return f
+    return getattr(f, "buffer", None)
+
+
+class CompressingWriter:
+    """
+    Text file-like object that compresses blocks of about `block_size`
+    characters on `threads` threads and writes them in order to `f`.
+    At most 2 * threads blocks are in flight.
+    """
+    def __init__(
+        self,
+        f: IO[bytes],
+        codec: Codec,
+        level: int = None,
+        threads: int = 1,
+        block_size: int = 1 << 20
+    ) -> None:
+        self._f = f
+        self._codec = codec
+        self._level = codec.level if level is None else level
+        self._block_size = block_size
+        self._parts = []
+        self._size = 0
+        self._threads = max(1, threads)
+        self._pool = ThreadPoolExecutor(max_workers=self._threads)
+        self._pending = deque()
+
+    def write(self, text: str) -> int:
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self._block_size:
+            self._submit_block()
+        return len(text)
+
+    def _submit_block(self) -> None:
+        data = "".join(self._parts).encode("utf-8")
+        self._parts = []
+        self._size = 0
+        self._pending.append(self._pool.submit(self._codec.compress, data, self._level))
+        while len(self._pending) > 2 * self._threads or (self._pending and self._pending[0].done()):
+            self._f.write(self._pending.popleft().result())
+
+    def flush(self) -> None:
+        """
+        Compresses and writes everything buffered, so `f` holds a complete
+        stream up to here; used for dump checkpoints.
+        """
+        if self._parts:
+            self._submit_block()
+        while self._pending:
+            self._f.write(self._pending.popleft().result())
+        self._f.flush()
+
+    def close(self) -> None:
+        """
+        Writes the remaining blocks; `f` itself is left open.
+        """
+        self.flush()
+        self._pool.shutdown()
+
+    def abort(self) -> None:
+        """
+        Drops the blocks not written yet, so `f` ends at the last complete
+        block; used when a dump fails.
+        """
+        self._parts = []
+        self._size = 0
+        self._pending.clear()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def open_writer(f: IO, compression: str = None, level: int = None, threads: int = 1) -> IO:
+    if compression is None or compression == "none":
+        return f
+    binary = binary_stream(f)
+    if binary is None:
+        raise ValueError("compressed dumps need a binary or file backed output")
+    if binary is not f:
+        f.flush()
+    return CompressingWriter(binary, get_codec(compression), level, threads)
+
+
+def codec_for(head: bytes) -> Optional[Codec]:
+    for codec in CODECS.values():
+        if head.startswith(codec.magic):
+            return codec
+    return None
+
+
+def open_reader(f: IO) -> IO:
+    """
+    Text stream of a dump, decompressed if it starts with the magic bytes
+    of a known codec.
+    """
+    binary = binary_stream(f)
+    if binary is None:
+        return f
+    is_text = binary is not f
+    if not hasattr(binary, "peek"):
+        if is_text:
+            return f
+        binary = io.BufferedReader(binary)
+    codec = codec_for(binary.peek(4)[:4])
+    if codec is not None:
+        return io.TextIOWrapper(codec.reader(binary), encoding="utf-8")
+    return f if is_text else io.TextIOWrapper(binary, encoding="utf-8")
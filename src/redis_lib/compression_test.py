@@ -0,0 +1,60 @@
+import gzip
+import unittest
+from io import BytesIO, StringIO
+
+from .compression import CODECS, CompressingWriter, get_codec, open_reader, open_writer
+
+
+class CompressionTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.lines = [f'{{"key": "k{i}", "value": "çé{i}"}}\n' for i in range(100)]
+
+    def _compress(self, codec: str, **options) -> bytes:
+        out = BytesIO()
+        writer = CompressingWriter(out, get_codec(codec), **options)
+        for line in self.lines:
+            writer.write(line)
+        writer.close()
+        return out.getvalue()
+
+    def _round_trip(self, codec: str) -> None:
+        data = self._compress(codec, threads=2, block_size=64)
+        self.assertTrue(data.startswith(CODECS[codec].magic))
+        self.assertEqual(list(open_reader(BytesIO(data))), self.lines)
+
+    def test_gzip_blocks_are_concatenated_members(self):
+        data = self._compress("gzip", threads=2, block_size=64)
+        self.assertEqual(gzip.decompress(data).decode("utf-8"), "".join(self.lines))
+
+    def test_abort_drops_unwritten_blocks(self):
+        out = BytesIO()
+        writer = CompressingWriter(out, get_codec("gzip"))
+        writer.write(self.lines[0])
+        writer.flush()
+        writer.write(self.lines[1])
+        writer.abort()
+        self.assertEqual(gzip.decompress(out.getvalue()).decode("utf-8"), self.lines[0])
+
+    def test_gzip_round_trip(self):
+        self._round_trip("gzip")
+
+    @unittest.skipUnless("zstd" in CODECS, "no zstd implementation installed")
+    def test_zstd_round_trip(self):
+        self._round_trip("zstd")
+
+    @unittest.skipUnless("lz4" in CODECS, "lz4 is not installed")
+    def test_lz4_round_trip(self):
+        self._round_trip("lz4")
+
+    def test_uncompressed_input(self):
+        self.assertEqual(list(open_reader(BytesIO("".join(self.lines).encode("utf-8")))), self.lines)
+        text = StringIO("".join(self.lines))
+        self.assertIs(open_reader(text), text)
+
+    def test_open_writer(self):
+        text = StringIO()
+        self.assertIs(open_writer(text), text)
+        with self.assertRaises(ValueError):
+            open_writer(text, "gzip")
+        with self.assertRaises(ValueError):
+            open_writer(BytesIO(), "unknown")
@@ -0,0 +1,266 @@
+"""
+Differential dumps: fingerprint every key, compare with the fingerprint
+index of the previous dump and fetch only the keys whose fingerprint
+changed. The fingerprint index is
+
+    header        MAGIC (4 bytes) | version u16 | flags u16 | records u64 | keys length u64
+    hashes        records * u64, blake2b-64 of every key, sorted
+    fingerprints  records * u64, in hash order
+    key offsets   (records + 1) * u64, positions in keys
+    keys          the key names, in hash order
+
+Integers are little endian. A fingerprint of 0 means "always fetch".
+"""
+import os
+import json
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+from hashlib import blake2b
+from typing import IO, Callable, List, Optional, Tuple
+
+import redis
+
+from .dumpers import encode_json_lines, json_record
+from .index import hash_order, key_hash, little_endian, u64s
+from .io import RedisPatternIO
+
+MAGIC = b"RDJF"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQQ")
+
+FINGERPRINTS = ("digest", "size")
+
+
+def fingerprint_of(*parts) -> int:
+    h = blake2b(digest_size=8)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        h.update(b"\0")
+    return int.from_bytes(h.digest(), "little") or 1
+
+
+class FingerprintWriter:
+    """
+    Collects key names and fingerprints; write() sorts them by key hash.
+    Key names go to a temporary file next to the index instead of memory.
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._hashes = array("Q")
+        self._fingerprints = array("Q")
+        self._key_offsets = array("Q", [0])
+        self._keys = open(path + ".keys.tmp", "w+b")
+
+    def add(self, key: str, fp: int) -> None:
+        name = key.encode("utf-8")
+        self._hashes.append(key_hash(name))
+        self._fingerprints.append(fp)
+        self._keys.write(name)
+        self._key_offsets.append(self._key_offsets[-1] + len(name))
+
+    def _unique(self, order: array, names) -> array:
+        """
+        `order` without repeated keys; SCAN may return a key more than once.
+        """
+        unique = array("Q")
+        run_hash, run_names = None, set()
+        for i in order:
+            h = self._hashes[i]
+            if h != run_hash:
+                run_hash, run_names = h, set()
+            name = bytes(names[self._key_offsets[i]:self._key_offsets[i + 1]])
+            if name not in run_names:
+                run_names.add(name)
+                unique.append(i)
+        return unique
+
+    def write(self) -> None:
+        self._keys.flush()
+        names = mmap.mmap(self._keys.fileno(), 0, access=mmap.ACCESS_READ) if self._key_offsets[-1] else b""
+        tmp = self.path + ".tmp"
+        try:
+            order = self._unique(hash_order(self._hashes), names)
+            key_offsets = array("Q", [0])
+            for i in order:
+                key_offsets.append(key_offsets[-1] + self._key_offsets[i + 1] - self._key_offsets[i])
+            with open(tmp, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, 0, len(order), key_offsets[-1]))
+                f.write(little_endian(array("Q", (self._hashes[i] for i in order))))
+                f.write(little_endian(array("Q", (self._fingerprints[i] for i in order))))
+                f.write(little_endian(key_offsets))
+                for i in order:
+                    f.write(names[self._key_offsets[i]:self._key_offsets[i + 1]])
+        finally:
+            if isinstance(names, mmap.mmap):
+                names.close()
+        os.replace(tmp, self.path)
+        self.discard()
+
+    def discard(self) -> None:
+        if not self._keys.closed:
+            self._keys.close()
+            os.remove(self._keys.name)
+
+
+class FingerprintIndex:
+    """
+    A fingerprint index file, mapped with mmap.
+    """
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mapping) < HEADER.size:
+            raise ValueError("not a fingerprint index: truncated header")
+        magic, version, _, records, _ = HEADER.unpack_from(self._mapping)
+        if magic != MAGIC:
+            raise ValueError("not a fingerprint index")
+        if version > VERSION:
+            raise ValueError(f"fingerprint index version {version} is newer than this reader ({VERSION})")
+        self.records = records
+        self._view = memoryview(self._mapping)
+        position = HEADER.size
+        parts = []
+        for count in (records, records, records + 1):
+            parts.append(u64s(self._view[position:position + 8 * count]))
+            position += 8 * count
+        self._hashes, self._fingerprints, self._key_offsets = parts
+        self._keys_start = position
+
+    def key_at(self, i: int) -> str:
+        start = self._keys_start + self._key_offsets[i]
+        end = self._keys_start + self._key_offsets[i + 1]
+        return str(self._view[start:end], "utf-8")
+
+    def fingerprint_at(self, i: int) -> int:
+        return self._fingerprints[i]
+
+    def find(self, key: str) -> List[int]:
+        h = key_hash(key)
+        i = bisect_left(self._hashes, h)
+        ret = []
+        while i < self.records and self._hashes[i] == h:
+            if self.key_at(i) == key:
+                ret.append(i)
+            i += 1
+        return ret
+
+    def close(self) -> None:
+        for part in (self._hashes, self._fingerprints, self._key_offsets):
+            if isinstance(part, memoryview):
+                part.release()
+        self._view.release()
+        self._mapping.close()
+
+
+class DifferentialDump:
+    """
+    Dumps the keys of `io` that are new or changed since the dump that
+    wrote the fingerprint index at `index_path`, plus "none" records for
+    the keys that are gone, and replaces the index with the current one.
+    Without an index every key counts as new.
+
+    `fingerprint` "digest" uses DEBUG DIGEST-VALUE and falls back to "size"
+    where DEBUG is not allowed. "size" fingerprints the type and size of
+    a key, so same-sized rewrites are missed. Keys with a TTL, and types
+    without a size, are always fetched.
+    """
+    def __init__(
+        self,
+        io: RedisPatternIO,
+        index_path: str,
+        preserve_ttls: bool = True,
+        fingerprint: str = "digest"
+    ) -> None:
+        if fingerprint not in FINGERPRINTS:
+            raise ValueError(f"fingerprint must be one of {FINGERPRINTS}")
+        self._ios = io.read_ios()
+        self._index_path = index_path
+        self._preserve_ttls = preserve_ttls
+        self.fingerprint = fingerprint
+
+    def _digests(self, io: RedisPatternIO, keys: List[str]) -> Optional[List[int]]:
+        io.pipe.execute_command("DEBUG", "DIGEST-VALUE", *keys)
+        for key in keys:
+            io.pipe.ttl(key)
+        try:
+            reply = io.pipe.execute()
+        except redis.exceptions.ResponseError:
+            self.fingerprint = "size"
+            return None
+        return [
+            0 if ttl >= 0 else fingerprint_of(digest)
+            for digest, ttl in zip(reply[0], reply[1:])
+        ]
+
+    def _sizes(self, io: RedisPatternIO, keys: List[str]) -> List[int]:
+        types, ttls = io.get_types_and_ttls(keys)
+        sized = []
+        for _type, key in zip(types, keys):
+            handler = io.type_handlers.get(_type)
+            if _type == "string":
+                io.pipe.strlen(key)
+            elif handler is not None and handler.chunkable:
+                handler.size_for(io.pipe, key)
+            else:
+                continue
+            sized.append(key)
+        sizes = dict(zip(sized, io.pipe.execute())) if sized else {}
+        return [
+            fingerprint_of(_type, sizes[key]) if ttl < 0 and key in sizes else 0
+            for _type, key, ttl in zip(types, keys, ttls)
+        ]
+
+    def fingerprints(self, io: RedisPatternIO, keys: List[str]) -> List[int]:
+        if self.fingerprint == "digest":
+            fps = self._digests(io, keys)
+            if fps is not None:
+                return fps
+        return self._sizes(io, keys)
+
+    def dump(self, f: IO, commit: Callable[[], None] = None) -> Tuple[int, int]:
+        """
+        Writes the differential dump to `f` as JSON lines; returns the number
+        of changed and of deleted keys. `commit`, e.g. closing a compressed
+        `f`, runs before the index is replaced, so an output that fails to
+        be saved leaves the previous index in place.
+        """
+        previous = FingerprintIndex(self._index_path) if os.path.exists(self._index_path) else None
+        seen = bytearray((previous.records + 7) // 8) if previous is not None else None
+        writer = FingerprintWriter(self._index_path)
+        changed = deleted = 0
+        try:
+            for io in self._ios:
+                for keys in io.iter_key_batches():
+                    if not keys:
+                        continue
+                    fetch = []
+                    for key, fp in zip(keys, self.fingerprints(io, keys)):
+                        writer.add(key, fp)
+                        positions = previous.find(key) if previous is not None else []
+                        for i in positions:
+                            seen[i >> 3] |= 1 << (i & 7)
+                        if not positions or fp == 0 or previous.fingerprint_at(positions[0]) != fp:
+                            fetch.append(key)
+                    if not fetch:
+                        continue
+                    for raw_batch in io.iter_raw_batches_of(fetch):
+                        count, text = encode_json_lines(raw_batch, self._preserve_ttls, io.plain_text)
+                        f.write(text)
+                        changed += count
+            if previous is not None:
+                for i in range(previous.records):
+                    if not seen[i >> 3] & (1 << (i & 7)):
+                        f.write(json.dumps(json_record("none", previous.key_at(i), "", -2)) + "\n")
+                        deleted += 1
+            if commit is not None:
+                commit()
+        except Exception:
+            writer.discard()
+            raise
+        finally:
+            if previous is not None:
+                previous.close()
+        writer.write()
+        return changed, deleted
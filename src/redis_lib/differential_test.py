@@ -0,0 +1,134 @@
+import os
+import json
+import hashlib
+import tempfile
+import unittest
+from io import StringIO
+
+import redis
+
+from .differential import DifferentialDump, FingerprintIndex, FingerprintWriter
+from .io import RedisPatternIO
+from src.mock.redis import MockRedis
+
+
+class DigestRedisMock(MockRedis):
+    def __init__(self, cache, debug_allowed=True):
+        super().__init__(cache, {})
+        self.debug_allowed = debug_allowed
+
+    def execute_command(self, *args):
+        if not self.debug_allowed:
+            self._MockRedis__exceptions.append(redis.exceptions.ResponseError("ERR DEBUG command not allowed"))
+            self._MockRedis__return_values.append(None)
+            return
+        self._MockRedis__return_values.append([
+            hashlib.sha1(self.cache[key].encode("utf-8")).hexdigest() if key in self.cache else "0"
+            for key in args[2:]
+        ])
+
+    def strlen(self, key):
+        self._MockRedis__return_values.append(len(self.cache.get(key, "")))
+
+
+class DuplicatingScanRedisMock(DigestRedisMock):
+    """
+    SCAN returns "a" twice, as it may while the keyspace is rehashed.
+    """
+    def scan(self, cursor=0, match=None, count=None):
+        cursor, keys = super().scan(cursor, match, count)
+        if b"a" in keys:
+            keys = keys + [b"a"]
+        return cursor, keys
+
+
+class FingerprintIndexTest(unittest.TestCase):
+    def test_roundtrip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dump.fp")
+            writer = FingerprintWriter(path)
+            for i in range(100):
+                writer.add(f"key{i}", i + 1)
+            writer.write()
+            self.assertEqual(os.listdir(directory), ["dump.fp"])
+            index = FingerprintIndex(path)
+            try:
+                self.assertEqual(index.records, 100)
+                [i] = index.find("key42")
+                self.assertEqual(index.key_at(i), "key42")
+                self.assertEqual(index.fingerprint_at(i), 43)
+                self.assertEqual(index.find("missing"), [])
+            finally:
+                index.close()
+
+
+class DifferentialDumpTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.index_path = os.path.join(self._dir.name, "dump.fp")
+
+    def _dump(self, cli, **options):
+        out = StringIO()
+        counts = DifferentialDump(RedisPatternIO(cli), self.index_path, **options).dump(out)
+        records = {j["key"]: j["type"] for j in map(json.loads, out.getvalue().splitlines())}
+        return counts, records
+
+    def _change(self, cli):
+        cli.cache["a"] = "9"
+        del cli.cache["c"]
+        cli.cache["d"] = "4"
+
+    def test_digest(self):
+        cli = DigestRedisMock({"a": "1", "b": "22", "c": "3"})
+        counts, records = self._dump(cli)
+        self.assertEqual(counts, (3, 0))
+        self.assertEqual(records, {"a": "string", "b": "string", "c": "string"})
+        self._change(cli)
+        counts, records = self._dump(cli)
+        self.assertEqual(counts, (2, 1))
+        self.assertEqual(records, {"a": "string", "c": "none", "d": "string"})
+        self.assertEqual(self._dump(cli), ((0, 0), {}))
+
+    def test_duplicate_scan_results(self):
+        cli = DuplicatingScanRedisMock({"a": "1", "b": "22", "c": "3"})
+        self._dump(cli)
+        index = FingerprintIndex(self.index_path)
+        try:
+            self.assertEqual(index.records, 3)
+            self.assertEqual(len(index.find("a")), 1)
+        finally:
+            index.close()
+        self.assertEqual(self._dump(cli), ((0, 0), {}))
+
+    def test_failed_commit_keeps_previous_index(self):
+        cli = DigestRedisMock({"a": "1", "b": "22", "c": "3"})
+        self._dump(cli)
+        self._change(cli)
+
+        def commit():
+            raise OSError("disk full")
+
+        with self.assertRaises(OSError):
+            DifferentialDump(RedisPatternIO(cli), self.index_path).dump(StringIO(), commit)
+        self.assertEqual(os.listdir(self._dir.name), ["dump.fp"])
+        counts, records = self._dump(cli)
+        self.assertEqual(counts, (2, 1))
+
+    def test_size_fallback(self):
+        cli = DigestRedisMock({"a": "1", "b": "22", "c": "3"}, debug_allowed=False)
+        dump = DifferentialDump(RedisPatternIO(cli), self.index_path)
+        dump.dump(StringIO())
+        self.assertEqual(dump.fingerprint, "size")
+        cli.cache["b"] = "333"
+        self._change(cli)
+        # "a" kept its size, so only the size change of "b" shows
+        counts, records = self._dump(cli, fingerprint="size")
+        self.assertEqual(counts, (2, 1))
+        self.assertEqual(records, {"b": "string", "c": "none", "d": "string"})
+
+    def test_keys_with_ttl_are_always_fetched(self):
+        cli = DigestRedisMock({"a": "1", "b": "2"})
+        cli.ttls["a"] = 100
+        self._dump(cli)
+        self.assertEqual(self._dump(cli), ((1, 0), {"a": "string"}))
@@ -1,10 +1,152 @@
 import sys
-from typing import IO
+import time
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import IO, Iterable, Optional, Tuple, Union
 import json
 import csv
 import progressbar
 
 from src.abstract_redis import DataDumper, RedisIO
+from .checkpoint import DumpCheckpoint, RestoreCheckpoint
+from .binary_format import BlockWriter, iter_blocks, iter_records
+from .compression import binary_stream, codec_for, open_reader, open_writer
+from .encoders import is_plain, plain
+from .io import CHUNK_SUFFIX, TYPE_HANDLERS, encode_batch
+from .index import DumpIndex, IndexWriter, lines_in_slots
+from .mapped import iter_line_offsets, map_file
+from .shards import ShardedOutput
+
+
+def json_record(_type: str, key: str, val: any, ttl: int) -> dict:
+    """
+    Values are base64 unless the record says "encoding": "utf-8", so dumps
+    written before the flag existed restore unchanged.
+    """
+    obj = {"key": key, "type": _type, "value": val, "ttl": ttl}
+    if is_plain(val):
+        obj["encoding"] = "utf-8"
+    return obj
+
+
+def record_value(j: dict) -> any:
+    if j.get("encoding") == "utf-8":
+        return plain(j["value"])
+    return j["value"]
+
+
+def update_progress(bar, value: int) -> None:
+    """
+    count_keys is an estimate, so the total grows when the dump passes it.
+    """
+    if value > bar.maxval:
+        bar.maxval = value
+        bar.update_interval = value / bar.num_intervals
+    bar.update(value)
+
+
+def skip_lines(lines: Iterable[tuple], records: int) -> Iterable[tuple]:
+    for line, offset in lines:
+        if records > 0 and len(line) > 0:
+            records -= 1
+            continue
+        yield line, offset
+
+
+def iter_dump_positions(f: IO, offset: int = None, records: int = 0) -> Iterable[Tuple[any, Optional[int]]]:
+    """
+    (line, offset of the next line) of a JSON-lines dump, starting at
+    `offset` or else after the first `records` records. Uncompressed regular
+    files are walked through mmap as bytes lines; anything else goes
+    through open_reader, has no offsets and can only skip records.
+    """
+    mapping = map_file(f)
+    if mapping is not None:
+        if codec_for(mapping[:4]) is None:
+            if offset is not None:
+                return iter_line_offsets(mapping, offset)
+            return skip_lines(iter_line_offsets(mapping), records)
+        mapping.close()
+    return skip_lines(((line, None) for line in open_reader(f)), records)
+
+
+def iter_dump_lines(f: IO) -> Iterable:
+    return (line for line, _ in iter_dump_positions(f))
+
+
+def may_be_chunked(_type: str) -> bool:
+    handler = TYPE_HANDLERS.get(_type)
+    return handler is not None and handler.chunkable
+
+
+def restore_json_lines(
+    lines: Iterable[tuple],
+    io: RedisIO,
+    rate_limiter=None,
+    progress=None,
+    checkpoint: RestoreCheckpoint = None,
+    source: str = "",
+    started_keys: set = None
+) -> int:
+    """
+    Writes every dump line of `lines`, (line, offset) pairs as from
+    iter_dump_positions, to `io` and flushes it. `progress(n)` is called for
+    every 1000 restored records and once more at the end.
+
+    With a `checkpoint`, `io` is flushed whenever the checkpoint of `source`
+    is due and the offset and count of the records written so far are
+    committed; the flush makes sure they really are in Redis. Commits only
+    happen before the first record of a key: chunk records are appended
+    without a DEL, so a resume must replay the whole key.
+
+    With `started_keys`, the collections whose first record was written are
+    added to it, and a chunk record of any other key raises ValueError
+    before it is written: its key started in another file, so it would be
+    appended to whatever that key holds.
+    """
+    number_of_restored_keys = 0
+    records = 0
+    offset = None
+    if checkpoint is not None:
+        offset, records, _ = checkpoint.position(source)
+    for line, end in lines:
+        if len(line) > 0:
+            j = json.loads(line)
+            key_start = not j["type"].endswith(CHUNK_SUFFIX)
+            if started_keys is not None:
+                if key_start:
+                    if may_be_chunked(j["type"]):
+                        started_keys.add(j["key"])
+                elif j["key"] not in started_keys:
+                    raise ValueError(f"{source or 'dump'} continues key {j['key']!r}, which starts elsewhere")
+            if checkpoint is not None and key_start and checkpoint.due(source):
+                io.flush()
+                checkpoint.commit(source, offset, records + number_of_restored_keys)
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            io.write(j["key"], j["type"], record_value(j), j["ttl"])
+            number_of_restored_keys += 1
+            if progress is not None and number_of_restored_keys % 1000 == 0:
+                progress(1000)
+        offset = end
+    io.flush()
+    if checkpoint is not None:
+        checkpoint.commit(source, offset, records + number_of_restored_keys, done=True)
+    if progress is not None:
+        progress(number_of_restored_keys % 1000)
+    return number_of_restored_keys
+
+
+def encode_json_lines(raw_batch: tuple, preserve_ttls: bool, plain_text: bool = False) -> Tuple[int, str]:
+    """
+    Encodes a raw batch into dump lines; runs in the encoder worker processes.
+    """
+    lines = []
+    for _type, key, val, ttl in encode_batch(raw_batch, plain_text=plain_text):
+        lines.append(json.dumps(json_record(_type, key, val, ttl if preserve_ttls else -1)) + "\n")
+    return len(lines), "".join(lines)
 
 
 class JSONDumper(DataDumper):
@@ -13,40 +155,284 @@ class JSONDumper(DataDumper):
         f: IO,
         preserve_ttls: bool = False,
         enable_progress_bar: bool = True,
-        log: bool = True
+        log: bool = True,
+        workers: int = 1,
+        compression: str = None,
+        compression_level: int = None,
+        compression_threads: int = 1,
+        checkpoint: Union[DumpCheckpoint, RestoreCheckpoint] = None,
+        index: str = None
     ) -> None:
+        """
+        Dumps are compressed with `compression` (gzip, zstd or lz4, see
+        compression.CODECS); restore detects the codec from the file itself.
+        `f` may be a ShardedOutput, which compresses every shard by itself.
+
+        With a DumpCheckpoint, dump progress is saved periodically; a loaded
+        checkpoint makes the dump cut `f` back to it and continue from
+        there. `f` must then be seekable (opened with r+) or a ShardedOutput.
+        Records written after the last saved SCAN position of a node are
+        written again, which restore treats as overwrites. With a
+        RestoreCheckpoint, restore commits its progress and continues after
+        the committed records of a loaded checkpoint.
+
+        With an `index` path, dumps also write a sidecar index there, see
+        index.py; that needs an uncompressed single file.
+        """
+        if index is not None and (compression not in (None, "none") or isinstance(f, ShardedOutput)):
+            raise ValueError("dump indexes need an uncompressed single file")
         self.__file = f
+        self.__out = f
+        self._shards = f if isinstance(f, ShardedOutput) else None
         self._preserve_ttls = preserve_ttls
         self._enable_progress_bar = enable_progress_bar
         self._log = log
+        self._workers = workers
+        self._compression = compression
+        self._compression_level = compression_level
+        self._compression_threads = compression_threads
+        self._checkpoint = checkpoint
+        self._at_position = False
+        self._index = index
+        self._index_writer = None
+
+    def _open_output(self) -> None:
+        if self._shards is None:
+            self.__out = open_writer(
+                self.__file, self._compression, self._compression_level, self._compression_threads
+            )
+        if self._index is not None:
+            self._index_writer = IndexWriter(self.__file.tell())
+            if self._index_writer.offset > 0:
+                # appending, e.g. to a resumed dump: index what is there
+                self._index_writer.add_lines(iter_line_offsets(map_file(self.__file)))
+
+    def _write_index(self) -> None:
+        if self._index_writer is not None:
+            self._index_writer.write(self._index)
+            self._index_writer = None
+
+    def _close_output(self, failed: bool = False) -> None:
+        """
+        After a failure the output is not finished: compressed blocks still
+        in flight are dropped and shards get no manifest, so a partial dump
+        is not mistaken for a complete one.
+        """
+        if self._shards is not None:
+            if failed:
+                self._shards.abort(keep=self._checkpoint is not None)
+            else:
+                self._shards.close()
+        elif self.__out is not self.__file:
+            if failed:
+                self.__out.abort()
+            else:
+                self.__out.close()
+            self.__out = self.__file
+
+    def _write(self, keys: list, types: list, text: str) -> None:
+        if self._index_writer is not None:
+            self._index_writer.add_text(keys, types, text)
+        if self._shards is not None:
+            self._shards.write_batch(keys, types, text)
+        else:
+            self.__out.write(text)
+
+    def _output_state(self) -> dict:
+        if self._shards is not None:
+            return {"shards": self._shards.checkpoint()}
+        self.__out.flush()
+        self.__file.flush()
+        return {"offset": self.__file.tell()}
+
+    def _resume_output(self, state: dict) -> None:
+        if self._shards is not None:
+            self._shards.resume(state["shards"])
+        else:
+            self.__file.seek(state["offset"])
+            self.__file.truncate()
+
+    def _batches(self, io: RedisIO) -> Iterable[tuple]:
+        """
+        (position, raw batch), see RedisPatternIO.iter_checkpointed_batches.
+        """
+        if self._checkpoint is not None:
+            return io.iter_checkpointed_batches()
+        return ((None, raw_batch) for raw_batch in io.iter_raw_batches())
+
+    def _written(self, position, number_of_dumped_keys: int, bar) -> None:
+        if bar is not None:
+            update_progress(bar, number_of_dumped_keys)
+        if self._checkpoint is None:
+            return
+        self._at_position = position is not None
+        if position is not None:
+            self._checkpoint.advance(position, number_of_dumped_keys)
+            if self._checkpoint.due():
+                self._checkpoint.save(self._output_state())
+
+    def _dump_batches(self, io: RedisIO, bar, number_of_dumped_keys: int) -> int:
+        for position, raw_batch in self._batches(io):
+            count, text = encode_json_lines(raw_batch, self._preserve_ttls, getattr(io, "plain_text", False))
+            self._write(raw_batch[1], raw_batch[0], text)
+            number_of_dumped_keys += count
+            self._written(position, number_of_dumped_keys, bar)
+        return number_of_dumped_keys
+
+    def _dump_with_workers(self, io: RedisIO, bar, number_of_dumped_keys: int = 0) -> int:
+        """
+        Raw batches are encoded by a process pool; results are written in
+        scan order and at most 2 * workers batches are in flight.
+        """
+        def write_next():
+            nonlocal number_of_dumped_keys
+            position, types, keys, future = pending.popleft()
+            count, text = future.result()
+            self._write(keys, types, text)
+            number_of_dumped_keys += count
+            self._written(position, number_of_dumped_keys, bar)
+
+        with ProcessPoolExecutor(max_workers=self._workers) as pool:
+            pending = deque()
+            try:
+                for position, raw_batch in self._batches(io):
+                    pending.append((position, raw_batch[0], raw_batch[1], pool.submit(
+                        encode_json_lines, raw_batch, self._preserve_ttls, getattr(io, "plain_text", False)
+                    )))
+                    while len(pending) > 2 * self._workers or (pending and pending[0][3].done()):
+                        write_next()
+            except Exception:
+                # batches fetched before the failure still move the checkpoint
+                if self._checkpoint is not None:
+                    while pending:
+                        write_next()
+                raise
+            while pending:
+                write_next()
+        return number_of_dumped_keys
 
     def dump(self, io: RedisIO):
+        bar = None
         if self._enable_progress_bar:
             total_keys = io.count_keys()
             bar = progressbar.ProgressBar(maxval=total_keys, \
                 widgets=[progressbar.Bar('=', '[', ']'), ' ', progressbar.Percentage()])
             bar.start()
         number_of_dumped_keys = 0
-        for _type, key, val, ttl in io:
-            obj = {"key": key, "type": _type, "value": val, "ttl": ttl}
-            if not self._preserve_ttls:
-                obj["ttl"] = -1
-            json.dump(obj, self.__file)
-            number_of_dumped_keys += 1
-            if self._enable_progress_bar:
-                bar.update(number_of_dumped_keys)
-            self.__file.write("\n")
-        if self._enable_progress_bar:
+        if self._checkpoint is not None:
+            if not hasattr(io, "iter_checkpointed_batches"):
+                raise TypeError("dump checkpoints need a RedisPatternIO")
+            if self._checkpoint.resuming:
+                self._resume_output(self._checkpoint.output)
+                io.seek_scan(self._checkpoint.cursors)
+                number_of_dumped_keys = self._checkpoint.records
+        self._open_output()
+        failed = True
+        try:
+            if self._workers > 1 and hasattr(io, "iter_raw_batches"):
+                number_of_dumped_keys = self._dump_with_workers(io, bar, number_of_dumped_keys)
+            elif self._checkpoint is not None:
+                number_of_dumped_keys = self._dump_batches(io, bar, number_of_dumped_keys)
+            else:
+                for _type, key, val, ttl in io:
+                    obj = json_record(_type, key, val, ttl)
+                    if not self._preserve_ttls:
+                        obj["ttl"] = -1
+                    self._write((key,), (_type,), json.dumps(obj) + "\n")
+                    number_of_dumped_keys += 1
+                    if bar is not None:
+                        update_progress(bar, number_of_dumped_keys)
+            failed = False
+        except Exception:
+            if self._checkpoint is not None and self._at_position:
+                self._checkpoint.save(self._output_state())
+            raise
+        finally:
+            self._close_output(failed)
+        self._write_index()
+        if self._checkpoint is not None:
+            self._checkpoint.remove()
+        if bar is not None:
             bar.finish()
         if self._log:
             print(f"Number of Dumped Keys: {number_of_dumped_keys}", file=sys.stderr)
 
+    def _log_restored(self, number_of_restored_keys: int, started: float) -> None:
+        if self._log:
+            elapsed = max(time.monotonic() - started, 1e-9)
+            print(f"Number of Restored Keys: {number_of_restored_keys} "
+                  f"({number_of_restored_keys / elapsed:.0f} keys/sec)", file=sys.stderr)
+
     def restore(self, io: RedisIO):
-        for line in self.__file:
+        started = time.monotonic()
+        if self._checkpoint is None:
+            number_of_restored_keys = restore_json_lines(iter_dump_positions(self.__file), io)
+        else:
+            offset, records, _ = self._checkpoint.position("")
+            number_of_restored_keys = restore_json_lines(
+                iter_dump_positions(self.__file, offset, records), io, checkpoint=self._checkpoint
+            )
+            self._checkpoint.remove()
+        self._log_restored(number_of_restored_keys, started)
+
+    def restore_slots(self, io: RedisIO, index: DumpIndex, first: int, last: int):
+        """
+        Restores only the keys of hash slots `first` to `last`, reading just
+        their lines through `index`.
+        """
+        started = time.monotonic()
+        number_of_restored_keys = restore_json_lines(lines_in_slots(self.__file, index, first, last), io)
+        self._log_restored(number_of_restored_keys, started)
+
+    def _encode_and_write(self, io, raw_batch) -> int:
+        count, text = encode_json_lines(raw_batch, self._preserve_ttls, io.plain_text)
+        self._write(raw_batch[1], raw_batch[0], text)
+        return count
+
+    async def dump_async(self, io):
+        """
+        Dumps an AsyncRedisIO. Encoding and file writes of a batch run on a
+        writer thread while the event loop fetches the following batches.
+        """
+        bar = None
+        if self._enable_progress_bar:
+            bar = progressbar.ProgressBar(maxval=await io.count_keys(), \
+                widgets=[progressbar.Bar('=', '[', ']'), ' ', progressbar.Percentage()])
+            bar.start()
+        loop = asyncio.get_running_loop()
+        number_of_dumped_keys = 0
+        self._open_output()
+        failed = True
+        try:
+            with ThreadPoolExecutor(max_workers=1) as writer:
+                pending = None
+                async for raw_batch in io.aiter_raw_batches():
+                    if pending is not None:
+                        number_of_dumped_keys += await pending
+                        if bar is not None:
+                            update_progress(bar, number_of_dumped_keys)
+                    pending = loop.run_in_executor(writer, partial(self._encode_and_write, io, raw_batch))
+                if pending is not None:
+                    number_of_dumped_keys += await pending
+            failed = False
+        finally:
+            self._close_output(failed)
+        self._write_index()
+        if bar is not None:
+            bar.finish()
+        if self._log:
+            print(f"Number of Dumped Keys: {number_of_dumped_keys}", file=sys.stderr)
+
+    async def restore_async(self, io):
+        started = time.monotonic()
+        number_of_restored_keys = 0
+        for line in iter_dump_lines(self.__file):
             if len(line) > 0:
                 j = json.loads(line)
-                io.write(j["key"], j["type"], j["value"], j["ttl"])
-        io.flush()
+                await io.write(j["key"], j["type"], record_value(j), j["ttl"])
+                number_of_restored_keys += 1
+        await io.flush()
+        self._log_restored(number_of_restored_keys, started)
 
 
 class CSVDumper(DataDumper):
@@ -55,15 +441,22 @@ class CSVDumper(DataDumper):
         f: IO,
         preserve_ttls: bool = False,
         enable_progress_bar: bool = True,
-        log: bool = True
+        log: bool = True,
+        compression: str = None,
+        compression_level: int = None,
+        compression_threads: int = 1
     ) -> None:
         self.__file = f
         self._preserve_ttls = preserve_ttls
         self._enable_progress_bar = enable_progress_bar
         self._log = log
+        self._compression = compression
+        self._compression_level = compression_level
+        self._compression_threads = compression_threads
 
     def dump(self, io: RedisIO):
-        writer = csv.writer(self.__file, lineterminator="\n")
+        out = open_writer(self.__file, self._compression, self._compression_level, self._compression_threads)
+        writer = csv.writer(out, lineterminator="\n")
         if self._enable_progress_bar:
             total_keys = io.count_keys()
             bar = progressbar.ProgressBar(maxval=total_keys, \
@@ -71,12 +464,16 @@ class CSVDumper(DataDumper):
             bar.start()
         
         number_of_dumped_keys = 0
-        for _type, key, val, ttl in io:
-            _ttl = ttl if self._preserve_ttls else -1
-            writer.writerow([key, _type, val, _ttl])
-            number_of_dumped_keys += 1
-            if self._enable_progress_bar:
-                bar.update(number_of_dumped_keys)
+        try:
+            for _type, key, val, ttl in io:
+                _ttl = ttl if self._preserve_ttls else -1
+                writer.writerow([key, _type, val, _ttl])
+                number_of_dumped_keys += 1
+                if self._enable_progress_bar:
+                    update_progress(bar, number_of_dumped_keys)
+        finally:
+            if out is not self.__file:
+                out.close()
         if self._enable_progress_bar:
             bar.finish()
         if self._log:
@@ -84,7 +481,61 @@ class CSVDumper(DataDumper):
 
 
     def restore(self, io: RedisIO):
-        reader = csv.reader(self.__file, lineterminator="\n")
+        reader = csv.reader(open_reader(self.__file), lineterminator="\n")
         for key, _type, val, ttl in reader:
             io.write(key, _type, val, ttl)
         io.flush()
+
+
+class BinaryDumper(DataDumper):
+    """
+    Dumps raw values in the length-prefixed format of binary_format, without
+    base64 or JSON. `f` is a binary file; restoring from a regular file maps
+    it with mmap and hands memoryview slices of it to the pipeline.
+    """
+    def __init__(
+        self,
+        f: IO[bytes],
+        preserve_ttls: bool = False,
+        enable_progress_bar: bool = True,
+        log: bool = True
+    ) -> None:
+        self.__file = f
+        self._preserve_ttls = preserve_ttls
+        self._enable_progress_bar = enable_progress_bar
+        self._log = log
+
+    def dump(self, io: RedisIO):
+        if not hasattr(io, "iter_raw_batches"):
+            raise TypeError("BinaryDumper needs a RedisIO with raw batches")
+        bar = None
+        if self._enable_progress_bar:
+            bar = progressbar.ProgressBar(maxval=io.count_keys(), \
+                widgets=[progressbar.Bar('=', '[', ']'), ' ', progressbar.Percentage()])
+            bar.start()
+        writer = BlockWriter(self.__file)
+        number_of_dumped_keys = 0
+        for types, keys, raw_values, ttls in io.iter_raw_batches():
+            for _type, key, raw, ttl in zip(types, keys, raw_values, ttls):
+                writer.write(_type, key, raw, ttl if self._preserve_ttls else -1)
+            number_of_dumped_keys += len(keys)
+            if bar is not None:
+                update_progress(bar, number_of_dumped_keys)
+        writer.close()
+        if bar is not None:
+            bar.finish()
+        if self._log:
+            print(f"Number of Dumped Keys: {number_of_dumped_keys}", file=sys.stderr)
+
+    def restore(self, io: RedisIO):
+        started = time.monotonic()
+        number_of_restored_keys = 0
+        for payload in iter_blocks(binary_stream(self.__file) or self.__file):
+            for _type, key, val, ttl in iter_records(payload):
+                io.write(key, _type, plain(val) if val is not None else "", ttl)
+                number_of_restored_keys += 1
+        io.flush()
+        if self._log:
+            elapsed = max(time.monotonic() - started, 1e-9)
+            print(f"Number of Restored Keys: {number_of_restored_keys} "
+                  f"({number_of_restored_keys / elapsed:.0f} keys/sec)", file=sys.stderr)
@@ -1,8 +1,18 @@
+import os
+import json
+import tempfile
 import unittest
-from io import StringIO
+from io import BytesIO, StringIO
+from unittest.mock import patch
 
-from .dumpers import JSONDumper, CSVDumper
+import progressbar
+
+from .binary_format_test import materialize
+from .checkpoint import DumpCheckpoint, RestoreCheckpoint
+from .dumpers import BinaryDumper, JSONDumper, CSVDumper, encode_json_lines, update_progress
+from .io import RedisPatternIO
 from src.mock.file import FileMock
+from src.mock.redis import MockRedis
 from src.mock.redis_io import RedisIOMock
 
 
@@ -77,6 +87,216 @@ class JSONDumperTest(unittest.TestCase):
         self.assertEqual(redis_io_restore_mock.get_data(), self.redis_io_mock.get_data())
 
 
+class JSONDumperWorkersTest(unittest.TestCase):
+    def _redis_io(self):
+        return RedisPatternIO(MockRedis({
+            "hash": {"__type": "hash", "value": {"foo1": "bar"}},
+            "list": {"__type": "list", "value": ["1", "2", "3"]},
+            "string": "test",
+        }, {"hash": 10, "list": -1, "string": 20}))
+
+    def test_encode_json_lines(self):
+        count, text = encode_json_lines((["string"], ["k"], [b"v"], [5]), False)
+        self.assertEqual(count, 1)
+        self.assertEqual(text, '{"key": "k", "type": "string", "value": "dg==", "ttl": -1}\n')
+
+    def test_dump_with_workers_matches_single_process(self):
+        single_file = FileMock()
+        JSONDumper(single_file, True, False, False).dump(self._redis_io())
+        workers_file = FileMock()
+        JSONDumper(workers_file, True, False, False, workers=2).dump(self._redis_io())
+        self.assertEqual(workers_file.get_content(), single_file.get_content())
+
+
+class JSONDumperCompressionTest(unittest.TestCase):
+    def test_round_trip(self):
+        data = (
+            ("hash", "foo", {"foo": "bar"}, 10),
+            ("string", "str", "test", 20),
+        )
+        out = BytesIO()
+        JSONDumper(out, True, False, False, compression="gzip", compression_threads=2).dump(RedisIOMock(list(data)))
+        self.assertTrue(out.getvalue().startswith(b"\x1f\x8b"))
+        restored = RedisIOMock(list())
+        JSONDumper(BytesIO(out.getvalue()), True, False, False).restore(restored)
+        self.assertEqual(restored.get_data(), list(data))
+
+
+class BinaryDumperTest(unittest.TestCase):
+    def test_round_trip(self):
+        cli = MockRedis({
+            "hash": {"__type": "hash", "value": {"foo1": "bar"}},
+            "list": {"__type": "list", "value": ["1", "2", "3"]},
+            "string": "test",
+        }, {"hash": 10, "list": -1, "string": 20})
+        out = BytesIO()
+        BinaryDumper(out, True, False, False).dump(RedisPatternIO(cli))
+        restored = RedisIOMock(list())
+        BinaryDumper(BytesIO(out.getvalue()), True, False, False).restore(restored)
+        self.assertEqual(sorted((t, k, materialize(v), ttl) for t, k, v, ttl in restored.get_data()), [
+            ("hash", "hash", {b"foo1": b"bar"}, 10),
+            ("list", "list", [b"1", b"2", b"3"], -1),
+            ("string", "string", b"test", 20),
+        ])
+
+    def test_needs_raw_batches(self):
+        with self.assertRaises(TypeError):
+            BinaryDumper(BytesIO(), False, False, False).dump(RedisIOMock(list()))
+
+
+@patch("src.redis_lib.io.SCAN_COUNT", 2)
+class JSONDumperCheckpointTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.path = os.path.join(self._dir.name, "dump.json")
+        self.checkpoint_path = self.path + ".checkpoint"
+        self.cache = {f"key{i}": str(i) for i in range(5)}
+
+    def _failing_io(self, failing_call: int):
+        io = RedisPatternIO(MockRedis(self.cache, {}))
+        fetch_raw = io.fetch_raw
+        calls = []
+
+        def fetch(keys):
+            calls.append(keys)
+            if len(calls) == failing_call:
+                raise ConnectionError("connection lost")
+            return fetch_raw(keys)
+        io.fetch_raw = fetch
+        return io
+
+    def _dump(self, io, checkpoint, mode, **options):
+        with open(self.path, mode) as f:
+            JSONDumper(f, False, False, False, checkpoint=checkpoint, **options).dump(io)
+
+    def _keys(self):
+        with open(self.path) as f:
+            return [json.loads(line)["key"] for line in f]
+
+    def _resume(self, **options):
+        with self.assertRaises(ConnectionError):
+            self._dump(self._failing_io(3), DumpCheckpoint(self.checkpoint_path, 0), "w", **options)
+        checkpoint = DumpCheckpoint.load(self.checkpoint_path, 0)
+        self.assertEqual(checkpoint.cursors, {"0": 4})
+        self.assertEqual(checkpoint.records, 4)
+        self._dump(RedisPatternIO(MockRedis(self.cache, {})), checkpoint, "r+", **options)
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+    def test_resume(self):
+        self._resume()
+        self.assertEqual(self._keys(), list(self.cache))
+
+    def test_resume_with_workers(self):
+        self._resume(workers=2)
+        self.assertEqual(self._keys(), list(self.cache))
+
+    def test_resume_compressed(self):
+        self._resume(compression="gzip")
+        restored = RedisIOMock(list())
+        with open(self.path) as f:
+            JSONDumper(f, False, False, False).restore(restored)
+        self.assertEqual([key for _, key, _, _ in restored.get_data()], list(self.cache))
+
+    def test_needs_scan_positions(self):
+        with self.assertRaises(TypeError):
+            JSONDumper(StringIO(), False, False, False, checkpoint=DumpCheckpoint(self.checkpoint_path)).dump(
+                RedisIOMock(list())
+            )
+
+
+class FailingRedisIOMock(RedisIOMock):
+    def __init__(self, data, failing_write: int):
+        super().__init__(data)
+        self._writes = 0
+        self._failing_write = failing_write
+
+    def write(self, key: str, _type: str, val: any, ttl: int) -> None:
+        self._writes += 1
+        if self._writes == self._failing_write:
+            raise ConnectionError("connection lost")
+        super().write(key, _type, val, ttl)
+
+
+class JSONDumperRestoreCheckpointTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.path = os.path.join(self._dir.name, "dump.json")
+        self.checkpoint_path = self.path + ".restore-checkpoint"
+        self.data = [("string", f"key{i}", "dGVzdA==", -1) for i in range(5)]
+
+    def _resume(self, **options):
+        with open(self.path, "w") as f:
+            JSONDumper(f, False, False, False, **options).dump(RedisIOMock(list(self.data)))
+        failed = FailingRedisIOMock(list(), 3)
+        with open(self.path) as f, self.assertRaises(ConnectionError):
+            JSONDumper(f, False, False, False, checkpoint=RestoreCheckpoint(self.checkpoint_path, 0)).restore(failed)
+        checkpoint = RestoreCheckpoint.load(self.checkpoint_path, 0)
+        self.assertEqual(checkpoint.position("")[1:], (2, False))
+        restored = RedisIOMock(list())
+        with open(self.path) as f:
+            JSONDumper(f, False, False, False, checkpoint=checkpoint).restore(restored)
+        self.assertEqual(failed.get_data() + restored.get_data(), self.data)
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+        return checkpoint
+
+    def test_resume_from_offset(self):
+        checkpoint = self._resume()
+        self.assertIsNotNone(checkpoint.position("")[0])
+
+    def test_resume_compressed(self):
+        checkpoint = self._resume(compression="gzip")
+        self.assertIsNone(checkpoint.position("")[0])
+
+    def test_resume_chunked_key(self):
+        self.data = [
+            ("string", "key0", "dGVzdA==", -1),
+            ("list", "big", ["MQ=="], -1),
+            ("list:chunk", "big", ["Mg=="], -1),
+            ("list:chunk", "big", ["Mw=="], -1),
+            ("string", "key1", "dGVzdA==", -1),
+        ]
+        with open(self.path, "w") as f:
+            JSONDumper(f, False, False, False).dump(RedisIOMock(list(self.data)))
+        failed = FailingRedisIOMock(list(), 4)
+        with open(self.path) as f, self.assertRaises(ConnectionError):
+            JSONDumper(f, False, False, False, checkpoint=RestoreCheckpoint(self.checkpoint_path, 0)).restore(failed)
+        checkpoint = RestoreCheckpoint.load(self.checkpoint_path, 0)
+        # committed before "big", not between its windows
+        self.assertEqual(checkpoint.position("")[1:], (1, False))
+        restored = RedisIOMock(list())
+        with open(self.path) as f:
+            JSONDumper(f, False, False, False, checkpoint=checkpoint).restore(restored)
+        self.assertEqual(restored.get_data(), self.data[1:])
+
+
+class UpdateProgressTest(unittest.TestCase):
+    def test_total_grows_past_estimate(self):
+        bar = progressbar.ProgressBar(maxval=2, fd=StringIO()).start()
+        update_progress(bar, 5)
+        self.assertEqual(bar.maxval, 5)
+        self.assertEqual(bar.currval, 5)
+
+
+class JSONDumperPlainTextTest(unittest.TestCase):
+    def test_encode_json_lines(self):
+        _, text = encode_json_lines((["string", "string"], ["k", "b"], [b"v", b"\xff"], [5, 5]), False, True)
+        self.assertEqual(text, '''
+{"key": "k", "type": "string", "value": "v", "ttl": -1, "encoding": "utf-8"}
+{"key": "b", "type": "string", "value": "/w==", "ttl": -1}
+        '''.strip() + "\n")
+
+    def test_round_trip(self):
+        cli = MockRedis({"str": "çé", "hash": {"__type": "hash", "value": {"f": "v"}}})
+        dump_file = FileMock()
+        JSONDumper(dump_file, False, False, False).dump(RedisPatternIO(cli, plain_text=True))
+        restored = MockRedis({"existing": "x"})
+        JSONDumper(StringIO(dump_file.get_content()), False, False, False).restore(RedisPatternIO(restored))
+        self.assertEqual(restored.get("str"), "çé")
+        self.assertEqual(restored.hgetall("hash"), {"f": "v"})
+
+
 class CSVDumperTest(unittest.TestCase):
     def setUp(self) -> None:
         self.maxDiff = None
@@ -0,0 +1,119 @@
+from base64 import b64encode
+
+
+def b64str(x) -> str:
+    if isinstance(x, bytes):
+        return b64encode(x).decode("ascii")
+    if isinstance(x, str):
+        return b64encode(x.encode("utf-8")).decode("ascii")
+    return b64encode(str(x).encode("utf-8")).decode("ascii")
+
+
+def encode_string(raw) -> str:
+    if raw is None:
+        return ""
+    return b64str(raw)
+
+
+def encode_list(raw) -> list:
+    return [b64str(member) for member in raw] if raw is not None else ""
+
+
+def encode_set(raw) -> list:
+    return [b64str(member) for member in raw] if raw else None
+
+
+def encode_hash(raw) -> dict:
+    return {b64str(field): b64str(value) for field, value in raw.items()} if raw is not None else ""
+
+
+def encode_zset(raw) -> dict:
+    return {b64str(member): b64str(score) for member, score in raw} if raw is not None else {}
+
+
+# Single pass from a raw pipeline reply to the dump representation. They
+# produce exactly what decode(b64enc(decode(raw))) followed by the type
+# handler's process_result used to, without the intermediate copies.
+ENCODERS = {
+    "string": encode_string,
+    "list": encode_list,
+    "set": encode_set,
+    "hash": encode_hash,
+    "zset": encode_zset,
+    "none": encode_string,
+    "rdb-payload": encode_string,
+}
+
+
+class PlainStr(str):
+    ...
+
+
+class PlainList(list):
+    ...
+
+
+class PlainDict(dict):
+    ...
+
+
+def plain(val):
+    """
+    Marks a value as written without base64, e.g. one read from a record
+    with "encoding": "utf-8".
+    """
+    if isinstance(val, str):
+        return PlainStr(val)
+    if isinstance(val, dict):
+        return PlainDict(val)
+    if isinstance(val, list):
+        return PlainList(val)
+    return val
+
+
+def is_plain(val) -> bool:
+    return isinstance(val, (PlainStr, PlainList, PlainDict))
+
+
+def utf8(x) -> str:
+    if isinstance(x, bytes):
+        return x.decode("utf-8")
+    if isinstance(x, str):
+        return x
+    return str(x)
+
+
+def plain_string(raw) -> PlainStr:
+    return PlainStr(utf8(raw))
+
+
+def plain_list(raw) -> PlainList:
+    return PlainList(utf8(member) for member in raw)
+
+
+def plain_hash(raw) -> PlainDict:
+    return PlainDict((utf8(field), utf8(value)) for field, value in raw.items())
+
+
+def plain_zset(raw) -> PlainDict:
+    return PlainDict((utf8(member), utf8(score)) for member, score in raw)
+
+
+# Same shapes as ENCODERS but as plain text; they raise UnicodeDecodeError
+# on binary input, in which case the record falls back to base64.
+PLAIN_ENCODERS = {
+    "string": plain_string,
+    "list": plain_list,
+    "set": plain_list,
+    "hash": plain_hash,
+    "zset": plain_zset,
+}
+
+
+def encode_value(_type: str, raw, plain_text: bool = False):
+    if plain_text and raw and _type in PLAIN_ENCODERS:
+        try:
+            return PLAIN_ENCODERS[_type](raw)
+        except UnicodeDecodeError:
+            pass
+    return ENCODERS[_type](raw)
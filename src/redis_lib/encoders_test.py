@@ -0,0 +1,71 @@
+import unittest
+
+from .encoders import ENCODERS, b64str, encode_value, is_plain
+from .io import b64enc, decode
+from .type_handlers import (
+    HashHandler,
+    ListHandler,
+    NoneHandler,
+    SetHandler,
+    StringHandler,
+    ZSetHandler,
+)
+
+
+def legacy_encode(handler, raw):
+    return handler.process_result(decode(b64enc(decode(raw))))
+
+
+class EncodersTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.handlers = {
+            "string": StringHandler,
+            "list": ListHandler,
+            "set": SetHandler,
+            "hash": HashHandler,
+            "zset": ZSetHandler,
+            "none": NoneHandler,
+        }
+        self.samples = {
+            "string": [b"test", b"", None],
+            "list": [[b"1", b"2", b"3"], [], None],
+            "set": [{b"a", b"b"}, set(), None],
+            "hash": [{b"f1": b"v1", b"f2": b""}, {}, None],
+            "zset": [[(b"m1", 1.0), (b"m2", 2.5)], [], None],
+            "none": [None, ""],
+        }
+
+    def test_matches_legacy_encoding(self):
+        for _type, samples in self.samples.items():
+            for raw in samples:
+                expected_value = legacy_encode(self.handlers[_type], raw)
+                returned_value = ENCODERS[_type](raw)
+                if _type == "set" and raw:
+                    expected_value, returned_value = sorted(expected_value), sorted(returned_value)
+                self.assertEqual(returned_value, expected_value, (_type, raw))
+
+    def test_binary_string(self):
+        self.assertEqual(ENCODERS["string"](b"\xff\x00"), "/wA=")
+
+    def test_b64str(self):
+        self.assertEqual(b64str(b"a"), "YQ==")
+        self.assertEqual(b64str("a"), "YQ==")
+        self.assertEqual(b64str(1.5), "MS41")
+
+
+class PlainEncodingTest(unittest.TestCase):
+    def test_utf8_values_are_plain(self):
+        self.assertEqual(encode_value("string", "çé".encode("utf-8"), True), "çé")
+        self.assertEqual(encode_value("list", [b"1", b"2"], True), ["1", "2"])
+        self.assertEqual(encode_value("hash", {b"f": b"v"}, True), {"f": "v"})
+        self.assertEqual(encode_value("zset", [(b"m", 1.5)], True), {"m": "1.5"})
+        self.assertTrue(is_plain(encode_value("string", b"test", True)))
+
+    def test_binary_values_fall_back_to_base64(self):
+        returned_value = encode_value("list", [b"a", b"\xff"], True)
+        self.assertEqual(returned_value, ["YQ==", "/w=="])
+        self.assertFalse(is_plain(returned_value))
+
+    def test_disabled_by_default(self):
+        self.assertEqual(encode_value("string", b"a"), "YQ==")
+        self.assertFalse(is_plain(encode_value("string", b"a")))
@@ -0,0 +1,228 @@
+"""
+Sidecar index of an uncompressed JSON-lines dump.
+
+    header        MAGIC (4 bytes) | version u16 | flags u16 | records u64 | blocks length u32
+    hashes        records * u64, blake2b-64 of every key, sorted
+    offsets       records * u64, dump offset of the record of every hash
+    slot starts   (REDIS_CLUSTER_HASH_SLOTS + 1) * u64, positions in slot offsets
+    slot offsets  records * u64, dump offsets ordered by hash slot
+    blocks        JSON list of {offset, end, records, types, slots: [min, max]}
+                  for every BLOCK_RECORDS consecutive records
+
+Integers are little endian. Records of one key, chunks included, keep
+their dump order in both lookups.
+"""
+import sys
+import json
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+from hashlib import blake2b
+from typing import IO, Iterable, List, Sequence, Tuple
+
+from redis.crc import REDIS_CLUSTER_HASH_SLOTS, key_slot
+
+from .io import base_type
+from .mapped import iter_lines_at, map_file
+
+MAGIC = b"RDJI"
+VERSION = 1
+BLOCK_RECORDS = 65536
+
+HEADER = struct.Struct("<4sHHQI")
+
+
+def key_hash(key) -> int:
+    if isinstance(key, str):
+        key = key.encode("utf-8")
+    return int.from_bytes(blake2b(key, digest_size=8).digest(), "little")
+
+
+def hash_order(hashes: array) -> array:
+    """
+    Positions of `hashes` in ascending order, equal hashes in their original
+    order. Sorts bucket by bucket on the top 16 bits, so there never is a
+    list of all positions.
+    """
+    buckets = [array("Q") for _ in range(1 << 16)]
+    for i, h in enumerate(hashes):
+        buckets[h >> 48].append(i)
+    order = array("Q")
+    for bucket in buckets:
+        if len(bucket) > 1:
+            bucket = sorted(bucket, key=hashes.__getitem__)
+        order.extend(bucket)
+    return order
+
+
+def little_endian(a: array) -> bytes:
+    if sys.byteorder != "little":
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def u64s(view: memoryview) -> Sequence[int]:
+    if sys.byteorder == "little":
+        return view.cast("Q")
+    a = array("Q", view.tobytes())
+    a.byteswap()
+    return a
+
+
+class IndexWriter:
+    """
+    Collects the key, type and offset of every record as the dump is
+    written; write() sorts them into the index file.
+    """
+    def __init__(self, offset: int = 0, block_records: int = BLOCK_RECORDS) -> None:
+        self.offset = offset
+        self.blocks = []
+        self._block_records = block_records
+        self._block = None
+        self._hashes = array("Q")
+        self._offsets = array("Q")
+        self._slots = array("H")
+
+    def add(self, key: str, _type: str, offset: int, end: int) -> None:
+        slot = key_slot(key.encode("utf-8") if isinstance(key, str) else key)
+        self._hashes.append(key_hash(key))
+        self._offsets.append(offset)
+        self._slots.append(slot)
+        block = self._block
+        if block is None:
+            block = self._block = {"offset": offset, "end": end, "records": 0, "types": {}, "slots": [slot, slot]}
+        _type = base_type(_type)
+        block["end"] = end
+        block["records"] += 1
+        block["types"][_type] = block["types"].get(_type, 0) + 1
+        block["slots"] = [min(block["slots"][0], slot), max(block["slots"][1], slot)]
+        if block["records"] >= self._block_records:
+            self.blocks.append(block)
+            self._block = None
+
+    def add_text(self, keys: List[str], types: List[str], text: str) -> None:
+        """
+        `text` holds one dump line per key, written at `offset`. Dump lines
+        are ASCII, json.dumps escapes everything else.
+        """
+        for key, _type, line in zip(keys, types, text.split("\n")):
+            end = self.offset + len(line) + 1
+            self.add(key, _type, self.offset, end)
+            self.offset = end
+
+    def add_lines(self, lines: Iterable[Tuple[bytes, int]]) -> None:
+        """
+        Indexes the (line, offset of the next line) pairs of an existing dump.
+        """
+        for line, end in lines:
+            j = json.loads(line)
+            self.add(j["key"], j["type"], end - len(line) - 1, end)
+            self.offset = end
+
+    def write(self, path: str) -> None:
+        if self._block is not None:
+            self.blocks.append(self._block)
+            self._block = None
+        records = len(self._hashes)
+        order = hash_order(self._hashes)
+        hashes = array("Q", (self._hashes[i] for i in order))
+        offsets = array("Q", (self._offsets[i] for i in order))
+        starts = [0] * (REDIS_CLUSTER_HASH_SLOTS + 1)
+        for slot in self._slots:
+            starts[slot + 1] += 1
+        for slot in range(REDIS_CLUSTER_HASH_SLOTS):
+            starts[slot + 1] += starts[slot]
+        positions = starts[:-1]
+        slot_offsets = array("Q", bytes(8 * records))
+        for slot, offset in zip(self._slots, self._offsets):
+            slot_offsets[positions[slot]] = offset
+            positions[slot] += 1
+        blocks = json.dumps(self.blocks).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, records, len(blocks)))
+            for part in (hashes, offsets, array("Q", starts), slot_offsets):
+                f.write(little_endian(part))
+            f.write(blocks)
+
+
+class DumpIndex:
+    """
+    An index file, mapped with mmap; lookups read only the entries they
+    need.
+    """
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mapping) < HEADER.size:
+            raise ValueError("not a dump index: truncated header")
+        magic, version, _, records, blocks_length = HEADER.unpack_from(self._mapping)
+        if magic != MAGIC:
+            raise ValueError("not a dump index")
+        if version > VERSION:
+            raise ValueError(f"dump index version {version} is newer than this reader ({VERSION})")
+        self.records = records
+        self._view = memoryview(self._mapping)
+        position = HEADER.size
+        parts = []
+        for count in (records, records, REDIS_CLUSTER_HASH_SLOTS + 1, records):
+            parts.append(u64s(self._view[position:position + 8 * count]))
+            position += 8 * count
+        self._hashes, self._offsets, self._slot_starts, self._slot_offsets = parts
+        self.blocks = json.loads(bytes(self._view[position:position + blocks_length]))
+
+    def offsets_of_key(self, key: str) -> List[int]:
+        """
+        Offsets of the records of `key`, and of keys whose hash collides
+        with it.
+        """
+        h = key_hash(key)
+        i = bisect_left(self._hashes, h)
+        ret = []
+        while i < self.records and self._hashes[i] == h:
+            ret.append(self._offsets[i])
+            i += 1
+        return ret
+
+    def offsets_in_slots(self, first: int, last: int) -> Sequence[int]:
+        """
+        Offsets of the records of hash slots `first` to `last`, inclusive.
+        """
+        return self._slot_offsets[self._slot_starts[first]:self._slot_starts[last + 1]]
+
+    def close(self) -> None:
+        for part in (self._hashes, self._offsets, self._slot_starts, self._slot_offsets):
+            if isinstance(part, memoryview):
+                part.release()
+        self._view.release()
+        self._mapping.close()
+
+    def __enter__(self) -> "DumpIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _map_dump(f: IO):
+    mapping = map_file(f)
+    if mapping is None:
+        raise ValueError("indexed lookups need the dump as a regular file")
+    return mapping
+
+
+def lines_in_slots(f: IO, index: DumpIndex, first: int, last: int) -> Iterable[Tuple[bytes, int]]:
+    """
+    (line, offset of the next line) of the records of hash slots `first`
+    to `last`, ready for restore_json_lines.
+    """
+    return iter_lines_at(_map_dump(f), index.offsets_in_slots(first, last))
+
+
+def records_of_key(f: IO, index: DumpIndex, key: str) -> List[dict]:
+    """
+    The dump records of `key`, in dump order.
+    """
+    records = (json.loads(line) for line, _ in iter_lines_at(_map_dump(f), index.offsets_of_key(key)))
+    return [j for j in records if j["key"] == key]
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+from io import StringIO
+
+from redis.crc import key_slot
+
+from .dumpers import JSONDumper
+from .index import DumpIndex, IndexWriter, records_of_key
+from .mapped import iter_line_offsets, map_file
+from src.mock.redis_io import RedisIOMock
+
+
+class DumpIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._dir.cleanup)
+        self.path = os.path.join(self._dir.name, "dump.json")
+        self.index_path = self.path + ".idx"
+        self.data = [("string", f"key{i}", "dGVzdA==", -1) for i in range(20)]
+        self.data.append(("list", "big", ["MQ=="], -1))
+        self.data.append(("list:chunk", "big", ["Mg=="], -1))
+
+    def _dump(self, **options):
+        with open(self.path, "w") as f:
+            JSONDumper(f, False, False, False, index=self.index_path, **options).dump(RedisIOMock(list(self.data)))
+
+    def _index(self) -> DumpIndex:
+        index = DumpIndex(self.index_path)
+        self.addCleanup(index.close)
+        return index
+
+    def test_key_lookup(self):
+        self._dump()
+        with open(self.path) as f:
+            self.assertEqual(records_of_key(f, self._index(), "key7")[0]["key"], "key7")
+            self.assertEqual([j["type"] for j in records_of_key(f, self._index(), "big")], ["list", "list:chunk"])
+            self.assertEqual(records_of_key(f, self._index(), "missing"), [])
+
+    def test_slot_range(self):
+        self._dump()
+        slots = sorted(key_slot(key.encode()) for _, key, _, _ in self.data)
+        first, last = slots[0], slots[len(slots) // 2]
+        restored = RedisIOMock(list())
+        with open(self.path) as f:
+            JSONDumper(f, False, False, False).restore_slots(restored, self._index(), first, last)
+        expected = [record for record in self.data if first <= key_slot(record[1].encode()) <= last]
+        self.assertEqual(sorted(restored.get_data(), key=str), sorted(expected, key=str))
+
+    def test_blocks(self):
+        with open(self.path, "w") as f:
+            JSONDumper(f, False, False, False).dump(RedisIOMock(list(self.data)))
+        writer = IndexWriter(block_records=8)
+        with open(self.path) as f:
+            writer.add_lines(iter_line_offsets(map_file(f)))
+        writer.write(self.index_path)
+        blocks = self._index().blocks
+        self.assertEqual([block["records"] for block in blocks], [8, 8, 6])
+        self.assertEqual(blocks[-1]["types"], {"string": 4, "list": 2})
+        self.assertEqual(blocks[-1]["end"], os.path.getsize(self.path))
+        self.assertEqual(blocks[1]["offset"], blocks[0]["end"])
+
+    def test_index_matches_rebuilt_index(self):
+        self._dump()
+        with open(self.index_path, "rb") as f:
+            written = f.read()
+        writer = IndexWriter()
+        with open(self.path) as f:
+            writer.add_lines(iter_line_offsets(map_file(f)))
+        writer.write(self.index_path)
+        with open(self.index_path, "rb") as f:
+            self.assertEqual(f.read(), written)
+
+    def test_needs_uncompressed_file(self):
+        with self.assertRaises(ValueError):
+            JSONDumper(StringIO(), compression="gzip", index=self.index_path)
+
+    def test_not_an_index(self):
+        with open(self.index_path, "wb") as f:
+            f.write(b"x" * 32)
+        with self.assertRaises(ValueError):
+            DumpIndex(self.index_path)
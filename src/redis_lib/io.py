@@ -1,17 +1,23 @@
-from typing import ByteString, Iterable, Tuple, List
+import time
+from typing import ByteString, Iterable, Optional, Tuple, List
 from base64 import b64decode, b64encode
 import redis
+from redis.crc import REDIS_CLUSTER_HASH_SLOTS, key_slot
 
 from src.abstract_redis import RedisIO
 from .type_handlers import (
     HashHandler,
     ListHandler,
     NoneHandler,
+    PayloadHandler,
     SetHandler,
     StringHandler,
     ZSetHandler,
 )
-from .utils import to_batch
+from .encoders import ENCODERS, encode_value, is_plain
+from .replicas import read_client
+from .throttle import ScanThrottle, WriteThrottle
+from .utils import BatchWorker, approx_size, drive, merge_threaded
 
 
 is_number = lambda x: isinstance(x, int) or isinstance(x, float)
@@ -41,6 +47,73 @@ def b64dec(x):
     return b64applier(x, b64decode)
 
 
+# KEYS = the batch, ARGV = [chunk threshold]; collections larger than a
+# non-zero threshold come back without a value and flagged for windowed
+# reading. The script runs atomically, blocking the server for the whole
+# batch, so it is opt-in.
+FETCH_SCRIPT = """
+local sizers = {list = 'LLEN', set = 'SCARD', hash = 'HLEN', zset = 'ZCARD'}
+local threshold = tonumber(ARGV[1])
+local result = {}
+for i = 1, #KEYS do
+    local key = KEYS[i]
+    local t = redis.call('TYPE', key)['ok']
+    local value = false
+    local chunked = 0
+    if t == 'string' then
+        value = redis.call('GET', key)
+    elseif threshold > 0 and sizers[t] and redis.call(sizers[t], key) > threshold then
+        chunked = 1
+    elseif t == 'list' then
+        value = redis.call('LRANGE', key, 0, -1)
+    elseif t == 'set' then
+        value = redis.call('SMEMBERS', key)
+    elseif t == 'hash' then
+        value = redis.call('HGETALL', key)
+    elseif t == 'zset' then
+        value = redis.call('ZRANGE', key, 0, -1, 'WITHSCORES')
+    end
+    result[i] = {t, redis.call('TTL', key), value, chunked}
+end
+return result
+"""
+
+
+CHUNK_SUFFIX = ":chunk"
+CHUNKED = object()
+SCAN_COUNT = 10000
+
+
+def scripting_unavailable(e: redis.exceptions.ResponseError) -> bool:
+    """
+    Whether `e` means FETCH_SCRIPT cannot run here at all (scripting
+    disabled or renamed, ACLs, keys of several cluster slots), rather than
+    that this call failed, as with BUSY or OOM.
+    """
+    if isinstance(e, (redis.exceptions.NoScriptError, redis.exceptions.NoPermissionError)):
+        return True
+    message = str(e)
+    return message.startswith(("NOSCRIPT", "NOPERM", "CROSSSLOT")) or "unknown command" in message.lower()
+
+
+def pairs(flat: list) -> list:
+    it = iter(flat)
+    return list(zip(it, it))
+
+
+def script_reply_to_raw(_type: str, value: any) -> any:
+    """
+    Reshapes a FETCH_SCRIPT value into what the pipelined getters return.
+    """
+    if value is None:
+        return None
+    if _type == "hash":
+        return dict(pairs(value))
+    if _type == "zset":
+        return [(member, float(score)) for member, score in pairs(value)]
+    return value
+
+
 def decode(x):
     if isinstance(x, dict):
         return {decode(k):decode(v) for k, v in x.items()}
@@ -52,26 +125,133 @@ def decode(x):
         return x
 
 
+TYPE_HANDLERS = {
+    "string": StringHandler,
+    "set": SetHandler,
+    "list": ListHandler,
+    "hash": HashHandler,
+    "zset": ZSetHandler,
+    "none": NoneHandler,
+    "rdb-payload": PayloadHandler,
+}
+
+
+def base_type(_type: str) -> str:
+    return _type[:-len(CHUNK_SUFFIX)] if _type.endswith(CHUNK_SUFFIX) else _type
+
+
+def encode_values(
+    types: List[str],
+    raw_values: List[any],
+    type_handlers: dict = TYPE_HANDLERS,
+    plain_text: bool = False
+) -> List[any]:
+    ret = []
+    for t, r in zip(types, raw_values):
+        t = base_type(t)
+        handler = type_handlers[t]
+        if r is CHUNKED:
+            ret.append(r)
+        elif handler is TYPE_HANDLERS.get(t) and t in ENCODERS:
+            ret.append(encode_value(t, r, plain_text))
+        elif handler.binary:
+            ret.append(decode(b64enc(r)))
+        else:
+            ret.append(handler.process_result(decode(b64enc(decode(r)))))
+    return ret
+
+
+def encode_batch(
+    raw_batch: tuple,
+    type_handlers: dict = TYPE_HANDLERS,
+    plain_text: bool = False
+) -> List[Tuple[str, str, any, int]]:
+    """
+    (types, keys, raw values, ttls) -> [(type, key, value, ttl)]
+
+    Module level so that it can run in worker processes.
+    """
+    types, keys, raw_values, ttls = raw_batch
+    return list(zip(types, keys, encode_values(types, raw_values, type_handlers, plain_text), ttls))
+
+
+def decode_value(handler, val: any) -> any:
+    """
+    Values are base64 unless they are marked plain or are memoryviews
+    (raw blobs of a binary dump).
+    """
+    if is_plain(val) or isinstance(val, memoryview):
+        return val
+    if handler.binary:
+        return b64dec(val)
+    return decode(b64dec(val))
+
+
 class RedisPatternIO(RedisIO):
-    def __init__(self, cli: redis.Redis, pattern: str = None):
+    def __init__(
+        self,
+        cli: redis.Redis,
+        pattern: str = None,
+        use_scripts: bool = False,
+        payloads: bool = False,
+        chunk_threshold: int = 0,
+        chunk_size: int = 10000,
+        plain_text: bool = False,
+        write_batch_size: int = 1000,
+        write_batch_bytes: int = 0,
+        delete_before_write: bool = True,
+        name: str = "0",
+        throttle: dict = None,
+        write_throttle: dict = None
+    ):
+        """
+        Writes are queued on one pipeline together with the DEL of their key
+        and sent once `write_batch_size` keys or, if set, roughly
+        `write_batch_bytes` of values are pending. `delete_before_write=False`
+        skips the DEL for restores into an empty database, except for the
+        first record of lists, sets, hashes and zsets: they may be written
+        in chunks that append to the key, and a record written twice (a key
+        SCAN returned twice, the records a resumed restore repeats) would
+        otherwise add its elements twice.
+
+        `name` identifies the node in the SCAN positions of dump checkpoints.
+
+        `throttle` holds the ScanThrottle settings that size and pace the
+        SCAN batches of this node; every io gets its own throttle.
+        `write_throttle` holds the WriteThrottle settings that pace the
+        restore pipelines by their latency and the memory and replication
+        state of the node.
+        """
         if pattern is None:
             pattern = "*"
 
         self.pattern = pattern
         self.cli = cli
         self.pipe = self.cli.pipeline(transaction=False)
-        self.type_handlers = {
-            "string": StringHandler,
-            "set": SetHandler,
-            "list": ListHandler,
-            "hash": HashHandler,
-            "zset": ZSetHandler,
-            "none": NoneHandler,
-        }
+        self.use_scripts = use_scripts
+        self.payloads = payloads
+        self.chunk_threshold = chunk_threshold
+        self.chunk_size = chunk_size
+        self.plain_text = plain_text
+        self.write_batch_size = write_batch_size
+        self.write_batch_bytes = write_batch_bytes
+        self.delete_before_write = delete_before_write
+        self._pending_writes = 0
+        self._pending_bytes = 0
+        self.name = name
+        self._scan_cursor = 0
+        self._scan_done = False
+        self._fetch_script = self.cli.register_script(FETCH_SCRIPT) if use_scripts else None
+        self.type_handlers = dict(TYPE_HANDLERS)
+        self.throttle = ScanThrottle(self.cli, max_batch=SCAN_COUNT, **throttle) if throttle is not None else None
+        self._on_round_trip = self.throttle.round_trip if self.throttle is not None else None
+        self.write_throttle = WriteThrottle([self.cli], **write_throttle) if write_throttle is not None else None
     
     def count_keys(self) -> int:
-        keys = self.cli.scan_iter("*", count=10000)
-        return sum(1 for i in keys)
+        """
+        DBSIZE, so a single command; an upper bound when a pattern is set.
+        """
+        return self.cli.dbsize()
 
     def get_types(self, keys: List[str]) -> List[str]:
         for k in keys:
@@ -84,44 +264,318 @@ class RedisPatternIO(RedisIO):
             self.pipe.ttl(k)
         return self.pipe.execute()
 
-    def get_values(self, types: List[str], keys: List[str]) -> List[any]:
-        for _type, key in zip(types, keys):
-            self.type_handlers[_type].call_for(self.pipe, key)
-        result = list(map(decode, map(b64enc, map(decode, self.pipe.execute()))))
-        return [self.type_handlers[t].process_result(r) for t, r in zip(types, result)]
+    def _types_and_ttls_steps(self, keys: List[str]):
+        for k in keys:
+            self.pipe.type(k)
+            self.pipe.ttl(k)
+        x = yield self.pipe.execute
+        return list(map(decode, x[0::2])), x[1::2]
+
+    def _chunked_steps(self, types: List[str], keys: List[str]):
+        candidates = []
+        if self.chunk_threshold:
+            candidates = [
+                (_type, key) for _type, key in zip(types, keys)
+                if self.type_handlers[_type].chunkable
+            ]
+        if not candidates:
+            return [False] * len(keys)
+        for _type, key in candidates:
+            self.type_handlers[_type].size_for(self.pipe, key)
+        sizes = dict(zip((key for _, key in candidates), (yield self.pipe.execute)))
+        return [sizes.get(key, 0) > self.chunk_threshold for key in keys]
+
+    def _values_steps(self, types: List[str], keys: List[str], chunked: List[bool] = None):
+        if chunked is None:
+            chunked = [False] * len(keys)
+        # "none" keys vanished after TYPE; NoneHandler queues no command for them
+        for _type, key, skip in zip(types, keys, chunked):
+            if not skip and _type != "none":
+                self.type_handlers[_type].call_for(self.pipe, key)
+        result = iter((yield self.pipe.execute))
+        return [
+            CHUNKED if skip else None if _type == "none" else next(result)
+            for _type, skip in zip(types, chunked)
+        ]
+
+    def _script_steps(self, keys: List[str]):
+        reply = yield lambda: self._fetch_script(keys=keys, args=[self.chunk_threshold])
+        types = [decode(row[0]) for row in reply]
+        raw_values = [
+            CHUNKED if chunked else script_reply_to_raw(t, v)
+            for t, (_, _, v, chunked) in zip(types, reply)
+        ]
+        return types, raw_values, [row[1] for row in reply]
+
+    def _payloads_steps(self, keys: List[str]):
+        for k in keys:
+            PayloadHandler.call_for(self.pipe, k)
+            self.pipe.pttl(k)
+        x = yield self.pipe.execute
+        payloads, ttls = x[0::2], x[1::2]
+        types = ["rdb-payload" if p is not None else "none" for p in payloads]
+        return types, payloads, ttls
+
+    def _fetch_raw_steps(self, keys: List[str]):
+        """
+        One round trip through FETCH_SCRIPT with use_scripts, or two to three
+        pipelines. Scripting is turned off for good only where it cannot run
+        (disabled EVAL, ACLs, cross-slot batches on cluster nodes); other
+        errors are raised.
+        """
+        if self.payloads:
+            return (yield from self._payloads_steps(keys))
+        if self.use_scripts:
+            try:
+                return (yield from self._script_steps(keys))
+            except redis.exceptions.ResponseError as e:
+                if not scripting_unavailable(e):
+                    raise
+                self.use_scripts = False
+        types, ttls = yield from self._types_and_ttls_steps(keys)
+        chunked = yield from self._chunked_steps(types, keys)
+        return types, (yield from self._values_steps(types, keys, chunked)), ttls
+
+    def encode_values(self, types: List[str], raw_values: List[any]) -> List[any]:
+        return encode_values(types, raw_values, self.type_handlers, self.plain_text)
+
+    def encode_batch(self, raw_batch: tuple) -> List[Tuple[str, str, any, int]]:
+        return encode_batch(raw_batch, self.type_handlers, self.plain_text)
+
+    def get_types_and_ttls(self, keys: List[str]) -> Tuple[List[str], List[int]]:
+        return drive(self._types_and_ttls_steps(keys))
+
+    def get_chunked(self, types: List[str], keys: List[str]) -> List[bool]:
+        """
+        Flags collections holding more than chunk_threshold elements.
+        """
+        return drive(self._chunked_steps(types, keys))
+
+    def get_values(self, types: List[str], keys: List[str], chunked: List[bool] = None) -> List[any]:
+        return self.encode_values(types, drive(self._values_steps(types, keys, chunked)))
+
+    def fetch_with_script(self, keys: List[str]) -> Tuple[List[str], List[any], List[int]]:
+        types, raw_values, ttls = drive(self._script_steps(keys))
+        return types, self.encode_values(types, raw_values), ttls
+
+    def get_payloads(self, keys: List[str]) -> Tuple[List[str], List[any], List[int]]:
+        types, raw_values, ttls = drive(self._payloads_steps(keys))
+        return types, self.encode_values(types, raw_values), ttls
+
+    def fetch_raw(self, keys: List[str]) -> Tuple[List[str], List[any], List[int]]:
+        return drive(self._fetch_raw_steps(keys), self._on_round_trip)
+
+    def fetch(self, keys: List[str]) -> Tuple[List[str], List[any], List[int]]:
+        types, raw_values, ttls = self.fetch_raw(keys)
+        return types, self.encode_values(types, raw_values), ttls
+
+    def iter_raw_chunks(self, _type: str, key: str, ttl: int) -> Iterable[tuple]:
+        """
+        Streams a big collection window by window. The first record carries
+        the real type so restore replaces the key; the rest are appended.
+        """
+        record_type = _type
+        for window in self.type_handlers[_type].iter_chunks(self.cli, key, self.chunk_size):
+            yield [record_type], [key], [window], [ttl]
+            record_type = _type + CHUNK_SUFFIX
+
+    def iter_chunks(self, _type: str, key: str, ttl: int) -> Iterable[List[Tuple[str, str, any, int]]]:
+        for raw_batch in self.iter_raw_chunks(_type, key, ttl):
+            yield self.encode_batch(raw_batch)
+
+    def seek_scan(self, cursors: dict) -> None:
+        """
+        Continues SCAN from the cursors of a dump checkpoint; a None cursor
+        means the node was dumped completely.
+        """
+        cursor = cursors.get(self.name, 0)
+        self._scan_done = cursor is None
+        self._scan_cursor = cursor or 0
+
+    def _iter_scan_batches(self) -> Iterable[Tuple[List[str], int]]:
+        """
+        (keys, cursor) of batches made of whole SCAN replies, so a dump that
+        continues from `cursor` sees every key not returned so far.
+        """
+        if self._scan_done:
+            return
+        cursor = self._scan_cursor
+        batch = []
+        count = SCAN_COUNT
+        while True:
+            if self.throttle is not None:
+                count = self.throttle.pace()
+            started = time.monotonic()
+            cursor, keys = self.cli.scan(cursor, match=self.pattern, count=count)
+            if self.throttle is not None:
+                self.throttle.scanned(len(keys), time.monotonic() - started)
+            cursor = int(cursor)
+            batch.extend(keys)
+            if cursor == 0 or len(batch) >= count:
+                yield decode(batch), cursor
+                batch = []
+            if cursor == 0:
+                return
+
+    def iter_key_batches(self) -> Iterable[List[str]]:
+        for keys, _ in self._iter_scan_batches():
+            yield keys
+
+    def iter_raw_batches_of(self, keys: List[str]) -> Iterable[tuple]:
+        """
+        Raw batches of `keys`: one for the keys read at once, then the
+        chunks of collections over chunk_threshold.
+        """
+        types, raw_values, ttls = self.fetch_raw(keys) if keys else ([], [], [])
+        small = [i for i, r in enumerate(raw_values) if r is not CHUNKED]
+        yield (
+            [types[i] for i in small],
+            [keys[i] for i in small],
+            [raw_values[i] for i in small],
+            [ttls[i] for i in small],
+        )
+        for i, r in enumerate(raw_values):
+            if r is CHUNKED:
+                yield from self.iter_raw_chunks(types[i], keys[i], ttls[i])
+
+    def iter_checkpointed_batches(self) -> Iterable[Tuple[Optional[tuple], tuple]]:
+        """
+        Iterable[(position, raw batch)]. The last raw batch of every SCAN
+        batch, chunks included, carries position (name, cursor), the others
+        None; once everything up to it is written, a dump can continue from
+        there with seek_scan. The cursor is None when the node is done.
+        """
+        for keys, cursor in self._iter_scan_batches():
+            position = (self.name, cursor or None)
+            pending = None
+            for raw_batch in self.iter_raw_batches_of(keys):
+                if pending is not None:
+                    yield None, pending
+                pending = raw_batch
+            yield position, pending
+
+    def iter_raw_batches(self) -> Iterable[tuple]:
+        """
+        Iterable[(types, keys, raw values, ttls)], not yet base64 encoded.
+        """
+        for _, raw_batch in self.iter_checkpointed_batches():
+            if raw_batch[1]:
+                yield raw_batch
+
+    def primary_ios(self) -> List["RedisPatternIO"]:
+        """
+        The ios of the nodes that accept writes.
+        """
+        return [self]
+
+    def read_ios(self) -> List["RedisPatternIO"]:
+        """
+        The ios dumps scan and fetch through, one per master; replicas
+        with read_from_replicas.
+        """
+        return [self]
+
+    def iter_batches(self) -> Iterable[List[Tuple[str, str, any, int]]]:
+        for raw_batch in self.iter_raw_batches():
+            yield self.encode_batch(raw_batch)
 
     def __iter__(self) -> Iterable[Tuple[str, str, any, int]]:
         """
         Iterable[(type, key, value, ttl)]
         """
-        keys = self.cli.scan_iter(self.pattern, count=10000)
-        for batch in to_batch(keys, 10000):
-            b = decode(batch)
-            types = self.get_types(b)
-            ttls = self.get_ttls(b)
-            yield from zip(types, b, self.get_values(types, b), ttls)
+        for batch in self.iter_batches():
+            yield from batch
+
+    def _queue_write(self, key: str, _type: str, val: any, ttl: int) -> bool:
+        """
+        Queues the commands of one record and returns whether the batch is full.
+        """
+        continuation = _type.endswith(CHUNK_SUFFIX)
+        if continuation:
+            _type = _type[:-len(CHUNK_SUFFIX)]
+        handler = self.type_handlers[_type]
+        if not continuation and (self.delete_before_write or handler.chunkable) and _type != "none":
+            self.pipe.delete(key)
+        val = decode_value(handler, val)
+        handler.write(self.pipe, key, val, ttl)
+        self._pending_writes += 1
+        if self.write_batch_bytes > 0:
+            self._pending_bytes += approx_size(val)
+            if self._pending_bytes >= self.write_batch_bytes:
+                return True
+        return self._pending_writes >= self.write_batch_size
+
+    def _reset_pending(self) -> None:
+        self._pending_writes = 0
+        self._pending_bytes = 0
 
     def write(self, key: str, _type: str, val: any, ttl: int) -> None:
-        self.cli.delete(key)
-        self.type_handlers[_type].write(self.pipe, key, decode(b64dec(val)), ttl)
-        if len(self.pipe.command_stack) > 1000:
-            self.pipe.execute()
+        if self._queue_write(key, _type, val, ttl):
+            self.flush()
 
     def flush(self) -> None:
+        self._reset_pending()
         if len(self.pipe.command_stack) > 0:
+            if self.write_throttle is None:
+                self.pipe.execute()
+                return
+            self.write_throttle.before_flush()
+            started = time.monotonic()
             self.pipe.execute()
+            self.write_throttle.flushed(time.monotonic() - started)
 
 
 class RedisSingleIO(RedisPatternIO):
-    def __init__(self, uri: str = None, pattern: str = None, cli: redis.Redis = None):
+    def __init__(
+        self,
+        uri: str = None,
+        pattern: str = None,
+        cli: redis.Redis = None,
+        read_from_replicas: bool = False,
+        max_replica_lag: float = None,
+        **options
+    ):
+        """
+        options are passed through to RedisPatternIO.
+
+        `read_from_replicas` connects to the least lagged online replica of
+        the master instead, found through INFO replication; for dumps only,
+        as every command then goes to the replica.
+        """
         _cli = cli
         if _cli is None:
             _cli = redis.Redis.from_url(uri, decode_responses=False)
-        super().__init__(_cli, pattern)
+        if read_from_replicas:
+            _cli, options["name"] = read_client(_cli, options.get("name", "0"), max_lag=max_replica_lag)
+        super().__init__(_cli, pattern, **options)
 
 
 class RedisClusterIO(RedisPatternIO):
-    def __init__(self, uri: str = None, pattern: str = None, cli: redis.cluster.RedisCluster = None):
+    def __init__(
+        self,
+        uri: str = None,
+        pattern: str = None,
+        cli: redis.cluster.RedisCluster = None,
+        workers: int = 1,
+        max_pending_batches: int = 2,
+        parallel_writes: bool = False,
+        read_from_replicas: bool = False,
+        max_replica_lag: float = None,
+        **options
+    ):
+        """
+        options are passed through to the RedisPatternIO of every node.
+
+        Dumps scan every master once. With `read_from_replicas` they scan
+        and fetch through the least lagged online replica of each master
+        instead, falling back to the master where there is none within
+        `max_replica_lag` seconds.
+
+        With `parallel_writes`, restored records are routed by their hash
+        slot to the owning master and written by one pipeline worker per
+        master instead of through the cluster client. Slots that move while
+        restoring are not followed.
+        """
         class CustomConnection(redis.Connection):
             def __init__(self, *args, **kwargs):
                 kwargs["decode_responses"] = False
@@ -130,11 +584,38 @@ class RedisClusterIO(RedisPatternIO):
             initiator_cli = redis.cluster.RedisCluster.from_url(uri, connection_class=CustomConnection)
         else:
             initiator_cli = cli
-        clis = [node.redis_connection for node in initiator_cli.get_nodes()]
-        self._ios = [RedisPatternIO(cli, pattern) for cli in clis]
+        self._primary_ios = []
+        self._ios = []
+        for node in initiator_cli.get_nodes():
+            if getattr(node, "server_type", None) == "replica":
+                continue
+            primary_io = RedisPatternIO(node.redis_connection, pattern, name=node.name, **options)
+            self._primary_ios.append(primary_io)
+            cli, name = node.redis_connection, node.name
+            if read_from_replicas:
+                cli, name = read_client(cli, name, readonly=True, max_lag=max_replica_lag)
+            if cli is node.redis_connection:
+                self._ios.append(primary_io)
+            else:
+                self._ios.append(RedisPatternIO(cli, pattern, name=name, **options))
         self.cli = self._ios[0].cli
         self.pipe = self._ios[0].pipe
-        self._write_io = RedisPatternIO(initiator_cli)
+        self._write_io = RedisPatternIO(initiator_cli, **dict(options, use_scripts=False))
+        if options.get("write_throttle") is not None:
+            # the cluster client writes to every master
+            self._write_io.write_throttle = WriteThrottle(
+                [io.cli for io in self._primary_ios], **options["write_throttle"]
+            )
+        self.type_handlers = self._write_io.type_handlers
+        self.plain_text = options.get("plain_text", False)
+        self._workers = workers
+        self._max_pending_batches = max_pending_batches
+        self._initiator = initiator_cli
+        self._parallel_writes = parallel_writes
+        self._write_options = dict(options, use_scripts=False)
+        self._slot_nodes = [None] * REDIS_CLUSTER_HASH_SLOTS
+        self._slot_writers = [None] * REDIS_CLUSTER_HASH_SLOTS
+        self._node_writers = {}
 
     def count_keys(self) -> int:
         ret = 0
@@ -151,14 +632,110 @@ class RedisClusterIO(RedisPatternIO):
     def get_values(self, types: List[str], keys: List[str]) -> List[any]:
         return self._ios[0].get_values(types, keys)
 
-    def __iter__(self) -> Iterable[Tuple[str, str, any, int]]:
+    def get_types_and_ttls(self, keys: List[str]) -> Tuple[List[str], List[int]]:
+        return self._ios[0].get_types_and_ttls(keys)
+
+    def fetch(self, keys: List[str]) -> Tuple[List[str], List[any], List[int]]:
+        return self._ios[0].fetch(keys)
+
+    def seek_scan(self, cursors: dict) -> None:
         for io in self._ios:
-            for item in io:
-                yield item
+            io.seek_scan(cursors)
+
+    def primary_ios(self) -> List[RedisPatternIO]:
+        return list(self._primary_ios)
+
+    def read_ios(self) -> List[RedisPatternIO]:
+        return list(self._ios)
+
+    def iter_checkpointed_batches(self) -> Iterable[Tuple[Optional[tuple], tuple]]:
+        if self._workers <= 1 or len(self._ios) <= 1:
+            for io in self._ios:
+                yield from io.iter_checkpointed_batches()
+            return
+        # every node is scanned by exactly one worker over its own connection,
+        # so a node never sees more than one in-flight pipeline from us
+        yield from merge_threaded(
+            [io.iter_checkpointed_batches for io in self._ios],
+            self._workers,
+            self._max_pending_batches
+        )
+
+    def _node_of_slot(self, slot: int):
+        node = self._slot_nodes[slot]
+        if node is None:
+            node = self._initiator.nodes_manager.get_node_from_slot(slot)
+            self._slot_nodes[slot] = node
+        return node
+
+    def node_of(self, key: str) -> str:
+        """
+        Name (host:port) of the master that owns `key`.
+        """
+        return self._node_of_slot(key_slot(key.encode("utf-8") if isinstance(key, str) else key)).name
+
+    def _node_writer(self, key: str) -> "_NodeWriter":
+        slot = key_slot(key.encode("utf-8") if isinstance(key, str) else key)
+        writer = self._slot_writers[slot]
+        if writer is None:
+            node = self._node_of_slot(slot)
+            writer = self._node_writers.get(node.name)
+            if writer is None:
+                writer = _NodeWriter(
+                    RedisPatternIO(node.redis_connection, **self._write_options),
+                    self._max_pending_batches
+                )
+                self._node_writers[node.name] = writer
+            self._slot_writers[slot] = writer
+        return writer
 
     def write(self, key: str, _type: str, val: any, ttl: int) -> None:
-        self._write_io.write(key, _type, val, ttl)
+        if self._parallel_writes:
+            self._node_writer(key).write(key, _type, val, ttl)
+        else:
+            self._write_io.write(key, _type, val, ttl)
 
     def flush(self) -> None:
         for io in self._ios:
             io.flush()
+        self._write_io.flush()
+        for writer in self._node_writers.values():
+            writer.submit_flush()
+        for writer in self._node_writers.values():
+            writer.join()
+
+
+_FLUSH = object()
+
+
+class _NodeWriter:
+    """
+    Buffers the records of one cluster node and writes them through its
+    RedisPatternIO on a worker thread.
+    """
+    def __init__(self, io: RedisPatternIO, max_pending_batches: int):
+        self.io = io
+        self._buffer = []
+        self._worker = BatchWorker(self._handle, max_pending_batches)
+
+    def _handle(self, batch) -> None:
+        if batch is _FLUSH:
+            self.io.flush()
+            return
+        for record in batch:
+            self.io.write(*record)
+
+    def write(self, key: str, _type: str, val: any, ttl: int) -> None:
+        self._buffer.append((key, _type, val, ttl))
+        if len(self._buffer) >= self.io.write_batch_size:
+            self._worker.submit(self._buffer)
+            self._buffer = []
+
+    def submit_flush(self) -> None:
+        if self._buffer:
+            self._worker.submit(self._buffer)
+            self._buffer = []
+        self._worker.submit(_FLUSH)
+
+    def join(self) -> None:
+        self._worker.join()
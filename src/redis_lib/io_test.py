@@ -1,7 +1,8 @@
 import unittest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 from .io import *
+from redis.crc import key_slot
 from src.mock.redis import MockRedis
 
 
@@ -131,6 +132,9 @@ class RedisPatterIOTest(unittest.TestCase):
             MockRedis(self._redis_data, self._redis_ttls)
         )
     
+    def _fetching_io(self):
+        return self._redis_pattern_io
+
     def test_count_keys(self):
         self.assertEqual(self._redis_pattern_io.count_keys(), len(self._redis_data))
     
@@ -166,6 +170,145 @@ class RedisPatterIOTest(unittest.TestCase):
         ]
         self.assertEqual(returned_value, expected_value)
     
+    def test_get_types_and_ttls(self):
+        keys = list(self._redis_data.keys())
+        types, ttls = self._redis_pattern_io.get_types_and_ttls(keys)
+        self.assertEqual(types, self._types)
+        self.assertEqual(ttls, list(self._redis_ttls.values()))
+
+    def test_fetch_falls_back_without_scripting(self):
+        self._fetching_io().use_scripts = True
+        self._fetching_io()._fetch_script = self._fetching_io().cli.register_script(FETCH_SCRIPT)
+        keys = list(self._redis_data.keys())
+        types, values, ttls = self._redis_pattern_io.fetch(keys)
+        self.assertFalse(self._fetching_io().use_scripts)
+        self.assertEqual(types, self._types)
+        self.assertEqual(ttls, list(self._redis_ttls.values()))
+        self.assertEqual(decode(b64dec(values))[3], "test")
+
+    def test_fetch_keeps_scripting_on_other_errors(self):
+        def busy(keys, args):
+            raise redis.exceptions.ResponseError("BUSY Redis is busy running a script")
+        self._fetching_io().use_scripts = True
+        self._fetching_io()._fetch_script = busy
+        with self.assertRaises(redis.exceptions.ResponseError):
+            self._redis_pattern_io.fetch(["string"])
+        self.assertTrue(self._fetching_io().use_scripts)
+
+    def test_fetch_with_script(self):
+        self._fetching_io().use_scripts = True
+        self._fetching_io()._fetch_script = lambda keys, args: [
+            [b"hash", 10, [b"foo1", b"bar"], 0],
+            [b"string", -1, b"test", 0],
+            [b"zset", -1, [b"1", b"1", b"10", b"2.5"], 0],
+            [b"none", -2, None, 0],
+        ]
+        types, values, ttls = self._redis_pattern_io.fetch(["hash", "string", "zset", "missing"])
+        self.assertEqual(types, ["hash", "string", "zset", "none"])
+        self.assertEqual(ttls, [10, -1, -1, -2])
+        self.assertEqual(
+            decode(b64dec(values[:3])),
+            [{"foo1": "bar"}, "test", {"1": "1.0", "10": "2.5"}]
+        )
+
+    def _writing_io(self):
+        return self._redis_pattern_io
+
+    def test_fetch_with_script_chunked(self):
+        self._fetching_io().use_scripts = True
+        self._fetching_io()._fetch_script = lambda keys, args: [
+            [b"list", -1, None, 1],
+            [b"string", -1, b"test", 0],
+        ]
+        types, values, ttls = self._redis_pattern_io.fetch(["big", "string"])
+        self.assertEqual(types, ["list", "string"])
+        self.assertIs(values[0], CHUNKED)
+
+    def test_get_chunked(self):
+        io = self._fetching_io()
+        io.chunk_threshold = 2
+        keys = list(self._redis_data.keys())
+        io.pipe = MagicMock()
+        io.pipe.execute.return_value = [1, 3, 3, 2]
+        self.assertEqual(io.get_chunked(self._types, keys), [False, True, True, False, False])
+
+    def test_iter_chunks(self):
+        io = self._fetching_io()
+        io.chunk_size = 2
+        io.cli = MagicMock()
+        io.cli.lrange.side_effect = [[b"1", b"2"], [b"3"]]
+        returned_value = [
+            (t, k, decode(b64dec(v)), ttl)
+            for batch in io.iter_chunks("list", "big", 5) for t, k, v, ttl in batch
+        ]
+        expected_value = [
+            ("list", "big", ["1", "2"], 5),
+            ("list:chunk", "big", ["3"], 5),
+        ]
+        self.assertEqual(returned_value, expected_value)
+
+    def test_write_chunk_appends(self):
+        self._redis_pattern_io.write("test_write", "set", b64enc(["1", "2"]), -1)
+        self._redis_pattern_io.write("test_write", "set:chunk", b64enc(["3"]), -1)
+        self.assertEqual(self._writing_io().cli.smembers("test_write"), ["1", "2", "3"])
+
+    def test_get_payloads(self):
+        self._fetching_io().pipe = MagicMock()
+        self._fetching_io().pipe.execute.return_value = [b"\x00\xff", 10500, None, -2]
+        self._fetching_io().payloads = True
+        types, values, ttls = self._redis_pattern_io.fetch(["dumped", "missing"])
+        self.assertEqual(types, ["rdb-payload", "none"])
+        self.assertEqual(b64dec(values[0]), b"\x00\xff")
+        self.assertEqual(ttls, [10500, -2])
+        self._fetching_io().pipe.pttl.assert_any_call("dumped")
+
+    def test_write_payload(self):
+        self._writing_io().pipe = MagicMock()
+        self._redis_pattern_io.write("k", "rdb-payload", b64enc(b"\x00\xff"), 10500)
+        self._writing_io().pipe.restore.assert_called_once_with("k", 10500, b"\x00\xff", replace=True)
+
+    def _batching_io(self, **options):
+        io = self._writing_io()
+        io.pipe = MagicMock()
+        io.pipe.command_stack = [None]
+        for name, value in options.items():
+            setattr(io, name, value)
+        return io
+
+    def test_write_deletes_in_pipeline(self):
+        io = self._batching_io()
+        io.cli = MagicMock()
+        self._redis_pattern_io.write("k", "string", b64enc("v"), -1)
+        io.pipe.delete.assert_called_once_with("k")
+        io.cli.delete.assert_not_called()
+
+    def test_write_without_delete(self):
+        io = self._batching_io(delete_before_write=False)
+        self._redis_pattern_io.write("k", "string", b64enc("v"), -1)
+        io.pipe.delete.assert_not_called()
+
+    def test_write_without_delete_keeps_collection_delete(self):
+        io = self._batching_io(delete_before_write=False)
+        self._redis_pattern_io.write("l", "list", b64enc("['1', '2']"), -1)
+        self._redis_pattern_io.write("l", "list:chunk", b64enc("['3']"), -1)
+        self._redis_pattern_io.write("s", "set", b64enc("['1']"), -1)
+        self.assertEqual([c.args for c in io.pipe.delete.call_args_list], [("l",), ("s",)])
+
+    def test_write_batch_size(self):
+        io = self._batching_io(write_batch_size=2)
+        for i in range(5):
+            self._redis_pattern_io.write(f"k{i}", "string", b64enc("v"), -1)
+        self.assertEqual(io.pipe.execute.call_count, 2)
+        self._redis_pattern_io.flush()
+        self.assertEqual(io.pipe.execute.call_count, 3)
+
+    def test_write_batch_bytes(self):
+        io = self._batching_io(write_batch_bytes=10)
+        self._redis_pattern_io.write("small", "string", b64enc("v"), -1)
+        io.pipe.execute.assert_not_called()
+        self._redis_pattern_io.write("big", "string", b64enc("v" * 10), -1)
+        io.pipe.execute.assert_called_once()
+
     def test_iter(self):
         idx = 0
         expected_values = [
@@ -204,6 +347,20 @@ class RedisPatterIOTest(unittest.TestCase):
         self.assertEqual(cli.type("test_write"), "set")
         self.assertEqual(cli.ttl("test_write"), -1) # set doesn't have ttl
 
+    @patch("src.redis_lib.io.SCAN_COUNT", 2)
+    def test_iter_checkpointed_batches(self):
+        io = RedisPatternIO(MockRedis(self._redis_data, self._redis_ttls))
+        positions = [(position, raw_batch[1]) for position, raw_batch in io.iter_checkpointed_batches()]
+        self.assertEqual(positions, [
+            (("0", 2), ["hash", "list"]),
+            (("0", 4), ["set", "string"]),
+            (("0", None), ["zset"]),
+        ])
+        io.seek_scan({"0": 4})
+        self.assertEqual([raw_batch[1] for raw_batch in io.iter_raw_batches()], [["zset"]])
+        io.seek_scan({"0": None})
+        self.assertEqual(list(io.iter_raw_batches()), [])
+
     def test_flush(self):
         with self.assertRaises(Exception):
             self._redis_pattern_io.pipe.set("hash", "1")
@@ -229,7 +386,49 @@ class RedisClusterIOTest(RedisPatterIOTest):
             cli=MockRedis(self._redis_data, self._redis_ttls)
         )
 
+    def _fetching_io(self):
+        return self._redis_pattern_io._ios[0]
+
+    def _writing_io(self):
+        return self._redis_pattern_io._write_io
+
     def test_init(self):
         RedisClusterIO(
             cli=MockRedis(self._redis_data, self._redis_ttls)
         )
+
+    def test_parallel_iter(self):
+        first = MockRedis({"a": "1", "b": "2"}, {})
+        second = MockRedis({"c": "3"}, {})
+        initiator = MagicMock()
+        initiator.get_nodes.return_value = first.get_nodes() + second.get_nodes()
+        io = RedisClusterIO(cli=initiator, workers=2)
+        returned_value = sorted((t, k, decode(b64dec(v)), ttl) for t, k, v, ttl in io)
+        expected_value = [
+            ("string", "a", "1", -1),
+            ("string", "b", "2", -1),
+            ("string", "c", "3", -1),
+        ]
+        self.assertEqual(returned_value, expected_value)
+
+    def test_parallel_writes(self):
+        first = MockRedis({"existing": "x"}, {})
+        second = MockRedis({"existing": "x"}, {})
+        initiator = MagicMock()
+        initiator.get_nodes.return_value = first.get_nodes()
+
+        def node_from_slot(slot):
+            node = MagicMock()
+            node.name = "first" if slot < 8192 else "second"
+            node.redis_connection = first if slot < 8192 else second
+            return node
+        initiator.nodes_manager.get_node_from_slot.side_effect = node_from_slot
+        io = RedisClusterIO(cli=initiator, parallel_writes=True, write_batch_size=2)
+        keys = [f"key{i}" for i in range(10)]
+        for key in keys:
+            io.write(key, "string", b64enc(key), -1)
+        io.flush()
+        for key in keys:
+            owner = first if key_slot(key.encode()) < 8192 else second
+            self.assertEqual(owner.get(key), key)
+        self.assertEqual(len(io._node_writers), 2)
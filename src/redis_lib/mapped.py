@@ -0,0 +1,65 @@
+import io
+import mmap
+import os
+from stat import S_ISREG
+from typing import IO, Iterable, Optional, Tuple
+
+
+def map_file(f: IO) -> Optional[mmap.mmap]:
+    """
+    Read-only mapping of the whole file behind `f`, or None if `f` is not a
+    non-empty regular file (pipes, sockets, in-memory streams).
+    """
+    try:
+        fileno = f.fileno()
+        stat = os.fstat(fileno)
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return None
+    if not S_ISREG(stat.st_mode) or stat.st_size == 0:
+        return None
+    return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+
+
+def iter_line_offsets(mapping: mmap.mmap, start: int = 0) -> Iterable[Tuple[bytes, int]]:
+    """
+    (line, offset of the next line) of a mapping from `start` on, found
+    with mmap.find instead of going through text IO; json.loads takes the
+    bytes lines as they are. Every line is still copied once out of the
+    mapping: json.loads does not accept memoryviews, and views would keep
+    the mapping from being closed. The mapping is closed at the end.
+    """
+    try:
+        pos = start
+        end = len(mapping)
+        find = mapping.find
+        while pos < end:
+            newline = find(b"\n", pos)
+            if newline < 0:
+                newline = end
+            if newline > pos:
+                yield mapping[pos:newline], newline + 1
+            pos = newline + 1
+    finally:
+        mapping.close()
+
+
+def iter_lines(mapping: mmap.mmap) -> Iterable[bytes]:
+    for line, _ in iter_line_offsets(mapping):
+        yield line
+
+
+def iter_lines_at(mapping: mmap.mmap, offsets: Iterable[int]) -> Iterable[Tuple[bytes, int]]:
+    """
+    (line, offset of the next line) of the lines starting at `offsets`,
+    copied like in iter_line_offsets. The mapping is closed at the end.
+    """
+    try:
+        end = len(mapping)
+        find = mapping.find
+        for pos in offsets:
+            newline = find(b"\n", pos)
+            if newline < 0:
+                newline = end
+            yield mapping[pos:newline], newline + 1
+    finally:
+        mapping.close()
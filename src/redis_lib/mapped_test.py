@@ -0,0 +1,42 @@
+import io
+import json
+import tempfile
+import unittest
+
+from .dumpers import JSONDumper, iter_dump_lines
+from .mapped import iter_lines, map_file
+from src.mock.redis_io import RedisIOMock
+
+
+class MappedTest(unittest.TestCase):
+    def _file(self, content: bytes):
+        f = tempfile.TemporaryFile()
+        f.write(content)
+        f.seek(0)
+        self.addCleanup(f.close)
+        return f
+
+    def test_map_file_needs_regular_file(self):
+        self.assertIsNone(map_file(io.BytesIO(b"abc")))
+        self.assertIsNone(map_file(self._file(b"")))
+        self.assertIsNotNone(map_file(self._file(b"abc")))
+
+    def test_iter_lines(self):
+        f = self._file(b"a\n\nbc\r\nd")
+        self.assertEqual(list(iter_lines(map_file(f))), [b"a", b"bc\r", b"d"])
+
+    def test_iter_dump_lines(self):
+        f = self._file(b'{"key": "k"}\n')
+        lines = list(iter_dump_lines(f))
+        self.assertEqual(lines, [b'{"key": "k"}'])
+        self.assertEqual(json.loads(lines[0]), {"key": "k"})
+        self.assertEqual(list(iter_dump_lines(io.StringIO("x\n"))), ["x\n"])
+
+    def test_restore_from_mapped_file(self):
+        data = [("string", f"key{i}", "dGVzdA==", -1) for i in range(3)]
+        with tempfile.TemporaryFile("w+") as f:
+            JSONDumper(f, False, False, False).dump(RedisIOMock(list(data)))
+            f.seek(0)
+            io_mock = RedisIOMock([])
+            JSONDumper(f, False, False, False).restore(io_mock)
+        self.assertEqual(io_mock.get_data(), data)
@@ -0,0 +1,147 @@
+import os
+import sys
+import json
+import hashlib
+import time
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Callable
+
+import progressbar
+
+from src.abstract_redis import RedisIO
+from .compression import codec_for, open_reader
+from .checkpoint import RestoreCheckpoint
+from .dumpers import may_be_chunked, restore_json_lines, skip_lines
+from .mapped import iter_line_offsets, map_file
+from .shards import file_sha256, list_shards
+from .utils import RateLimiter
+
+
+class ParallelRestore:
+    """
+    Restores the shards of a sharded dump (a directory or its manifest.json)
+    with `workers` threads. Every worker gets its own RedisIO from
+    `io_factory`, so its own connection and pipeline; `rate_limit` caps the
+    restored records per second over all workers. Shards whose manifest
+    entry has a sha256 are verified before any of their records is
+    written: uncompressed ones through their mmap, compressed ones in an
+    extra read of the file.
+
+    Shards are restored in any order, so every key must lie within one
+    shard: a chunk record of a key that did not start in its shard raises
+    ValueError before it is written.
+
+    With a `checkpoint`, every shard commits its progress under its file
+    name; shards a loaded checkpoint marks done are skipped and the others
+    continue after their committed records.
+    """
+    def __init__(
+        self,
+        path: str,
+        io_factory: Callable[[], RedisIO],
+        workers: int = 4,
+        rate_limit: float = 0,
+        enable_progress_bar: bool = True,
+        log: bool = True,
+        checkpoint: RestoreCheckpoint = None
+    ) -> None:
+        self.directory, self.shards = list_shards(path)
+        self._io_factory = io_factory
+        self._workers = max(1, workers)
+        self._rate_limiter = RateLimiter(rate_limit)
+        self._enable_progress_bar = enable_progress_bar
+        self._log = log
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._restored = 0
+        self._bar = None
+        self._checkpoint = checkpoint
+
+    def _io(self) -> RedisIO:
+        io = getattr(self._local, "io", None)
+        if io is None:
+            io = self._local.io = self._io_factory()
+        return io
+
+    def _progress(self, n: int) -> None:
+        with self._lock:
+            self._restored += n
+            if self._bar is not None:
+                if self._restored > self._bar.maxval:
+                    self._bar.maxval = self._restored
+                self._bar.update(self._restored)
+
+    def _restore_lines(self, lines, source: str, started_keys: set) -> int:
+        return restore_json_lines(
+            lines, self._io(), self._rate_limiter, self._progress, self._checkpoint, source, started_keys
+        )
+
+    @staticmethod
+    def _keys_started(path: str, records: int) -> set:
+        """
+        Collections whose first record is among the first `records` records
+        of a shard; a resumed shard may still continue them.
+        """
+        started = set()
+        if records > 0:
+            with open(path, "rb") as f:
+                for line in islice(open_reader(f), records):
+                    j = json.loads(line)
+                    if may_be_chunked(j["type"]):
+                        started.add(j["key"])
+        return started
+
+    def _restore_shard(self, entry: dict) -> int:
+        path = os.path.join(self.directory, entry["file"])
+        offset, records, done = None, 0, False
+        if self._checkpoint is not None:
+            offset, records, done = self._checkpoint.position(entry["file"])
+        if done:
+            return 0
+        started_keys = self._keys_started(path, records)
+        with open(path, "rb") as f:
+            mapping = map_file(f)
+            if "sha256" in entry:
+                digest = hashlib.sha256(mapping).hexdigest() if mapping is not None else file_sha256(f)
+                if digest != entry["sha256"]:
+                    if mapping is not None:
+                        mapping.close()
+                    raise ValueError(f"checksum of {entry['file']} does not match the manifest")
+            if mapping is not None and codec_for(mapping[:4]) is None:
+                if offset is not None:
+                    return self._restore_lines(iter_line_offsets(mapping, offset), entry["file"], started_keys)
+                return self._restore_lines(skip_lines(iter_line_offsets(mapping), records), entry["file"], started_keys)
+            if mapping is not None:
+                mapping.close()
+            f.seek(0)
+            lines = skip_lines(((line, None) for line in open_reader(f)), records)
+            return self._restore_lines(lines, entry["file"], started_keys)
+
+    def restore(self) -> int:
+        started = time.monotonic()
+        if self._enable_progress_bar:
+            total = sum(entry.get("records", 0) for entry in self.shards)
+            self._bar = progressbar.ProgressBar(maxval=max(1, total), \
+                widgets=[progressbar.Bar('=', '[', ']'), ' ', progressbar.Percentage()])
+            self._bar.start()
+        with ThreadPoolExecutor(max_workers=self._workers) as pool:
+            futures = [pool.submit(self._restore_shard, entry) for entry in self.shards]
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in done:
+                if future.exception() is not None:
+                    for pending in futures:
+                        pending.cancel()
+                    raise future.exception()
+            number_of_restored_keys = sum(future.result() for future in futures)
+        if self._checkpoint is not None:
+            self._checkpoint.remove()
+        if self._bar is not None:
+            self._bar.finish()
+        if self._log:
+            elapsed = max(time.monotonic() - started, 1e-9)
+            print(f"Number of Restored Keys: {number_of_restored_keys} "
+                  f"({number_of_restored_keys / elapsed:.0f} keys/sec) from {len(self.shards)} shards",
+                  file=sys.stderr)
+        return number_of_restored_keys
@@ -0,0 +1,86 @@
+import sys
+from typing import List, Optional, Tuple
+
+import redis
+
+
+def replica_lags(cli: redis.Redis) -> List[Tuple[str, int, int, int]]:
+    """
+    (host, port, lag in bytes, lag in seconds) of the online replicas of
+    the master behind `cli`, from INFO replication.
+    """
+    info = cli.info("replication")
+    if info.get("role") != "master":
+        return []
+    master_offset = int(info.get("master_repl_offset", 0))
+    ret = []
+    for i in range(int(info.get("connected_slaves", 0))):
+        replica = info.get(f"slave{i}")
+        if not isinstance(replica, dict) or replica.get("state") != "online":
+            continue
+        ret.append((
+            str(replica["ip"]),
+            int(replica["port"]),
+            max(0, master_offset - int(replica.get("offset", 0))),
+            int(replica.get("lag", 0)),
+        ))
+    return ret
+
+
+def least_lagged_replica(cli: redis.Redis, max_lag: float = None) -> Optional[Tuple[str, int]]:
+    """
+    (host, port) of the replica furthest along the replication stream,
+    leaving out replicas that did not ack within `max_lag` seconds.
+    """
+    candidates = [
+        (lag_bytes, lag, host, port)
+        for host, port, lag_bytes, lag in replica_lags(cli)
+        if max_lag is None or lag <= max_lag
+    ]
+    if not candidates:
+        return None
+    _, _, host, port = min(candidates)
+    return host, port
+
+
+def _send_readonly(connection) -> None:
+    connection.on_connect()
+    connection.send_command("READONLY")
+    connection.read_response()
+
+
+def replica_client(cli: redis.Redis, host: str, port: int, readonly: bool = False) -> redis.Redis:
+    """
+    A client of `host`:`port` with the connection settings of `cli`.
+    `readonly` sends READONLY on every connection, which replicas of a
+    cluster need to serve reads.
+    """
+    pool = cli.connection_pool
+    kwargs = dict(pool.connection_kwargs, host=host, port=port)
+    kwargs.pop("path", None)
+    kwargs["redis_connect_func"] = _send_readonly if readonly else None
+    return redis.Redis(connection_pool=redis.ConnectionPool(connection_class=pool.connection_class, **kwargs))
+
+
+def read_client(cli: redis.Redis, name: str, readonly: bool = False, max_lag: float = None) -> Tuple[redis.Redis, str]:
+    """
+    (client, name) of the least lagged replica of the master behind `cli`,
+    or `cli` and `name` themselves if no replica is online, caught up
+    within `max_lag` seconds and reachable.
+    """
+    try:
+        replica = least_lagged_replica(cli, max_lag)
+    except redis.exceptions.RedisError:
+        replica = None
+    if replica is None:
+        print(f"No replica of {name} to read from, reading the master", file=sys.stderr)
+        return cli, name
+    host, port = replica
+    replica_cli = replica_client(cli, host, port, readonly)
+    try:
+        replica_cli.ping()
+    except redis.exceptions.RedisError:
+        replica_cli.close()
+        print(f"Replica {host}:{port} of {name} is not reachable, reading the master", file=sys.stderr)
+        return cli, name
+    return replica_cli, f"{host}:{port}"
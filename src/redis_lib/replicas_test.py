@@ -0,0 +1,82 @@
+import unittest
+from contextlib import redirect_stderr
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+import redis
+
+from .io import RedisClusterIO, RedisSingleIO
+from .replicas import least_lagged_replica, read_client, replica_client
+from src.mock.redis import MockRedis
+
+
+def replication_info(*replicas, master_offset=1000):
+    info = {"role": "master", "connected_slaves": len(replicas), "master_repl_offset": master_offset}
+    for i, (port, offset, lag, state) in enumerate(replicas):
+        info[f"slave{i}"] = {"ip": "10.0.0.1", "port": port, "state": state, "offset": offset, "lag": lag}
+    return info
+
+
+class ReplicasTest(unittest.TestCase):
+    def _master(self, info) -> MockRedis:
+        cli = MockRedis({"a": "1"}, {})
+        cli.info = MagicMock(return_value=info)
+        return cli
+
+    def test_least_lagged_replica(self):
+        cli = self._master(replication_info(
+            (6380, 900, 0, "online"),
+            (6381, 990, 1, "online"),
+            (6382, 1000, 0, "wait_bgsave"),
+        ))
+        self.assertEqual(least_lagged_replica(cli), ("10.0.0.1", 6381))
+        self.assertEqual(least_lagged_replica(cli, max_lag=0), ("10.0.0.1", 6380))
+        cli.info.assert_called_with("replication")
+
+    def test_no_replica(self):
+        self.assertIsNone(least_lagged_replica(self._master(replication_info())))
+        self.assertIsNone(least_lagged_replica(self._master({"role": "slave"})))
+
+    def test_read_client_falls_back_to_master(self):
+        cli = self._master(replication_info())
+        with redirect_stderr(StringIO()) as err:
+            self.assertEqual(read_client(cli, "master"), (cli, "master"))
+        self.assertIn("No replica of master", err.getvalue())
+        cli = self._master(replication_info((6380, 1000, 0, "online")))
+        unreachable = MagicMock()
+        unreachable.ping.side_effect = redis.exceptions.ConnectionError("refused")
+        with patch("src.redis_lib.replicas.replica_client", return_value=unreachable), redirect_stderr(StringIO()):
+            self.assertEqual(read_client(cli, "master"), (cli, "master"))
+
+    def test_replica_client(self):
+        cli = redis.Redis(host="master", port=6379, db=2, password="secret")
+        replica = replica_client(cli, "replica", 6380, readonly=True)
+        kwargs = replica.connection_pool.connection_kwargs
+        self.assertEqual((kwargs["host"], kwargs["port"], kwargs["db"], kwargs["password"]), ("replica", 6380, 2, "secret"))
+        self.assertIsNotNone(kwargs["redis_connect_func"])
+
+    def test_single_io(self):
+        cli = self._master(replication_info((6380, 1000, 0, "online")))
+        replica = MockRedis({"b": "2"}, {})
+        with patch("src.redis_lib.replicas.replica_client", return_value=replica):
+            io = RedisSingleIO(cli=cli, read_from_replicas=True)
+        self.assertIs(io.cli, replica)
+        self.assertEqual(io.name, "10.0.0.1:6380")
+        self.assertEqual([key for _, key, _, _ in io], ["b"])
+
+    def test_cluster_io(self):
+        master = self._master(replication_info((6380, 1000, 0, "online")))
+        replica = MockRedis({"a": "1"}, {})
+        nodes = master.get_nodes() + replica.get_nodes()
+        nodes[1].server_type = "replica"
+        initiator = MagicMock()
+        initiator.get_nodes.return_value = nodes
+        io = RedisClusterIO(cli=initiator)
+        self.assertEqual([key for _, key, _, _ in io], ["a"])
+        self.assertIs(io.read_ios()[0].cli, master)
+        with patch("src.redis_lib.replicas.replica_client", return_value=replica) as connect:
+            io = RedisClusterIO(cli=initiator, read_from_replicas=True)
+        connect.assert_called_once_with(master, "10.0.0.1", 6380, True)
+        self.assertIs(io.read_ios()[0].cli, replica)
+        self.assertIs(io.primary_ios()[0].cli, master)
+        self.assertEqual([key for _, key, _, _ in io], ["a"])
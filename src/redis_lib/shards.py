@@ -0,0 +1,300 @@
+import io
+import os
+import json
+import hashlib
+from typing import Callable, Dict, IO, List, Optional, Tuple
+
+from redis.crc import REDIS_CLUSTER_HASH_SLOTS, key_slot
+
+from .compression import get_codec, open_writer
+from .io import CHUNK_SUFFIX
+
+
+MANIFEST = "manifest.json"
+SHARD_BY = ("slot", "node", "records", "bytes")
+
+
+class _HashingFile(io.BufferedIOBase):
+    """
+    Binary file that keeps the size and sha256 of everything written to it.
+    """
+    def __init__(self, f: IO[bytes]) -> None:
+        super().__init__()
+        self._f = f
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        return self._f.write(data)
+
+    def flush(self) -> None:
+        self._f.flush()
+
+    def close(self) -> None:
+        if not self.closed:
+            super().close()
+            self._f.close()
+
+
+def file_sha256(f: IO[bytes]) -> str:
+    sha256 = hashlib.sha256()
+    for block in iter(lambda: f.read(1 << 20), b""):
+        sha256.update(block)
+    return sha256.hexdigest()
+
+
+class _Shard:
+    def __init__(self, path: str, compression: str, level: int, threads: int, state: dict = None) -> None:
+        """
+        With the `state` of a checkpoint, the file is cut back to it and
+        appended to.
+        """
+        self.path = path
+        self.records = 0
+        self.text_size = 0
+        if state is None:
+            self._file = _HashingFile(open(path, "wb"))
+        else:
+            self._file = self._reopen(state)
+        if compression is None or compression == "none":
+            self._out = io.TextIOWrapper(self._file, encoding="utf-8", newline="\n")
+        else:
+            self._out = open_writer(self._file, compression, level, threads)
+
+    def _reopen(self, state: dict) -> _HashingFile:
+        f = open(self.path, "r+b")
+        f.truncate(state["offset"])
+        hashing = _HashingFile(f)
+        for block in iter(lambda: f.read(1 << 20), b""):
+            hashing.sha256.update(block)
+            hashing.size += len(block)
+        self.records = state["records"]
+        self.text_size = state["text_size"]
+        return hashing
+
+    def write(self, line: str) -> None:
+        self._out.write(line)
+        self.records += 1
+        self.text_size += len(line)
+
+    def checkpoint(self) -> dict:
+        self._out.flush()
+        self._file.flush()
+        return {"offset": self._file.size, "records": self.records, "text_size": self.text_size}
+
+    def abort(self) -> None:
+        if hasattr(self._out, "abort"):
+            self._out.abort()
+        else:
+            self._out.close()
+        self._file.close()
+
+    def close(self) -> dict:
+        self._out.close()
+        self._file.close()
+        return {
+            "file": os.path.basename(self.path),
+            "records": self.records,
+            "bytes": self._file.size,
+            "sha256": self._file.sha256.hexdigest(),
+        }
+
+
+class ShardedOutput:
+    """
+    Dump target that splits the dump lines over files in `directory`:
+
+    - slot: `shards` files, each holding a contiguous range of hash slots
+    - node: one file per cluster node, `node_of(key)` names the node
+    - records / bytes: a new file after `max_records` lines or `max_bytes`
+      characters, at the next key. Chunks go to the file their key started
+      in, which stays open until the node the key came from (`node_of`, if
+      given; cluster nodes are dumped in parallel) starts another key, so a
+      chunked key is never split
+
+    close() writes manifest.json with the record count, size and sha256 of
+    every shard file, as written to disk. A failed dump calls abort()
+    instead, which writes no manifest.
+    """
+    def __init__(
+        self,
+        directory: str,
+        shard_by: str = "records",
+        shards: int = 16,
+        max_records: int = 1000000,
+        max_bytes: int = 1 << 30,
+        node_of: Optional[Callable[[str], str]] = None,
+        compression: str = None,
+        compression_level: int = None,
+        compression_threads: int = 1
+    ) -> None:
+        if shard_by not in SHARD_BY:
+            raise ValueError(f"shard_by must be one of {SHARD_BY}")
+        if shard_by == "node" and node_of is None:
+            raise ValueError("sharding by node needs a cluster")
+        self.directory = directory
+        self.shard_by = shard_by
+        self.shards = shards
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.node_of = node_of
+        self.compression = compression if compression != "none" else None
+        self._compression_level = compression_level
+        self._compression_threads = compression_threads
+        self._extension = ".jsonl" + (get_codec(self.compression).extension if self.compression else "")
+        self._open: Dict[str, _Shard] = {}
+        self._entries: List[dict] = []
+        self._sequence = 0
+        # part of the key each node is currently writing
+        self._key_parts: Dict[Optional[str], str] = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _shard_name(self, key: str) -> str:
+        if self.shard_by == "slot":
+            i = key_slot(key.encode("utf-8")) * self.shards // REDIS_CLUSTER_HASH_SLOTS
+            start = -(-i * REDIS_CLUSTER_HASH_SLOTS // self.shards)
+            end = -(-(i + 1) * REDIS_CLUSTER_HASH_SLOTS // self.shards) - 1
+            return f"slots-{start:05d}-{end:05d}"
+        if self.shard_by == "node":
+            return "node-" + self.node_of(key).replace(":", "_").replace("/", "_")
+        return f"part-{self._sequence:05d}"
+
+    def _new_shard(self, name: str, state: dict = None) -> _Shard:
+        return _Shard(
+            os.path.join(self.directory, name + self._extension),
+            self.compression,
+            self._compression_level,
+            self._compression_threads,
+            state
+        )
+
+    def _shard(self, key: str) -> _Shard:
+        name = self._shard_name(key)
+        shard = self._open.get(name)
+        if shard is None:
+            shard = self._new_shard(name)
+            self._open[name] = shard
+        return shard
+
+    def _rotate(self) -> None:
+        """
+        Starts the next part once the current one is full, and closes the
+        parts no node is writing a key to anymore.
+        """
+        current = f"part-{self._sequence:05d}"
+        shard = self._open.get(current)
+        full = shard is not None and (
+            (self.shard_by == "records" and shard.records >= self.max_records)
+            or (self.shard_by == "bytes" and shard.text_size >= self.max_bytes)
+        )
+        if full:
+            self._sequence += 1
+            current = f"part-{self._sequence:05d}"
+        in_use = set(self._key_parts.values())
+        for name in sorted(self._open):
+            if name != current and name not in in_use:
+                self._entries.append(self._open.pop(name).close())
+
+    def write(self, key: str, line: str, _type: str = None) -> None:
+        if self.shard_by not in ("records", "bytes"):
+            self._shard(key).write(line)
+            return
+        node = self.node_of(key) if self.node_of is not None else None
+        if _type is not None and _type.endswith(CHUNK_SUFFIX) and node in self._key_parts:
+            self._open[self._key_parts[node]].write(line)
+            return
+        self._key_parts.pop(node, None)
+        self._rotate()
+        self._key_parts[node] = self._shard_name(key)
+        self._shard(key).write(line)
+
+    def write_batch(self, keys: List[str], types: List[str], text: str) -> None:
+        """
+        `text` holds one line per key.
+        """
+        lines = text.split("\n")
+        for key, _type, line in zip(keys, types, lines):
+            self.write(key, line + "\n", _type)
+
+    def checkpoint(self) -> dict:
+        """
+        Flushes every open shard and returns what resume() needs to continue
+        from here.
+        """
+        return {
+            "entries": list(self._entries),
+            "sequence": self._sequence,
+            "open": {name: shard.checkpoint() for name, shard in self._open.items()},
+        }
+
+    def resume(self, state: dict) -> None:
+        """
+        Cuts the open shards of a checkpoint back to their size at that point
+        and removes shard files started after it.
+        """
+        self._entries = list(state["entries"])
+        self._sequence = state["sequence"]
+        for name, shard_state in state["open"].items():
+            self._open[name] = self._new_shard(name, shard_state)
+        known = {entry["file"] for entry in self._entries}
+        known.update(name + self._extension for name in self._open)
+        for name in os.listdir(self.directory):
+            if name.endswith(self._extension) and name not in known:
+                os.remove(os.path.join(self.directory, name))
+
+    def close(self) -> List[dict]:
+        for name in sorted(self._open):
+            self._entries.append(self._open[name].close())
+        self._open = {}
+        manifest = {
+            "version": 1,
+            "shard_by": self.shard_by,
+            "compression": self.compression,
+            "shards": sorted(self._entries, key=lambda entry: entry["file"]),
+        }
+        with open(os.path.join(self.directory, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        return manifest["shards"]
+
+    def abort(self, keep: bool = False) -> None:
+        """
+        Closes the open shards without finishing them. Unless `keep`, for a
+        checkpoint to resume from, the shard files are removed.
+        """
+        for shard in self._open.values():
+            shard.abort()
+        if not keep:
+            for entry in self._entries:
+                os.remove(os.path.join(self.directory, entry["file"]))
+            for shard in self._open.values():
+                os.remove(shard.path)
+            self._entries = []
+        self._open = {}
+
+
+def read_manifest(directory: str) -> dict:
+    with open(os.path.join(directory, MANIFEST)) as f:
+        return json.load(f)
+
+
+def list_shards(path: str) -> Tuple[str, List[dict]]:
+    """
+    (directory, manifest entries) of a shard directory or its manifest.json.
+    Directories without a manifest list their files, without checksums.
+    """
+    if os.path.isfile(path):
+        directory = os.path.dirname(path) or "."
+        with open(path) as f:
+            return directory, json.load(f)["shards"]
+    if os.path.exists(os.path.join(path, MANIFEST)):
+        return path, read_manifest(path)["shards"]
+    return path, [
+        {"file": name}
+        for name in sorted(os.listdir(path))
+        if os.path.isfile(os.path.join(path, name)) and not name.startswith(".")
+    ]
@@ -0,0 +1,210 @@
+import gzip
+import hashlib
+import os
+import json
+import tempfile
+import unittest
+
+from redis.crc import key_slot
+
+from .checkpoint import RestoreCheckpoint
+from .dumpers import JSONDumper
+from .parallel_restore import ParallelRestore
+from .shards import ShardedOutput, read_manifest
+from src.mock.redis_io import RedisIOMock
+
+
+class ShardsTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self._dir = tempfile.TemporaryDirectory()
+        self.directory = self._dir.name
+        self.data = [("string", f"key{i}", "dGVzdA==", -1) for i in range(10)]
+
+    def tearDown(self) -> None:
+        self._dir.cleanup()
+
+    def _dump(self, **options):
+        output = ShardedOutput(self.directory, **options)
+        JSONDumper(output, False, False, False).dump(RedisIOMock(list(self.data)))
+        return read_manifest(self.directory)
+
+    def _read(self, name: str) -> bytes:
+        with open(os.path.join(self.directory, name), "rb") as f:
+            return f.read()
+
+
+class ShardedOutputTest(ShardsTestCase):
+    def test_split_by_records(self):
+        manifest = self._dump(shard_by="records", max_records=4)
+        self.assertEqual([shard["file"] for shard in manifest["shards"]],
+                         ["part-00000.jsonl", "part-00001.jsonl", "part-00002.jsonl"])
+        self.assertEqual([shard["records"] for shard in manifest["shards"]], [4, 4, 2])
+        for shard in manifest["shards"]:
+            content = self._read(shard["file"])
+            self.assertEqual(shard["bytes"], len(content))
+            self.assertEqual(shard["sha256"], hashlib.sha256(content).hexdigest())
+        lines = self._read("part-00000.jsonl").decode("utf-8").splitlines()
+        self.assertEqual(json.loads(lines[0])["key"], "key0")
+
+    def test_chunked_key_stays_in_one_part(self):
+        self.data = [
+            ("string", "a", "dGVzdA==", -1),
+            ("list", "l", "WyIxIl0=", -1),
+            ("list:chunk", "l", "WyIyIl0=", -1),
+            ("list:chunk", "l", "WyIzIl0=", -1),
+            ("string", "b", "dGVzdA==", -1),
+        ]
+        manifest = self._dump(shard_by="records", max_records=2)
+        parts = [
+            [json.loads(line)["key"] for line in self._read(shard["file"]).decode("utf-8").splitlines()]
+            for shard in manifest["shards"]
+        ]
+        self.assertEqual(parts, [["a", "l", "l", "l"], ["b"]])
+
+    def test_chunked_key_interleaved_with_other_nodes(self):
+        output = ShardedOutput(self.directory, "records", max_records=1, node_of=lambda key: key[0])
+        for key, _type in [
+            ("a1", "list"), ("b1", "string"), ("a1", "list:chunk"),
+            ("b2", "string"), ("a1", "list:chunk"), ("a2", "string"),
+        ]:
+            output.write(key, json.dumps({"key": key, "type": _type}) + "\n", _type)
+        parts = [
+            [json.loads(line)["key"] for line in self._read(shard["file"]).decode("utf-8").splitlines()]
+            for shard in output.close()
+        ]
+        self.assertEqual(parts, [["a1", "a1", "a1"], ["b1"], ["b2"], ["a2"]])
+
+    def test_split_by_slot(self):
+        manifest = self._dump(shard_by="slot", shards=2)
+        for shard in manifest["shards"]:
+            start = int(shard["file"].split("-")[1])
+            for line in self._read(shard["file"]).decode("utf-8").splitlines():
+                self.assertEqual(key_slot(json.loads(line)["key"].encode()) >= 8192, start == 8192)
+        self.assertEqual(sum(shard["records"] for shard in manifest["shards"]), 10)
+
+    def test_split_by_node(self):
+        manifest = self._dump(shard_by="node", node_of=lambda key: "10.0.0.1:7000" if key < "key5" else "10.0.0.2:7000")
+        self.assertEqual([(shard["file"], shard["records"]) for shard in manifest["shards"]],
+                         [("node-10.0.0.1_7000.jsonl", 5), ("node-10.0.0.2_7000.jsonl", 5)])
+
+    def test_compressed_shards(self):
+        manifest = self._dump(shard_by="records", max_records=100, compression="gzip")
+        self.assertEqual(manifest["shards"][0]["file"], "part-00000.jsonl.gz")
+        lines = gzip.decompress(self._read("part-00000.jsonl.gz")).decode("utf-8").splitlines()
+        self.assertEqual(len(lines), 10)
+
+    def test_resume_from_checkpoint(self):
+        output = ShardedOutput(self.directory, "records", max_records=3, compression="gzip")
+        for i in range(4):
+            output.write(f"key{i}", f"line{i}\n")
+        state = output.checkpoint()
+        output.write("key4", "lost\n")
+        output.write("key5", "lost\n")
+        output.write("key6", "lost\n")
+        output.close()
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "part-00002.jsonl.gz")))
+        resumed = ShardedOutput(self.directory, "records", max_records=3, compression="gzip")
+        resumed.resume(state)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "part-00002.jsonl.gz")))
+        resumed.write("key4", "line4\n")
+        manifest = resumed.close()
+        self.assertEqual([shard["records"] for shard in manifest], [3, 2])
+        content = gzip.decompress(self._read("part-00001.jsonl.gz"))
+        self.assertEqual(content, b"line3\nline4\n")
+        self.assertEqual(manifest[1]["sha256"], hashlib.sha256(self._read("part-00001.jsonl.gz")).hexdigest())
+
+    def test_failed_dump_leaves_no_shards(self):
+        class FailingIO(RedisIOMock):
+            def __iter__(self):
+                yield from list(super().__iter__())[:5]
+                raise ConnectionError("connection lost")
+
+        output = ShardedOutput(self.directory, "records", max_records=3, compression="gzip")
+        with self.assertRaises(ConnectionError):
+            JSONDumper(output, False, False, False).dump(FailingIO(list(self.data)))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_node_needs_node_of(self):
+        with self.assertRaises(ValueError):
+            ShardedOutput(self.directory, "node")
+
+
+class ParallelRestoreTest(ShardsTestCase):
+    def _restore(self, path: str, **options):
+        restored = RedisIOMock(list())
+        count = ParallelRestore(path, lambda: restored, enable_progress_bar=False, log=False, **options).restore()
+        return count, sorted(restored.get_data())
+
+    def test_restore_directory(self):
+        self._dump(shard_by="records", max_records=3, compression="gzip")
+        count, restored = self._restore(self.directory, workers=3)
+        self.assertEqual(count, 10)
+        self.assertEqual(restored, sorted(self.data))
+
+    def test_restore_manifest_with_rate_limit(self):
+        self._dump(shard_by="slot", shards=4)
+        count, restored = self._restore(os.path.join(self.directory, "manifest.json"), rate_limit=1000)
+        self.assertEqual(restored, sorted(self.data))
+
+    def test_restore_without_manifest(self):
+        self._dump(shard_by="records", max_records=3)
+        os.remove(os.path.join(self.directory, "manifest.json"))
+        count, _ = self._restore(self.directory)
+        self.assertEqual(count, 10)
+
+    def test_resume_skips_committed_records(self):
+        self._dump(shard_by="records", max_records=4, compression="gzip")
+        checkpoint = RestoreCheckpoint(os.path.join(self.directory, ".restore-checkpoint.json"), 0)
+        checkpoint.commit("part-00000.jsonl.gz", None, 4, done=True)
+        checkpoint.commit("part-00001.jsonl.gz", None, 1)
+        count, data = self._restore(self.directory, checkpoint=RestoreCheckpoint.load(checkpoint.path))
+        self.assertEqual(count, 5)
+        self.assertEqual([key for _, key, _, _ in data], ["key5", "key6", "key7", "key8", "key9"])
+        self.assertFalse(os.path.exists(checkpoint.path))
+
+    def _split_chunked_key(self) -> None:
+        # a dump written before chunked keys were kept in one part
+        output = ShardedOutput(self.directory, "records", max_records=2)
+        for _type, value in (("list", "WyIxIl0="), ("list:chunk", "WyIyIl0="), ("list:chunk", "WyIzIl0=")):
+            output.write("l", json.dumps({"key": "l", "type": _type, "value": value, "ttl": -1}) + "\n")
+        output.close()
+
+    def test_key_split_over_shards(self):
+        self._split_chunked_key()
+        written = []
+        restored = RedisIOMock(list())
+        restored.write = lambda key, _type, val, ttl: written.append(val)
+        restore = ParallelRestore(self.directory, lambda: restored, workers=1, enable_progress_bar=False, log=False)
+        with self.assertRaisesRegex(ValueError, "part-00001.jsonl continues key 'l'"):
+            restore.restore()
+        self.assertEqual(written, ["WyIxIl0=", "WyIyIl0="])
+
+    def test_resume_within_chunked_key(self):
+        self._split_chunked_key()
+        checkpoint = RestoreCheckpoint(os.path.join(self.directory, ".restore-checkpoint.json"), 0)
+        checkpoint.commit("part-00000.jsonl", None, 1)
+        checkpoint.commit("part-00001.jsonl", None, 0, done=True)
+        written = []
+        restored = RedisIOMock(list())
+        restored.write = lambda key, _type, val, ttl: written.append(val)
+        ParallelRestore(
+            self.directory, lambda: restored, enable_progress_bar=False, log=False,
+            checkpoint=RestoreCheckpoint.load(checkpoint.path)
+        ).restore()
+        self.assertEqual(written, ["WyIyIl0="])
+
+    def test_checksum_mismatch(self):
+        self._dump(shard_by="records", max_records=100)
+        with open(os.path.join(self.directory, "part-00000.jsonl"), "a") as f:
+            f.write("\n")
+        with self.assertRaises(ValueError):
+            self._restore(self.directory)
+
+    def test_compressed_checksum_mismatch_writes_nothing(self):
+        self._dump(shard_by="records", max_records=100, compression="gzip")
+        with open(os.path.join(self.directory, "part-00000.jsonl.gz"), "ab") as f:
+            f.write(b"\0")
+        restored = RedisIOMock(list())
+        with self.assertRaises(ValueError):
+            ParallelRestore(self.directory, lambda: restored, enable_progress_bar=False, log=False).restore()
+        self.assertEqual(restored.get_data(), [])
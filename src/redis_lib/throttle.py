@@ -0,0 +1,195 @@
+import time
+from typing import List, Tuple
+
+import redis
+
+from .replicas import replica_lags
+from .utils import RateLimiter
+
+MAX_DELAY = 1.0
+
+
+class ScanThrottle:
+    """
+    Sizes and paces the SCAN batches of one node so that no round trip of
+    a dump takes longer than `target_latency` seconds. The batch size
+    doubles until a round trip overshoots, then grows by `min_batch` per
+    batch within budget and halves on every overshoot. Once even
+    `min_batch` overshoots, a pause between batches of up to MAX_DELAY
+    seconds grows instead. Without a target batches stay at `max_batch`
+    unless INFO reports overload.
+
+    Every `info_interval` seconds INFO is sampled; more than
+    `max_server_ops` instantaneous_ops_per_sec or `max_blocked_clients`
+    blocked clients count as an overshoot. `rate_limiter`, shared by the
+    nodes, caps the keys read per second.
+    """
+    def __init__(
+        self,
+        cli: redis.Redis,
+        target_latency: float = 0,
+        min_batch: int = 100,
+        max_batch: int = 10000,
+        info_interval: float = 0,
+        max_server_ops: int = 0,
+        max_blocked_clients: int = 0,
+        rate_limiter: RateLimiter = None
+    ) -> None:
+        self._cli = cli
+        self._target = target_latency
+        self._min_batch = min(min_batch, max_batch)
+        self._max_batch = max_batch
+        self._info_interval = info_interval
+        self._max_server_ops = max_server_ops
+        self._max_blocked_clients = max_blocked_clients
+        self._rate_limiter = rate_limiter
+        self.batch_size = self._min_batch if target_latency > 0 else max_batch
+        self.delay = 0.0
+        self._slow_start = True
+        self._slowest = 0.0
+        self._info_at = time.monotonic()
+
+    def round_trip(self, elapsed: float) -> None:
+        self._slowest = max(self._slowest, elapsed)
+
+    def scanned(self, keys: int, elapsed: float) -> None:
+        """
+        Called after every SCAN; waits until the keys it returned fit the
+        rate limit.
+        """
+        self.round_trip(elapsed)
+        if self._rate_limiter is not None and keys:
+            self._rate_limiter.acquire(keys)
+
+    def _server_overloaded(self) -> bool:
+        if self._info_interval <= 0 or time.monotonic() - self._info_at < self._info_interval:
+            return False
+        self._info_at = time.monotonic()
+        try:
+            info = self._cli.info()
+        except redis.exceptions.RedisError:
+            return False
+        if self._max_server_ops and int(info.get("instantaneous_ops_per_sec", 0)) > self._max_server_ops:
+            return True
+        return bool(self._max_blocked_clients) and int(info.get("blocked_clients", 0)) > self._max_blocked_clients
+
+    def _overloaded(self) -> bool:
+        return (self._target > 0 and self._slowest > self._target) or self._server_overloaded()
+
+    def pace(self) -> int:
+        """
+        Called before every SCAN; waits as needed and returns the COUNT to
+        scan with.
+        """
+        if self._overloaded():
+            self._slow_start = False
+            if self.batch_size > self._min_batch:
+                self.batch_size = max(self._min_batch, self.batch_size // 2)
+            else:
+                self.delay = min(MAX_DELAY, max(2 * self.delay, self._slowest, 0.01))
+        elif self.delay > 0:
+            self.delay = self.delay / 2 if self.delay > 0.001 else 0.0
+        elif self._slow_start:
+            self.batch_size = min(self._max_batch, 2 * self.batch_size)
+        else:
+            self.batch_size = min(self._max_batch, self.batch_size + self._min_batch)
+        self._slowest = 0.0
+        if self.delay > 0:
+            time.sleep(self.delay)
+        return self.batch_size
+
+
+class BackpressureTimeout(Exception):
+    ...
+
+
+class WriteThrottle:
+    """
+    Paces the restore pipelines of one io. A pipeline slower than
+    `target_latency` seconds, used_memory within 10% of `max_memory_ratio`
+    of maxmemory or a replica more than half of `max_replica_lag` bytes
+    behind doubles the pause before the next pipeline, up to MAX_DELAY;
+    otherwise the pause halves. At `max_memory_ratio` or `max_replica_lag`
+    writes stop until the nodes recover, and BackpressureTimeout is raised
+    after `max_pause` seconds.
+
+    INFO memory and replication are sampled every `info_interval` seconds
+    on every node of `clis`, the masters the io writes to.
+    """
+    def __init__(
+        self,
+        clis: List[redis.Redis],
+        target_latency: float = 0,
+        info_interval: float = 0,
+        max_memory_ratio: float = 0.9,
+        max_replica_lag: int = 0,
+        max_pause: float = 300
+    ) -> None:
+        self._clis = clis
+        self._target = target_latency
+        self._info_interval = info_interval
+        self._max_memory_ratio = max_memory_ratio
+        self._max_replica_lag = max_replica_lag
+        self._max_pause = max_pause
+        self.delay = 0.0
+        self._slowest = 0.0
+        self._info_at = None
+        self._near_limits = False
+
+    def flushed(self, elapsed: float) -> None:
+        self._slowest = max(self._slowest, elapsed)
+
+    def _sample(self) -> Tuple[float, int]:
+        """
+        (highest used_memory / maxmemory, largest replica lag in bytes) of the nodes.
+        """
+        ratio, lag = 0.0, 0
+        for cli in self._clis:
+            try:
+                memory = cli.info("memory")
+                lags = replica_lags(cli) if self._max_replica_lag else []
+            except redis.exceptions.RedisError:
+                continue
+            maxmemory = int(memory.get("maxmemory", 0))
+            if maxmemory:
+                ratio = max(ratio, int(memory.get("used_memory", 0)) / maxmemory)
+            lag = max([lag] + [replica_lag for _, _, replica_lag, _ in lags])
+        return ratio, lag
+
+    def _blocked(self, ratio: float, lag: int) -> bool:
+        return ratio >= self._max_memory_ratio or (self._max_replica_lag and lag >= self._max_replica_lag)
+
+    def _wait_for_headroom(self) -> Tuple[float, int]:
+        paused_at = time.monotonic()
+        while True:
+            self._info_at = time.monotonic()
+            ratio, lag = self._sample()
+            if not self._blocked(ratio, lag):
+                return ratio, lag
+            if time.monotonic() - paused_at >= self._max_pause:
+                raise BackpressureTimeout(
+                    f"restore paused for {self._max_pause}s: used_memory at {ratio:.0%} of maxmemory, "
+                    f"replicas up to {lag} bytes behind"
+                )
+            time.sleep(self._info_interval)
+
+    def before_flush(self) -> None:
+        """
+        Memory and replica pressure of the last sample counts for every
+        pipeline until the next sample.
+        """
+        due = self._info_at is None or time.monotonic() - self._info_at >= self._info_interval
+        if self._info_interval > 0 and due:
+            ratio, lag = self._wait_for_headroom()
+            self._near_limits = (
+                ratio >= self._max_memory_ratio - 0.1
+                or bool(self._max_replica_lag) and 2 * lag >= self._max_replica_lag
+            )
+        pressure = self._near_limits or (self._target > 0 and self._slowest > self._target)
+        self._slowest = 0.0
+        if pressure:
+            self.delay = min(MAX_DELAY, max(2 * self.delay, 0.01))
+        else:
+            self.delay = self.delay / 2 if self.delay > 0.001 else 0.0
+        if self.delay > 0:
+            time.sleep(self.delay)
@@ -0,0 +1,149 @@
+import unittest
+from itertools import count
+from unittest.mock import MagicMock, patch
+
+from .io import RedisClusterIO, RedisPatternIO
+from .throttle import MAX_DELAY, BackpressureTimeout, ScanThrottle, WriteThrottle
+from src.mock.redis import MockRedis
+
+
+@patch("src.redis_lib.throttle.time")
+class ScanThrottleTest(unittest.TestCase):
+    def test_without_target(self, mock_time):
+        throttle = ScanThrottle(MagicMock(), max_batch=1000)
+        throttle.round_trip(10)
+        self.assertEqual(throttle.pace(), 1000)
+        mock_time.sleep.assert_not_called()
+
+    def test_aimd(self, mock_time):
+        throttle = ScanThrottle(MagicMock(), target_latency=0.1, min_batch=100, max_batch=1000)
+        self.assertEqual(throttle.batch_size, 100)
+        sizes = []
+        for elapsed in (0.01, 0.01, 0.5, 0.01, 0.01):
+            throttle.round_trip(elapsed)
+            sizes.append(throttle.pace())
+        self.assertEqual(sizes, [200, 400, 200, 300, 400])
+        for _ in range(20):
+            throttle.pace()
+        self.assertEqual(throttle.batch_size, 1000)
+
+    def test_pause_at_min_batch(self, mock_time):
+        throttle = ScanThrottle(MagicMock(), target_latency=0.1, min_batch=100, max_batch=1000)
+        throttle.round_trip(0.5)
+        self.assertEqual(throttle.pace(), 100)
+        mock_time.sleep.assert_called_once_with(0.5)
+        throttle.round_trip(0.5)
+        throttle.pace()
+        self.assertEqual(throttle.delay, MAX_DELAY)
+        throttle.pace()
+        self.assertEqual(throttle.delay, MAX_DELAY / 2)
+        self.assertEqual(throttle.batch_size, 100)
+
+    def test_info(self, mock_time):
+        mock_time.monotonic.side_effect = [0, 10, 10, 20, 20]
+        cli = MagicMock()
+        cli.info.side_effect = [
+            {"instantaneous_ops_per_sec": 50000, "blocked_clients": 0},
+            {"instantaneous_ops_per_sec": 100, "blocked_clients": 0},
+        ]
+        throttle = ScanThrottle(cli, max_batch=1000, info_interval=5, max_server_ops=10000, max_blocked_clients=5)
+        self.assertEqual(throttle.pace(), 500)
+        self.assertEqual(throttle.pace(), 600)
+        self.assertEqual(cli.info.call_count, 2)
+
+    def test_rate_limiter(self, mock_time):
+        limiter = MagicMock()
+        throttle = ScanThrottle(MagicMock(), rate_limiter=limiter)
+        throttle.scanned(0, 0.01)
+        throttle.scanned(42, 0.01)
+        limiter.acquire.assert_called_once_with(42)
+
+
+class ThrottledScanTest(unittest.TestCase):
+    @patch("src.redis_lib.io.SCAN_COUNT", 4)
+    def test_scan(self):
+        cli = MockRedis({f"key{i}": str(i) for i in range(10)}, {})
+        limiter = MagicMock()
+        io = RedisPatternIO(cli, throttle={"target_latency": 10, "min_batch": 1, "rate_limiter": limiter})
+        self.assertEqual(sorted(key for _, key, _, _ in io), sorted(cli.cache))
+        self.assertEqual(io.throttle.batch_size, 4)
+        self.assertEqual(sum(call.args[0] for call in limiter.acquire.call_args_list), 10)
+
+
+def node(*memory, master_offset=0, replica_offset=0):
+    """
+    A client whose INFO memory replies are `memory`, (used, max) pairs.
+    """
+    cli = MagicMock()
+    replies = iter(memory)
+
+    def info(section):
+        if section == "memory":
+            used, maxmemory = next(replies)
+            return {"used_memory": used, "maxmemory": maxmemory}
+        return {
+            "role": "master", "connected_slaves": 1, "master_repl_offset": master_offset,
+            "slave0": {"ip": "10.0.0.1", "port": 6380, "state": "online", "offset": replica_offset, "lag": 0},
+        }
+    cli.info.side_effect = info
+    return cli
+
+
+@patch("src.redis_lib.throttle.time")
+class WriteThrottleTest(unittest.TestCase):
+    def test_latency(self, mock_time):
+        throttle = WriteThrottle([MagicMock()], target_latency=0.1)
+        throttle.before_flush()
+        throttle.flushed(0.5)
+        throttle.before_flush()
+        throttle.flushed(0.5)
+        throttle.before_flush()
+        self.assertEqual(throttle.delay, 0.02)
+        throttle.flushed(0.01)
+        throttle.before_flush()
+        self.assertEqual(throttle.delay, 0.01)
+        mock_time.sleep.assert_called_with(0.01)
+
+    def test_pause_until_memory_frees(self, mock_time):
+        mock_time.monotonic.return_value = 0
+        cli = node((95, 100), (50, 100))
+        throttle = WriteThrottle([cli], info_interval=1)
+        throttle.before_flush()
+        mock_time.sleep.assert_called_once_with(1)
+        self.assertEqual(throttle.delay, 0)
+
+    def test_slow_down_near_limits(self, mock_time):
+        mock_time.monotonic.return_value = 0
+        throttle = WriteThrottle([node((85, 100))], info_interval=1)
+        throttle.before_flush()
+        self.assertEqual(throttle.delay, 0.01)
+        # no new sample within the interval: the pressure still counts
+        throttle.before_flush()
+        self.assertEqual(throttle.delay, 0.02)
+        throttle = WriteThrottle([node((0, 0), master_offset=1000, replica_offset=400)], info_interval=1, max_replica_lag=1000)
+        throttle.before_flush()
+        self.assertEqual(throttle.delay, 0.01)
+
+    def test_timeout(self, mock_time):
+        mock_time.monotonic.side_effect = count(0, 100)
+        throttle = WriteThrottle([node(*[(95, 100)] * 10)], info_interval=1, max_pause=300)
+        with self.assertRaises(BackpressureTimeout):
+            throttle.before_flush()
+
+
+class ThrottledWriteTest(unittest.TestCase):
+    def test_flush(self):
+        cli = MockRedis({"existing": "x"}, {})
+        io = RedisPatternIO(cli, write_throttle={"target_latency": 10})
+        io.write("a", "string", "MQ==", -1)
+        io.flush()
+        self.assertEqual(cli.get("a"), "1")
+        self.assertEqual(io.write_throttle.delay, 0)
+
+    def test_cluster_samples_every_master(self):
+        first = MockRedis({"existing": "x"}, {})
+        second = MockRedis({"existing": "x"}, {})
+        initiator = MagicMock()
+        initiator.get_nodes.return_value = first.get_nodes() + second.get_nodes()
+        io = RedisClusterIO(cli=initiator, write_throttle={"info_interval": 1})
+        self.assertEqual(io._write_io.write_throttle._clis, [first, second])
@@ -19,10 +19,14 @@ class RedisTypeHandler(ABC):
         raise NotImplementedError
 
 class BasicTypeHandler(RedisTypeHandler):
-    def __init__(self, getter, setter, processor) -> None:
+    def __init__(self, getter, setter, processor, binary: bool = False, sizer=None, chunker=None) -> None:
         self.__getter = getter
         self.__setter = setter
         self.__processor = processor
+        self.__sizer = sizer
+        self.__chunker = chunker
+        self.binary = binary
+        self.chunkable = sizer is not None and chunker is not None
 
     def call_for(self, cli, key):
         return self.__getter(cli, key)
@@ -33,6 +37,35 @@ class BasicTypeHandler(RedisTypeHandler):
     def process_result(self, val):
         return self.__processor(val)
 
+    def size_for(self, cli, key):
+        return self.__sizer(cli, key)
+
+    def iter_chunks(self, cli, key, size: int):
+        return self.__chunker(cli, key, size)
+
+
+def iter_list_windows(cli, key, size):
+    start = 0
+    while True:
+        window = cli.lrange(key, start, start + size - 1)
+        if window:
+            yield window
+        if len(window) < size:
+            return
+        start += size
+
+
+def scan_windows(scan):
+    def iter_windows(cli, key, size):
+        cursor = 0
+        while True:
+            cursor, window = scan(cli, key, cursor, size)
+            if window:
+                yield window
+            if cursor == 0:
+                return
+    return iter_windows
+
 
 identity = lambda val: val
 StringHandler = BasicTypeHandler(
@@ -46,7 +79,9 @@ list_if_not_none = lambda val: list(val) if val else None
 SetHandler = BasicTypeHandler(
     lambda cli, key: cli.smembers(key),
     lambda cli, key, val, _: cli.sadd(key, *val) if isinstance(val, Iterable) and not isinstance(val, str) else cli.sadd(key, val),
-    list_if_not_none
+    list_if_not_none,
+    sizer=lambda cli, key: cli.scard(key),
+    chunker=scan_windows(lambda cli, key, cursor, size: cli.sscan(key, cursor, count=size)),
 )
 
 
@@ -54,6 +89,8 @@ ListHandler = BasicTypeHandler(
     lambda cli, key: cli.lrange(key, 0, -1),
     lambda cli, key, val, _: cli.rpush(key, *val) if isinstance(val, Iterable) and not isinstance(val, str) else cli.rpush(key, val),
     identity,
+    sizer=lambda cli, key: cli.llen(key),
+    chunker=iter_list_windows,
 )
 
 
@@ -61,6 +98,8 @@ HashHandler = BasicTypeHandler(
     lambda cli, key: cli.hgetall(key),
     lambda cli, key, val, _: cli.hmset(key, val),
     identity,
+    sizer=lambda cli, key: cli.hlen(key),
+    chunker=scan_windows(lambda cli, key, cursor, size: cli.hscan(key, cursor, count=size)),
 )
 
 def convert_zrange_to_dict(zrange):
@@ -73,11 +112,35 @@ ZSetHandler = BasicTypeHandler(
     lambda cli, key: cli.zrange(key, 0, -1, withscores=True),
     lambda cli, key, val, _: cli.zadd(key, dict(val)),
     convert_zrange_to_dict,
+    sizer=lambda cli, key: cli.zcard(key),
+    chunker=scan_windows(lambda cli, key, cursor, size: cli.zscan(key, cursor, count=size)),
 )
 
 
+# "none" records stand for keys deleted since the dump they follow
 NoneHandler = BasicTypeHandler(
     lambda cli, key: '',
-    lambda cli, key, val, _: None,
+    lambda cli, key, val, _: cli.delete(key),
     identity,
-)
\ No newline at end of file
+)
+
+
+def payload_ttl(pttl: int) -> int:
+    """
+    RESTORE ttl argument for a PTTL: 0 means no expiry there, so keys
+    within their last millisecond get 1.
+    """
+    if pttl < 0:
+        return 0
+    return max(1, pttl)
+
+
+# DUMP/RESTORE payloads are opaque, RDB-version specific bytes; they cover
+# every type (streams, modules, ...) and restore in one command per key.
+# Their records carry the PTTL, in milliseconds, as their ttl.
+PayloadHandler = BasicTypeHandler(
+    lambda cli, key: cli.dump(key),
+    lambda cli, key, val, ttl: cli.restore(key, payload_ttl(ttl), val, replace=True),
+    identity,
+    binary=True,
+)
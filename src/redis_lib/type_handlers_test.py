@@ -10,7 +10,8 @@ from src.redis_lib.type_handlers import (
     ListHandler,
     HashHandler,
     ZSetHandler,
-    NoneHandler
+    NoneHandler,
+    PayloadHandler
 )
 
 
@@ -271,3 +272,64 @@ class HashHandlerTest(unittest.TestCase):
         cli = redis.Redis(host="localhost")
         with self.assertRaises(Exception):
             HashHandler.call_for(cli, "foo2")
+
+
+class PayloadHandlerTest(unittest.TestCase):
+    def test_call_for(self):
+        cli = MagicMock()
+        cli.dump.return_value = b"\x00payload"
+        self.assertEqual(PayloadHandler.call_for(cli, "foo"), b"\x00payload")
+        cli.dump.assert_called_once_with("foo")
+
+    def test_write_with_ttl(self):
+        cli = MagicMock()
+        PayloadHandler.write(cli, "foo", b"\x00payload", 5437)
+        cli.restore.assert_called_once_with("foo", 5437, b"\x00payload", replace=True)
+
+    def test_write_expiring(self):
+        cli = MagicMock()
+        PayloadHandler.write(cli, "foo", b"\x00payload", 0)
+        cli.restore.assert_called_once_with("foo", 1, b"\x00payload", replace=True)
+
+    def test_write_without_ttl(self):
+        cli = MagicMock()
+        PayloadHandler.write(cli, "foo", b"\x00payload", -1)
+        cli.restore.assert_called_once_with("foo", 0, b"\x00payload", replace=True)
+
+    def test_is_binary(self):
+        self.assertTrue(PayloadHandler.binary)
+        self.assertFalse(StringHandler.binary)
+
+
+class ChunkedReadTest(unittest.TestCase):
+    def test_list_windows(self):
+        cli = MagicMock()
+        cli.lrange.side_effect = [["1", "2"], ["3", "4"], []]
+        self.assertEqual(list(ListHandler.iter_chunks(cli, "foo", 2)), [["1", "2"], ["3", "4"]])
+        cli.lrange.assert_has_calls([call("foo", 0, 1), call("foo", 2, 3), call("foo", 4, 5)])
+
+    def test_hash_windows(self):
+        cli = MagicMock()
+        cli.hscan.side_effect = [(7, {"a": "1"}), (3, {}), (0, {"b": "2"})]
+        self.assertEqual(list(HashHandler.iter_chunks(cli, "foo", 10)), [{"a": "1"}, {"b": "2"}])
+        cli.hscan.assert_has_calls([call("foo", 0, count=10), call("foo", 7, count=10), call("foo", 3, count=10)])
+
+    def test_set_windows(self):
+        cli = MagicMock()
+        cli.sscan.side_effect = [(0, ["a", "b"])]
+        self.assertEqual(list(SetHandler.iter_chunks(cli, "foo", 10)), [["a", "b"]])
+
+    def test_zset_windows(self):
+        cli = MagicMock()
+        cli.zscan.side_effect = [(1, [("a", 1.0)]), (0, [("b", 2.0)])]
+        self.assertEqual(list(ZSetHandler.iter_chunks(cli, "foo", 1)), [[("a", 1.0)], [("b", 2.0)]])
+
+    def test_size_for(self):
+        cli = MagicMock()
+        cli.llen.return_value = 42
+        self.assertEqual(ListHandler.size_for(cli, "foo"), 42)
+
+    def test_chunkable(self):
+        self.assertTrue(ListHandler.chunkable)
+        self.assertFalse(StringHandler.chunkable)
+        self.assertFalse(NoneHandler.chunkable)
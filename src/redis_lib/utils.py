@@ -1,4 +1,8 @@
-from typing import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Full, Queue
+import time
+from threading import Event, Lock, Thread
+from typing import Callable, Generator, Iterable, List
 
 
 def to_batch(itr: Iterable, batch_size: int) -> Iterable[list]:
@@ -10,3 +14,185 @@ def to_batch(itr: Iterable, batch_size: int) -> Iterable[list]:
             batch = []
     if len(batch) > 0:
         yield batch
+
+
+def drive(steps: Generator, on_round_trip: Callable[[float], None] = None) -> any:
+    """
+    Runs a step generator synchronously. Step generators yield callables
+    that perform one round trip (usually `pipe.execute`) and receive their
+    reply, so the same fetch logic can be driven by a sync or async client.
+    `on_round_trip` receives the duration of every round trip in seconds.
+    """
+    try:
+        request = next(steps)
+        while True:
+            started = time.monotonic()
+            try:
+                reply = request()
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                if on_round_trip is not None:
+                    on_round_trip(time.monotonic() - started)
+                request = steps.send(reply)
+    except StopIteration as e:
+        return e.value
+
+
+async def drive_async(steps: Generator) -> any:
+    try:
+        request = next(steps)
+        while True:
+            try:
+                reply = await request()
+            except Exception as e:
+                request = steps.throw(e)
+            else:
+                request = steps.send(reply)
+    except StopIteration as e:
+        return e.value
+
+
+def approx_size(val: any) -> int:
+    """
+    Rough payload size of a value about to be written, for byte budgets.
+    """
+    if isinstance(val, (bytes, str)):
+        return len(val)
+    if isinstance(val, memoryview):
+        return val.nbytes
+    if isinstance(val, dict):
+        return sum(approx_size(k) + approx_size(v) for k, v in val.items())
+    if isinstance(val, (list, tuple, set)):
+        return sum(approx_size(i) for i in val)
+    return 8
+
+
+_DONE = object()
+
+
+class _ProducerError:
+    def __init__(self, exception: BaseException):
+        self.exception = exception
+
+
+def merge_threaded(
+    producers: List[Callable[[], Iterable]],
+    workers: int,
+    max_pending: int = 2
+) -> Iterable:
+    """
+    Drains every producer on a worker thread and yields items in arrival order.
+    At most `workers` producers run at once and at most `workers * max_pending`
+    items wait to be consumed, so slow consumers stall the producers.
+    """
+    if len(producers) == 0:
+        return
+    queue = Queue(maxsize=max(1, workers * max_pending))
+    stop = Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return
+            except Full:
+                continue
+
+    def drain(producer):
+        if stop.is_set():
+            return
+        try:
+            for item in producer():
+                if stop.is_set():
+                    return
+                put(item)
+        except BaseException as e:
+            put(_ProducerError(e))
+        finally:
+            put(_DONE)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        for producer in producers:
+            executor.submit(drain, producer)
+        remaining = len(producers)
+        while remaining > 0:
+            try:
+                item = queue.get(timeout=0.1)
+            except Empty:
+                continue
+            if item is _DONE:
+                remaining -= 1
+            elif isinstance(item, _ProducerError):
+                raise item.exception
+            else:
+                yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+class BatchWorker:
+    """
+    Runs `handle` on submitted items, in order, on its own thread. At most
+    `max_pending` items wait, so `submit` blocks while the worker is behind.
+    The first exception raised by `handle` is re-raised by the next
+    `submit` or `join`.
+    """
+    def __init__(self, handle: Callable[[any], None], max_pending: int = 2):
+        self._handle = handle
+        self._queue = Queue(maxsize=max(1, max_pending))
+        self._error = None
+        Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if self._error is None:
+                    self._handle(item)
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def submit(self, item: any) -> None:
+        self._raise_error()
+        self._queue.put(item)
+
+    def join(self) -> None:
+        """
+        Waits until every submitted item has been handled.
+        """
+        self._queue.join()
+        self._raise_error()
+
+
+class RateLimiter:
+    """
+    Token bucket shared by threads. `acquire` blocks so that on average no
+    more than `rate` units pass per second; a rate of 0 disables it.
+    """
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = Lock()
+
+    def acquire(self, n: float = 1) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= n
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
@@ -0,0 +1,115 @@
+import asyncio
+import unittest
+import time
+
+from .utils import BatchWorker, approx_size, drive, drive_async, merge_threaded, to_batch
+
+
+class ToBatchTest(unittest.TestCase):
+    def test_to_batch(self):
+        self.assertEqual(list(to_batch(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_to_batch_empty(self):
+        self.assertEqual(list(to_batch([], 2)), [])
+
+
+class ApproxSizeTest(unittest.TestCase):
+    def test_approx_size(self):
+        self.assertEqual(approx_size(b"abc"), 3)
+        self.assertEqual(approx_size(["ab", "c"]), 3)
+        self.assertEqual(approx_size({"f": "vv"}), 3)
+
+
+class MergeThreadedTest(unittest.TestCase):
+    def test_merges_all_items(self):
+        producers = [lambda i=i: range(i * 100, i * 100 + 50) for i in range(4)]
+        returned_value = sorted(merge_threaded(producers, 4))
+        expected_value = sorted(x for i in range(4) for x in range(i * 100, i * 100 + 50))
+        self.assertEqual(returned_value, expected_value)
+
+    def test_keeps_per_producer_order(self):
+        producers = [lambda i=i: ((i, j) for j in range(20)) for i in range(3)]
+        returned_value = list(merge_threaded(producers, 2, 1))
+        for i in range(3):
+            self.assertEqual([j for p, j in returned_value if p == i], list(range(20)))
+
+    def test_no_producers(self):
+        self.assertEqual(list(merge_threaded([], 2)), [])
+
+    def test_propagates_exceptions(self):
+        def failing():
+            yield 1
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            list(merge_threaded([failing, lambda: range(10)], 2))
+
+    def test_early_close_stops_producers(self):
+        def endless():
+            while True:
+                time.sleep(0.001)
+                yield 1
+
+        merged = merge_threaded([endless, endless], 2)
+        self.assertEqual(next(merged), 1)
+        merged.close()
+
+    def test_early_close_skips_queued_producers(self):
+        started = []
+
+        def producer(i):
+            def produce():
+                started.append(i)
+                while True:
+                    time.sleep(0.001)
+                    yield i
+            return produce
+
+        merged = merge_threaded([producer(i) for i in range(5)], 1)
+        self.assertEqual(next(merged), 0)
+        merged.close()
+        self.assertEqual(started, [0])
+
+
+def _steps(fail_first=False):
+    try:
+        first = yield (lambda: 1) if not fail_first else (lambda: 1 / 0)
+    except ZeroDivisionError:
+        first = -1
+    second = yield lambda: first + 1
+    return first, second
+
+
+class DriveTest(unittest.TestCase):
+    def test_drive(self):
+        self.assertEqual(drive(_steps()), (1, 2))
+
+    def test_drive_throws_into_steps(self):
+        self.assertEqual(drive(_steps(fail_first=True)), (-1, 0))
+
+    def test_drive_async(self):
+        def steps():
+            async def one():
+                return 1
+            first = yield one
+            return first
+
+        self.assertEqual(asyncio.run(drive_async(steps())), 1)
+
+
+class BatchWorkerTest(unittest.TestCase):
+    def test_handles_in_order(self):
+        handled = []
+        worker = BatchWorker(handled.append, 1)
+        for i in range(10):
+            worker.submit(i)
+        worker.join()
+        self.assertEqual(handled, list(range(10)))
+
+    def test_error_is_raised(self):
+        def fail(item):
+            raise ValueError(item)
+        worker = BatchWorker(fail)
+        worker.submit(1)
+        with self.assertRaises(ValueError):
+            worker.join()
@@ -4,12 +4,13 @@ import logging
 logging.basicConfig(level=int(os.getenv("LOG_LEVEL", logging.INFO)))
 logger = logging.getLogger(__name__)
 
-import subprocess
 import argparse
 from datetime import datetime
 
 import boto3
 
+from src.main import CLI
+from src.object_storage import MultipartUpload
 from src.retention import (
     RetentionBucket,
     always, ymdh, ymd, yw, ym, y
@@ -76,6 +77,21 @@ if __name__ == "__main__":
     parser.add_argument('--type', '-T', required=True, choices=['single', 'cluster'])
     parser.add_argument('--db', '-D', nargs='?', default=0)
     parser.add_argument('--ttl', action='store_true')
+    parser.add_argument('--cluster-workers', type=int, default=1)
+    parser.add_argument('--format', default='json', choices=['json', 'rdb-payload'])
+    parser.add_argument('--chunk-threshold', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--encoder-workers', type=int, default=1)
+    parser.add_argument('--value-encoding', default='base64', choices=['base64', 'auto'])
+    parser.add_argument('--compression', default='gzip', choices=['gzip', 'zstd', 'lz4'])
+    parser.add_argument('--compression-level', type=int, default=None)
+    parser.add_argument('--compression-threads', type=int, default=1)
+    parser.add_argument('--part-size', type=int, default=64,
+                        help='size of the multipart upload parts in MiB')
+    parser.add_argument('--upload-concurrency', type=int, default=4,
+                        help='number of parts uploaded at once')
+    parser.add_argument('--upload-retries', type=int, default=5,
+                        help='number of times a failed part is retried')
     parser.add_argument('--bucket', '-B', required=True)
     parser.add_argument('--endpoint-url', required=True)
     parser.add_argument('--name', required=True)
@@ -93,50 +109,35 @@ if __name__ == "__main__":
     if not uri:
         print("Must give --uri or set REDIS_URI env")
         exit(1)
-    command = f"python3 -m src.main --uri {uri} --type {args.type} --db {args.db} --output-stdout --mode dump"
-    if args.ttl:
-        command += " --ttl"
-    dumper_process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE)
+    args.uri = uri
+    args.mode = "dump"
     backup_name = str(datetime.now()).replace(' ', '-')
-    object_storage_address = f"s3://{args.bucket}/{args.name}/{backup_name}"
-    gzip_process = subprocess.Popen(
-        f"gzip",
-        shell=True,
-        stdin=dumper_process.stdout,
-        stdout=subprocess.PIPE
-    )
-    aws_process = subprocess.Popen(
-        f"aws s3 cp - {object_storage_address} --endpoint-url {args.endpoint_url} --expected-size 109261619200",
-        shell=True,
-        stdin=gzip_process.stdout
+    s3_client = boto3.client(
+        's3',
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        endpoint_url=args.endpoint_url
     )
-    dumper_process.wait()
-    gzip_process.wait()
-    aws_process.wait()
-
-    total_return_code = dumper_process.returncode | gzip_process.returncode | aws_process.returncode
-    if total_return_code == 0:
-        logger.info("Backup finished successfully.")
-        retention_buckets = create_retention_buckets(args)
-        num_of_deleted_backups = prune_single_object_storage_backups(
-                                    args.bucket,
-                                    os.getenv("AWS_ACCESS_KEY_ID"),
-                                    os.getenv("AWS_SECRET_ACCESS_KEY"),
-                                    args.endpoint_url,
-                                    retention_buckets
-                                )
-    else:
-        logger.error(
-            """
-            dump failed with dump process return code {}
-            and gzip process returncode {}
-            store in bucket process returncode {}
-            primary s3 storage exit code {}
-            """.format(
-                dumper_process.returncode, gzip_process.returncode, aws_process.returncode
-            )
-        )
+    try:
+        with MultipartUpload(
+            s3_client,
+            args.bucket,
+            f"{args.name}/{backup_name}",
+            part_size=args.part_size * 1024 * 1024,
+            concurrency=args.upload_concurrency,
+            max_retries=args.upload_retries
+        ) as upload:
+            CLI(args).run(upload)
+    except Exception:
+        logger.exception("dump failed, the multipart upload is aborted")
+        exit(1)
 
-        aws_command = f"aws s3 rm {object_storage_address}" + f" --endpoint-url {args.endpoint_url}"
-        remove_process = subprocess.Popen(aws_command, shell=True)
-        remove_process.wait()
+    logger.info("Backup finished successfully.")
+    retention_buckets = create_retention_buckets(args)
+    num_of_deleted_backups = prune_single_object_storage_backups(
+                                args.bucket,
+                                os.getenv("AWS_ACCESS_KEY_ID"),
+                                os.getenv("AWS_SECRET_ACCESS_KEY"),
+                                args.endpoint_url,
+                                retention_buckets
+                            )